@@ -49,6 +49,31 @@ def beijing_time_filter(dt, format_str='%Y-%m-%d %H:%M'):
 # 初始化扩展
 from models import db
 db.init_app(app)
+
+# SQLite：每个新连接设置日志模式和写锁等待时间
+from sqlalchemy import event
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        @event.listens_for(db.engine, 'connect')
+        def configure_sqlite_connection(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT)}")
+            if Config.SQLITE_JOURNAL_MODE:
+                cursor.execute(f"PRAGMA journal_mode = {Config.SQLITE_JOURNAL_MODE}")
+            cursor.close()
+
+# 考核统计快照：奖项、项目状态或推送学院变更时增量刷新
+from utils.assessment import register_assessment_listeners
+register_assessment_listeners(db.session)
+
+# 附件内容寻址存储：维护文件引用计数，最后一个引用删除后回收文件
+from utils.blob_store import register_blob_listeners
+register_blob_listeners(db.session)
+
+# 模板中判断附件能否显示缩略图
+from utils.thumbnails import has_thumbnail
+app.add_template_global(has_thumbnail)
+
 login_manager = LoginManager(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = '请先登录以访问此页面'
@@ -71,6 +96,18 @@ app.register_blueprint(college_admin_bp, url_prefix='/college_admin')
 app.register_blueprint(school_admin_bp, url_prefix='/school_admin')
 app.register_blueprint(judge_bp, url_prefix='/judge')
 
+# 定时任务：为已过抽签截止时间的竞赛分配未抽取的答辩顺序（crontab 中定期执行 flask --app app assign-defense-orders）
+@app.cli.command('assign-defense-orders')
+def assign_defense_orders_command():
+    """为已过抽签截止时间的竞赛分配未抽取的答辩顺序"""
+    from utils.defense_order import assign_overdue_defense_orders
+    for competition_id, count in assign_overdue_defense_orders().items():
+        print(f"竞赛 {competition_id}：已分配 {count} 个项目的答辩顺序")
+        remaining = Project.query.filter(Project.competition_id == competition_id, Project.is_final == True,
+                                         Project.defense_order.is_(None)).count()
+        if remaining:
+            print(f"竞赛 {competition_id}：仍有 {remaining} 个决赛项目未分配答辩顺序（剩余抽签号不足）")
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -85,217 +122,114 @@ def index():
 @login_required
 def uploaded_file(filename):
     """提供上传文件的访问和下载，支持在线预览"""
-    from flask import send_from_directory, request, Response
+    from flask import request, abort
+    from sqlalchemy.orm import joinedload
     from config import Config
-    from pathlib import Path
     from models import ProjectAttachment
+    from utils.decorators import can_access_project
+    from utils.file_handler import send_protected_file, resolve_file_type, get_file_delivery, get_content_hash
     import os
-    import mimetypes
     
-    # 将Path对象转换为字符串
-    upload_folder = str(Config.UPLOAD_FOLDER)
+    upload_folder = os.path.normpath(str(Config.UPLOAD_FOLDER))
     
-    # 将URL中的正斜杠转换为系统路径分隔符（Windows使用反斜杠）
+    # 附件路径统一使用正斜杠保存（见 migrate_db.py），按索引只查询一次
     # filename可能包含子目录，如 "project_1/file.pdf" 或 "project_1\file.pdf"
-    filename_normalized = filename.replace('/', os.sep).replace('\\', os.sep)
+    relative_filename = filename.replace('\\', '/')
+    # 内容相同的附件共用同一个文件路径（见 utils/blob_store.py），附件链接带 attachment_id 时按ID确定附件，
+    # 原始文件名、文件类型取自该附件；没有ID时按当前用户有权查看的最早的附件确定文件类型，不使用其他用户附件的原始文件名
+    attachment_id = request.args.get('attachment_id', type=int)
+    attachments = ProjectAttachment.query.options(joinedload(ProjectAttachment.project)).filter_by(file_path=relative_filename)
+    if attachment_id:
+        attachments = attachments.filter_by(id=attachment_id)
+    attachments = attachments.order_by(ProjectAttachment.id).all()
+    
+    # 权限检查：存储路径由内容哈希确定、可以推算，需按文件所属的项目检查，不能只要求登录
+    # 项目附件和奖状只允许能查看该项目的用户访问（见 can_access_project），QQ群二维码所有登录用户可见，其余文件不允许访问
+    attachment = next((item for item in attachments if can_access_project(current_user, item.project)), None)
+    if attachment is None:
+        if attachments:
+            abort(403)
+        external_award = ExternalAward.query.filter(ExternalAward.certificate_file.in_(
+            [relative_filename, relative_filename.replace('/', '\\')]
+        )).first()
+        if external_award:
+            if not can_access_project(current_user, external_award.project):
+                abort(403)
+        elif not Competition.query.filter(Competition.qq_group_qrcode.in_(
+            [relative_filename, relative_filename.replace('/', '\\')]
+        )).first():
+            abort(403)
     
     # 构建完整文件路径
-    file_path = os.path.join(upload_folder, filename_normalized)
-    file_path = os.path.normpath(file_path)
-    upload_folder = os.path.normpath(upload_folder)
-    
-    # 如果文件不存在，尝试查找对应的附件记录以获取正确的文件路径和类型
-    if not os.path.exists(file_path):
-        # 尝试从数据库查找附件记录
-        # 将filename转换为可能的路径格式进行匹配
-        search_path = filename.replace('\\', '/').replace('/', os.sep)
-        attachment = ProjectAttachment.query.filter(
-            (ProjectAttachment.file_path == filename) |
-            (ProjectAttachment.file_path == filename.replace('/', '\\')) |
-            (ProjectAttachment.file_path == filename.replace('\\', '/'))
-        ).first()
-        
-        if attachment:
-            # 使用数据库中的路径重新构建文件路径
-            db_path = attachment.file_path.replace('/', os.sep).replace('\\', os.sep)
-            file_path = os.path.join(upload_folder, db_path)
-            file_path = os.path.normpath(file_path)
-            
-            # 如果文件仍然不存在，尝试添加扩展名
-            if not os.path.exists(file_path) and attachment.file_type:
-                # 尝试添加扩展名
-                file_path_with_ext = file_path + '.' + attachment.file_type
-                if os.path.exists(file_path_with_ext):
-                    file_path = file_path_with_ext
+    file_path = os.path.normpath(os.path.join(upload_folder, relative_filename.replace('/', os.sep)))
     
     # 安全检查：确保文件路径在upload文件夹内（防止路径遍历攻击）
     if not file_path.startswith(upload_folder):
-        from flask import abort
         abort(403)  # 禁止访问
     
-    if not os.path.exists(file_path):
-        from flask import abort
-        abort(404)
-    
-    # 如果请求参数中有download，则强制下载
-    as_attachment = request.args.get('download', 'false').lower() == 'true'
-    
-    # 首先尝试从数据库获取附件信息以确定文件类型
-    search_path = filename.replace('\\', '/').replace('/', os.sep)
-    attachment = ProjectAttachment.query.filter(
-        (ProjectAttachment.file_path == filename) |
-        (ProjectAttachment.file_path == filename.replace('/', '\\')) |
-        (ProjectAttachment.file_path == filename.replace('\\', '/'))
-    ).first()
+    if not os.path.isfile(file_path):
+        # 兼容早期保存时缺少扩展名的文件
+        if attachment and attachment.file_type and os.path.isfile(f'{file_path}.{attachment.file_type}'):
+            file_path = f'{file_path}.{attachment.file_type}'
+        else:
+            abort(404)
     
-    # 确定文件类型
-    file_type = None
+    # 内容哈希用作ETag：早期上传的附件由 migrate_db.py 补算哈希，尚未补算时使用按修改时间缓存的哈希（不写数据库）
+    content_hash = None
     if attachment:
-        # 优先使用 file_type，如果为空则从 original_filename 推断
-        file_type = attachment.file_type
-        if not file_type and attachment.original_filename:
-            # 从 original_filename 提取扩展名
-            if '.' in attachment.original_filename:
-                file_type = attachment.original_filename.rsplit('.', 1)[1].lower()
-            else:
-                # 如果 original_filename 本身就是类型名（如 'png'）
-                file_type = attachment.original_filename.lower()
-    
-    # 如果仍然无法确定，尝试从文件路径推断
-    if not file_type:
-        file_ext = os.path.splitext(file_path)[1].lower()
-        if file_ext:
-            file_type = file_ext[1:].lower()  # 去掉点号
-    
-    # 获取文件MIME类型
-    file_type_map = {
-        'pdf': 'application/pdf',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-        'gif': 'image/gif',
-        'doc': 'application/msword',
-        'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        'zip': 'application/zip',
-        'rar': 'application/x-rar-compressed'
-    }
-    
-    if file_type and file_type.lower() in file_type_map:
-        mimetype = file_type_map[file_type.lower()]
-    else:
-        # 尝试使用 mimetypes 模块推断
-        mimetype, _ = mimetypes.guess_type(file_path)
-        if mimetype is None:
-            mimetype = 'application/octet-stream'
+        content_hash = attachment.content_hash or get_content_hash(file_path)
+    
+    # 缩略图（?thumbnail=1）：评审页面的附件列表只加载几KB的WebP缩略图，按内容哈希缓存在上传目录
+    if request.args.get('thumbnail'):
+        from utils.thumbnails import get_thumbnail
+        content_hash = content_hash or get_content_hash(file_path)
+        thumbnail = get_thumbnail(file_path, resolve_file_type(attachment, file_path), content_hash)
+        if thumbnail is None:
+            abort(404)
+        return send_protected_file(
+            upload_folder,
+            thumbnail,
+            Config.UPLOADS_INTERNAL_LOCATION,
+            mimetype='image/webp',
+            etag=f'{content_hash}-{Config.THUMBNAIL_SIZE}'
+        )
     
-    # 对于图片和PDF，如果不强制下载，确保浏览器能够预览
-    # 注意：即使文件名没有扩展名，也要根据 file_type 设置正确的 MIME 类型
-    if not as_attachment:
-        if file_type and file_type.lower() in ['jpg', 'jpeg', 'png', 'gif', 'pdf']:
-            # 确保使用正确的MIME类型
-            if file_type.lower() == 'jpg' or file_type.lower() == 'jpeg':
-                mimetype = 'image/jpeg'
-            elif file_type.lower() == 'png':
-                mimetype = 'image/png'
-            elif file_type.lower() == 'gif':
-                mimetype = 'image/gif'
-            elif file_type.lower() == 'pdf':
-                mimetype = 'application/pdf'
+    # 如果请求参数中有download，则强制下载
+    as_attachment = request.args.get('download', 'false').lower() == 'true'
     
-    # send_from_directory需要相对于upload_folder的路径
-    # 使用os.path.relpath获取相对路径，然后转换为正斜杠用于URL
-    relative_filename = os.path.relpath(file_path, upload_folder)
-    # 确保使用正斜杠（URL标准）
-    relative_filename = relative_filename.replace('\\', '/')
+    # 确定文件类型：优先使用附件记录，其次使用文件扩展名；MIME类型和是否在线预览查预先计算的表
+    file_type = resolve_file_type(attachment, file_path)
+    mimetype, inline_preview = get_file_delivery(file_type, file_path)
     
-    # 创建响应
-    # 对于图片文件，如果文件名没有扩展名，需要确保浏览器能识别
-    # 先设置正确的响应头，再发送文件
-    if not as_attachment and file_type and file_type.lower() in ['jpg', 'jpeg', 'png', 'gif', 'pdf']:
-        # 确保使用正确的MIME类型
-        if file_type.lower() == 'jpg' or file_type.lower() == 'jpeg':
-            mimetype = 'image/jpeg'
-        elif file_type.lower() == 'png':
-            mimetype = 'image/png'
-        elif file_type.lower() == 'gif':
-            mimetype = 'image/gif'
-        elif file_type.lower() == 'pdf':
-            mimetype = 'application/pdf'
+    # send_protected_file需要相对于upload_folder的路径（正斜杠）
+    relative_filename = os.path.relpath(file_path, upload_folder).replace('\\', '/')
     
     # 如果下载文件且文件名没有扩展名，需要添加扩展名
     download_filename = None
-    if as_attachment:
-        # 确保 file_type 已正确识别
-        if not file_type and attachment:
-            if attachment.file_type:
-                file_type = attachment.file_type
-            elif attachment.original_filename:
-                if '.' in attachment.original_filename:
-                    file_type = attachment.original_filename.rsplit('.', 1)[1].lower()
-                else:
-                    # 如果 original_filename 本身就是类型名（如 'png'）
-                    file_type = attachment.original_filename.lower()
-        
-        # 检查文件名是否有扩展名
-        base_filename = os.path.basename(relative_filename)
-        if '.' not in base_filename and file_type:
-            # 如果文件名没有扩展名，添加扩展名
-            if attachment and attachment.original_filename and '.' in attachment.original_filename:
-                # 使用原始文件名（带扩展名）
-                download_filename = attachment.original_filename
-            else:
-                # 使用文件类型作为扩展名
-                download_filename = base_filename + '.' + file_type.lower()
-    
-    # 对于图片文件预览，不要使用 download_name，避免浏览器下载
-    if not as_attachment and file_type and file_type.lower() in ['jpg', 'jpeg', 'png', 'gif']:
-        response = send_from_directory(
-            upload_folder, 
-            relative_filename, 
-            as_attachment=False,
-            mimetype=mimetype
-        )
-    else:
-        response = send_from_directory(
-            upload_folder, 
-            relative_filename, 
-            as_attachment=as_attachment,
-            mimetype=mimetype,
-            download_name=download_filename
-        )
+    if as_attachment and file_type and '.' not in os.path.basename(relative_filename):
+        if attachment_id and attachment and attachment.original_filename and '.' in attachment.original_filename:
+            # 使用原始文件名（带扩展名）
+            download_filename = attachment.original_filename
+        else:
+            # 使用文件类型作为扩展名
+            download_filename = f'{os.path.basename(relative_filename)}.{file_type}'
+    
+    # 开启 USE_X_ACCEL_REDIRECT 时由nginx发送文件内容，下面设置的响应头会原样返回给浏览器
+    response = send_protected_file(
+        upload_folder,
+        relative_filename,
+        Config.UPLOADS_INTERNAL_LOCATION,
+        as_attachment=as_attachment,
+        mimetype=mimetype,
+        download_name=download_filename,
+        etag=content_hash
+    )
     
     # 对于图片和PDF文件，确保浏览器能够预览而不是下载
-    # 重要：即使文件名没有扩展名，也要根据 file_type 强制设置正确的响应头
-    if not as_attachment:
-        # 确保 file_type 已正确识别（可能在响应创建时丢失）
-        if not file_type and attachment:
-            if attachment.file_type:
-                file_type = attachment.file_type
-            elif attachment.original_filename:
-                if '.' in attachment.original_filename:
-                    file_type = attachment.original_filename.rsplit('.', 1)[1].lower()
-                else:
-                    # 如果 original_filename 本身就是类型名（如 'png'）
-                    file_type = attachment.original_filename.lower()
-        
-        if file_type and file_type.lower() in ['jpg', 'jpeg', 'png', 'gif', 'pdf']:
-            # 强制设置 Content-Disposition 为 inline，覆盖任何可能的 attachment 设置
-            # 对于图片，必须明确设置为 inline，否则浏览器可能下载而不是预览
-            if file_type.lower() in ['jpg', 'jpeg', 'png', 'gif']:
-                response.headers['Content-Disposition'] = 'inline'
-                # 确保 MIME 类型正确（覆盖 send_from_directory 可能设置的错误类型）
-                if file_type.lower() == 'jpg' or file_type.lower() == 'jpeg':
-                    response.headers['Content-Type'] = 'image/jpeg'
-                elif file_type.lower() == 'png':
-                    response.headers['Content-Type'] = 'image/png'
-                elif file_type.lower() == 'gif':
-                    response.headers['Content-Type'] = 'image/gif'
-                # 移除可能存在的 filename 参数，避免浏览器下载
-                if 'filename=' in response.headers.get('Content-Disposition', ''):
-                    response.headers['Content-Disposition'] = 'inline'
-            elif file_type.lower() == 'pdf':
-                response.headers['Content-Disposition'] = 'inline'
-                response.headers['Content-Type'] = 'application/pdf'
+    # 重要：即使文件名没有扩展名，也要根据 file_type 强制设置 inline，且不带 filename 参数
+    if not as_attachment and inline_preview:
+        response.headers['Content-Disposition'] = 'inline'
+        response.headers['Content-Type'] = mimetype
     
     return response
 
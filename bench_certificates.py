@@ -0,0 +1,53 @@
+"""
+证书生成微基准脚本
+在临时目录中按各输出格式生成证书，输出每秒生成的证书数和平均文件大小；
+“绘制”一项只绘制不保存，“无底图缓存”一项每张证书都重新绘制底图（相当于优化前的绘制方式）
+
+用法：python bench_certificates.py [证书数量]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from config import Config
+from utils import certificate
+from utils.certificate import CERTIFICATE_FORMATS, render_certificate, save_certificate_image
+
+
+def bench_certificates(count=50):
+    """返回 {场景: (每秒证书数, 平均文件大小KB)}"""
+    results = {}
+    certificate.get_fonts()
+
+    start = time.perf_counter()
+    for i in range(count):
+        certificate._render_template.cache_clear()
+        render_certificate(f'队伍{i}', '一等奖', '“挑战杯”全国大学生课外学术科技作品竞赛', 2024)
+    results['绘制（无底图缓存）'] = (count / (time.perf_counter() - start), 0)
+
+    start = time.perf_counter()
+    for i in range(count):
+        render_certificate(f'队伍{i}', '一等奖', '“挑战杯”全国大学生课外学术科技作品竞赛', 2024)
+    results['绘制'] = (count / (time.perf_counter() - start), 0)
+
+    with tempfile.TemporaryDirectory(prefix='bench_certificates_') as tmp_dir:
+        for image_format, (extension, _) in CERTIFICATE_FORMATS.items():
+            total_size = 0
+            start = time.perf_counter()
+            for i in range(count):
+                img = render_certificate(f'队伍{i}', '一等奖', '“挑战杯”全国大学生课外学术科技作品竞赛', 2024)
+                cert_path = Path(tmp_dir) / f'{i}.{extension}'
+                save_certificate_image(img, cert_path, image_format)
+                total_size += os.path.getsize(cert_path)
+            elapsed = time.perf_counter() - start
+            options = Config.CERTIFICATE_SAVE_OPTIONS.get(image_format, {})
+            results[f'{image_format} {options}'] = (count / elapsed, total_size / count / 1024)
+    return results
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    for name, (per_second, size_kb) in bench_certificates(count).items():
+        suffix = f'，平均 {size_kb:.0f} KB' if size_kb else ''
+        print(f'{name}：{per_second:.1f} 张/秒{suffix}')
@@ -0,0 +1,96 @@
+"""
+答辩抽签并发压测脚本
+在临时 SQLite 数据库中创建一个有 N 个决赛项目的竞赛，用多个线程同时抽签（每个项目同时提交多次），
+检查抽到的答辩顺序互不重复且正好覆盖 1..N，并输出耗时和每秒抽签数
+
+用法：python bench_defense_draw.py [决赛项目数] [线程数]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+_tmp_dir = tempfile.TemporaryDirectory(prefix='bench_defense_draw_')
+# 必须在导入 app 之前设置，应用按 DATABASE_URL 连接数据库
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir.name, 'bench.db')}"
+
+from app import app  # noqa: E402
+from models import db, User, Team, Competition, Project, DefenseSlot, UserRole  # noqa: E402
+from utils.defense_order import claim_defense_order  # noqa: E402
+
+# 每个项目同时提交的抽签请求数（模拟队长重复点击）
+REQUESTS_PER_PROJECT = 2
+
+
+def create_competition(project_count):
+    """创建竞赛和 project_count 个决赛项目，返回 (竞赛ID, 项目ID列表)"""
+    leader = User(username='bench_leader', work_id='bench_leader', real_name='压测', role=UserRole.STUDENT)
+    leader.set_password('bench')
+    db.session.add(leader)
+    db.session.flush()
+    competition = Competition(name='答辩抽签压测', year=2024)
+    db.session.add(competition)
+    db.session.flush()
+    project_ids = []
+    for i in range(project_count):
+        team = Team(name=f'压测队伍{i}', leader_id=leader.id, competition_id=competition.id)
+        db.session.add(team)
+        db.session.flush()
+        project = Project(title=f'压测项目{i}', team_id=team.id, competition_id=competition.id, is_final=True)
+        db.session.add(project)
+        db.session.flush()
+        project_ids.append(project.id)
+    db.session.commit()
+    return competition.id, project_ids
+
+
+def draw(project_id):
+    """在独立的应用上下文（独立会话）中抽签，返回 (项目ID, 答辩顺序)"""
+    with app.app_context():
+        project = db.session.get(Project, project_id)
+        order = claim_defense_order(project)
+        db.session.remove()
+        return project_id, order
+
+
+def bench_defense_draw(project_count=200, threads=32):
+    """返回 (耗时秒数, 抽签请求数)，结果不正确时抛出 AssertionError"""
+    with app.app_context():
+        db.create_all()
+        competition_id, project_ids = create_competition(project_count)
+
+    requests = project_ids * REQUESTS_PER_PROJECT
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(draw, requests))
+    elapsed = time.perf_counter() - start
+
+    # 同一项目的重复请求必须得到同一个顺序
+    drawn = {}
+    for project_id, order in results:
+        assert order is not None, f'项目 {project_id} 没有抽到答辩顺序'
+        assert drawn.setdefault(project_id, order) == order, f'项目 {project_id} 抽到了多个答辩顺序'
+
+    with app.app_context():
+        stored = dict(db.session.query(Project.id, Project.defense_order).filter(Project.competition_id == competition_id))
+        claimed = dict(db.session.query(DefenseSlot.project_id, DefenseSlot.defense_order).filter(
+            DefenseSlot.competition_id == competition_id, DefenseSlot.project_id.isnot(None)))
+    assert stored == drawn, '数据库中的答辩顺序与抽签结果不一致'
+    assert claimed == drawn, '抽签号领取记录与答辩顺序不一致'
+    duplicates = [order for order, count in Counter(drawn.values()).items() if count > 1]
+    assert not duplicates, f'答辩顺序重复：{duplicates}'
+    assert sorted(drawn.values()) == list(range(1, project_count + 1)), '答辩顺序没有覆盖 1..N'
+    return elapsed, len(requests)
+
+
+if __name__ == '__main__':
+    project_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    try:
+        elapsed, request_count = bench_defense_draw(project_count, threads)
+        print(f'{project_count} 个决赛项目，{threads} 个线程，{request_count} 次抽签请求')
+        print(f'耗时 {elapsed:.2f} 秒，{request_count / elapsed:.1f} 次/秒；答辩顺序无重复且覆盖 1..{project_count}')
+    finally:
+        _tmp_dir.cleanup()
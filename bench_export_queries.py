@@ -0,0 +1,130 @@
+"""
+项目和评分导出的SQL查询次数检查脚本
+使用临时数据库生成项目（含队长、成员、赛道、奖项、省赛/国赛奖状和评分），分两次增加项目数量，
+请求校级项目导出、评分导出（CSV/XLSX）和学院项目导出，统计每次导出的SQL查询次数和耗时，
+并检查项目数增加到 LARGE_PROJECT_COUNT 后查询次数不变（集合关系按整个导出一次加载，与项目、成员、评分的行数和读取批次无关）
+
+用法：python bench_export_queries.py [第一次生成的项目数量]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 在导入应用前指定临时数据库，避免影响正式数据
+_tmp_dir = tempfile.mkdtemp(prefix='bench_export_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from sqlalchemy import event
+from app import app
+from models import (db, User, UserRole, Competition, Track, Team, Project, ProjectTrack, ProjectMember, Award,
+                    ExternalAward, Score, ReviewStatus)
+from utils.export import EXPORT_BATCH_SIZE
+
+COLLEGE = '计算机学院'
+JUDGE_COUNT = 5
+MEMBERS_PER_PROJECT = 3
+
+# 第二次生成后的项目数量（导出的目标规模）
+LARGE_PROJECT_COUNT = 2000
+
+# 导出场景：(名称, 请求的用户, URL)
+EXPORTS = (
+    ('项目导出CSV', 'school_admin', '/school_admin/export/projects?format=csv'),
+    ('项目导出XLSX', 'school_admin', '/school_admin/export/projects?format=xlsx'),
+    ('评分导出CSV', 'school_admin', '/school_admin/export/scores?format=csv'),
+    ('评分导出XLSX', 'school_admin', '/school_admin/export/scores?format=xlsx'),
+    ('学院项目导出', 'college_admin', '/college_admin/export/projects'),
+)
+
+
+def create_projects(start, count, competition_id, track_id, leader_id, judge_ids):
+    """生成 count 个已通过学校审核的项目及其关联数据"""
+    for i in range(start, start + count):
+        team = Team(name=f'队伍{i}', leader_id=leader_id, competition_id=competition_id)
+        db.session.add(team)
+        db.session.flush()
+        project = Project(title=f'项目{i}', description='项目简介', team_id=team.id, competition_id=competition_id,
+                          status=ReviewStatus.FINAL_APPROVED, push_college=COLLEGE)
+        db.session.add(project)
+        db.session.flush()
+        db.session.add(ProjectTrack(project_id=project.id, track_id=track_id))
+        db.session.add(Award(project_id=project.id, award_name='一等奖'))
+        db.session.add(ExternalAward(project_id=project.id, award_level='省赛', award_name='二等奖', uploaded_by=leader_id))
+        db.session.add_all([ProjectMember(project_id=project.id, order=order + 2, member_name=f'成员{i}_{order}')
+                            for order in range(MEMBERS_PER_PROJECT)])
+        db.session.add_all([Score(project_id=project.id, judge_id=judge_id, score_value=80) for judge_id in judge_ids])
+    db.session.commit()
+
+
+def count_export_queries(users, query_count):
+    """依次请求各导出，返回 {场景: (SQL查询次数, 毫秒)}"""
+    results = {}
+    for name, role, url in EXPORTS:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(users[role])
+            session['_fresh'] = True
+        query_count[0] = 0
+        start = time.perf_counter()
+        response = client.get(url)
+        body = response.get_data()
+        elapsed = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200 and body, f'{name} 失败：{response.status_code}'
+        results[name] = (query_count[0], elapsed)
+    return results
+
+
+def bench_export_queries(project_count=EXPORT_BATCH_SIZE):
+    """返回 [(项目数, {场景: (SQL查询次数, 毫秒)})]，查询次数随行数增加时抛出 AssertionError"""
+    with app.app_context():
+        db.create_all()
+        school_admin = User(username='bench_school_admin', real_name='校级管理员', role=UserRole.SCHOOL_ADMIN, password_hash='bench')
+        college_admin = User(username='bench_college_admin', real_name='学院管理员', role=UserRole.COLLEGE_ADMIN,
+                             college=COLLEGE, password_hash='bench')
+        leader = User(username='bench_leader', real_name='队长', role=UserRole.STUDENT, college=COLLEGE, password_hash='bench')
+        judges = [User(username=f'bench_judge_{i}', real_name=f'评委{i}', role=UserRole.JUDGE, password_hash='bench')
+                  for i in range(JUDGE_COUNT)]
+        competition = Competition(name='导出压测', year=2024)
+        db.session.add_all([school_admin, college_admin, leader, competition] + judges)
+        db.session.flush()
+        track = Track(name='赛道', competition_id=competition.id)
+        db.session.add(track)
+        db.session.commit()
+        users = {'school_admin': school_admin.id, 'college_admin': college_admin.id}
+
+        query_count = [0]
+
+        def count_query(*args):
+            query_count[0] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+        engine = db.engine
+        competition_id, track_id, leader_id = competition.id, track.id, leader.id
+        judge_ids = [judge.id for judge in judges]
+
+    # 导出请求在应用上下文外发出，每个请求使用独立的应用上下文（登录用户不会在请求之间共享）
+    rounds = []
+    created = 0
+    for target in (project_count, max(project_count * 3, LARGE_PROJECT_COUNT)):
+        event.remove(engine, 'before_cursor_execute', count_query)
+        with app.app_context():
+            create_projects(created, target - created, competition_id, track_id, leader_id, judge_ids)
+        created = target
+        event.listen(engine, 'before_cursor_execute', count_query)
+        rounds.append((target, count_export_queries(users, query_count)))
+
+    # 项目数增加后查询次数不变
+    (small_count, small), (large_count, large) = rounds
+    for name, _, _ in EXPORTS:
+        assert large[name][0] == small[name][0], \
+            f'{name}：项目数从 {small_count} 增加到 {large_count}，查询次数从 {small[name][0]} 变为 {large[name][0]}'
+    return rounds
+
+
+if __name__ == '__main__':
+    project_count = int(sys.argv[1]) if len(sys.argv) > 1 else EXPORT_BATCH_SIZE
+    for count, results in bench_export_queries(project_count):
+        print(f'{count} 个项目（每个项目 {MEMBERS_PER_PROJECT} 名成员、{JUDGE_COUNT} 条评分）：')
+        for name, (queries, elapsed_ms) in results.items():
+            print(f'  {name}：{queries} 次SQL查询，{elapsed_ms:.1f} ms')
@@ -0,0 +1,82 @@
+"""
+批量分配评委微基准脚本
+使用临时数据库生成一个竞赛的若干已通过学校审核的项目和评委（部分评委与项目推送学院相同），
+计时计算分配方案和批量写入，并检查每个项目的评委数、回避规则和评委负载是否平均
+
+用法：python bench_judge_assignment.py [项目数量] [评委数量] [每个项目的评委数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 在导入应用前指定临时数据库，避免影响正式数据
+_tmp_dir = tempfile.mkdtemp(prefix='bench_judge_assignment_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from collections import Counter
+from app import app
+from models import db, User, UserRole, Competition, Team, Project, JudgeAssignment, ReviewStatus
+from utils.judge_assignment import plan_judge_assignments, apply_judge_assignments
+
+COLLEGE_COUNT = 20
+
+
+def bench_judge_assignment(project_count=1000, judge_count=60, judges_per_project=3):
+    """返回 {阶段: 毫秒}，分配结果不正确时抛出 AssertionError"""
+    colleges = [f'学院{i}' for i in range(COLLEGE_COUNT)]
+    with app.app_context():
+        db.create_all()
+        leader = User(username='bench_leader', real_name='队长', role=UserRole.STUDENT, password_hash='bench')
+        # 一半评委是校内评委（有学院），需要回避本学院推送的项目
+        judges = [User(username=f'bench_judge_{i}', real_name=f'评委{i}', role=UserRole.JUDGE, password_hash='bench',
+                       college=colleges[i % COLLEGE_COUNT] if i % 2 == 0 else None,
+                       unit='校外单位' if i % 2 else None)
+                  for i in range(judge_count)]
+        competition = Competition(name='评委分配压测', year=2024)
+        db.session.add_all([leader, competition] + judges)
+        db.session.flush()
+        team = Team(name='压测队伍', leader_id=leader.id, competition_id=competition.id)
+        db.session.add(team)
+        db.session.flush()
+        db.session.add_all([Project(title=f'项目{i}', team_id=team.id, competition_id=competition.id,
+                                    status=ReviewStatus.FINAL_APPROVED, push_college=colleges[i % COLLEGE_COUNT])
+                            for i in range(project_count)])
+        db.session.commit()
+        competition_id = competition.id
+        judge_ids = [judge.id for judge in judges]
+        judge_colleges = {judge.id: judge.college for judge in judges}
+
+        results = {}
+        start = time.perf_counter()
+        plan = plan_judge_assignments(competition_id, judge_ids, judges_per_project)
+        results['计算分配方案'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        count = apply_judge_assignments(plan)
+        results['批量写入'] = (time.perf_counter() - start) * 1000
+
+        rows = db.session.query(JudgeAssignment.project_id, JudgeAssignment.judge_id, Project.push_college).join(
+            Project, Project.id == JudgeAssignment.project_id).all()
+        assert count == len(rows) == project_count * judges_per_project, '分配数量不正确'
+        assert not plan['shortfalls'], f'{len(plan["shortfalls"])} 个项目评委不足'
+        per_project = Counter(project_id for project_id, _, _ in rows)
+        assert set(per_project.values()) == {judges_per_project}, '项目的评委数不正确'
+        assert all(judge_colleges[judge_id] != push_college for _, judge_id, push_college in rows), '存在需要回避的分配'
+        loads = Counter(judge_id for _, judge_id, _ in rows)
+        assert max(loads.values()) - min(loads.values()) <= 1, f'评委负载不平均：{min(loads.values())}~{max(loads.values())}'
+
+        # 再次分配时所有项目的评委已满，不应新增
+        start = time.perf_counter()
+        assert not plan_judge_assignments(competition_id, judge_ids, judges_per_project)['assignments'], '重复分配'
+        results['再次计算（无需分配）'] = (time.perf_counter() - start) * 1000
+    return results
+
+
+if __name__ == '__main__':
+    project_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    judge_count = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    judges_per_project = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    print(f'{project_count} 个项目，{judge_count} 名评委，每个项目 {judges_per_project} 名评委')
+    for name, elapsed_ms in bench_judge_assignment(project_count, judge_count, judges_per_project).items():
+        print(f'{name}：{elapsed_ms:.1f} ms')
@@ -0,0 +1,95 @@
+"""
+评委评审清单（judge.worklist_api）微基准脚本
+使用临时数据库生成若干项目、附件、评委分配和评分后，以一名评委身份反复请求评审清单接口，
+输出每次请求的平均耗时和SQL查询次数
+
+用法：python bench_judge_worklist.py [项目数量] [每名评委分配的项目数] [请求次数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 在导入应用前指定临时数据库，避免影响正式数据
+_tmp_dir = tempfile.mkdtemp(prefix='bench_worklist_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from sqlalchemy import event
+from app import app
+from models import db, User, UserRole, Competition, Team, Project, ProjectAttachment, JudgeAssignment, Score
+
+JUDGE_COUNT = 60
+
+
+def bench_judge_worklist(project_count=2000, assignments_per_judge=80, request_count=200):
+    """生成测试数据并请求评审清单接口，返回 {场景: (平均毫秒, 每次请求的SQL查询数)}"""
+    with app.app_context():
+        db.create_all()
+        leader = User(username='bench_leader', real_name='队长', role=UserRole.STUDENT)
+        judges = [User(username=f'bench_judge_{i}', real_name=f'评委{i}', role=UserRole.JUDGE) for i in range(JUDGE_COUNT)]
+        for user in [leader] + judges:
+            user.password_hash = 'bench'
+        db.session.add_all([leader] + judges)
+        competitions = [Competition(name=f'竞赛{i}', year=2024) for i in range(3)]
+        db.session.add_all(competitions)
+        db.session.flush()
+
+        project_ids = []
+        for i in range(project_count):
+            competition = competitions[i % len(competitions)]
+            team = Team(name=f'队伍{i}', leader_id=leader.id, competition_id=competition.id)
+            db.session.add(team)
+            db.session.flush()
+            project = Project(title=f'项目{i}', description='项目简介' * 40, team_id=team.id, competition_id=competition.id)
+            db.session.add(project)
+            db.session.flush()
+            project_ids.append(project.id)
+            db.session.add_all([ProjectAttachment(project_id=project.id, filename=f'{i}_{j}.pdf', original_filename=f'附件{j}.pdf',
+                                                  file_path=f'project_{project.id}/{i}_{j}.pdf', file_type='pdf')
+                                for j in range(3)])
+
+        # 每名评委分配 assignments_per_judge 个项目，约一半已评分
+        for judge_index, judge in enumerate(judges):
+            for k in range(assignments_per_judge):
+                project_id = project_ids[(judge_index * assignments_per_judge + k) % project_count]
+                db.session.add(JudgeAssignment(judge_id=judge.id, project_id=project_id))
+                if k % 2 == 0:
+                    db.session.add(Score(project_id=project_id, judge_id=judge.id, score_value=80 + k % 20))
+        db.session.commit()
+        judge_id = judges[0].id
+        competition_id = competitions[0].id
+
+        query_count = [0]
+
+        def count_query(*args):
+            query_count[0] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(judge_id)
+        session['_fresh'] = True
+
+    results = {}
+    for name, query_string in (('全部', f'?per_page={assignments_per_judge}'),
+                               ('待评分', '?unscored=1'),
+                               ('按竞赛', f'?competition_id={competition_id}'),
+                               ('评审项目页', None)):
+        url = '/judge/projects' if query_string is None else f'/judge/api/worklist{query_string}'
+        query_count[0] = 0
+        start = time.perf_counter()
+        for _ in range(request_count):
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - start
+        results[name] = (elapsed * 1000 / request_count, query_count[0] / request_count)
+    return results
+
+
+if __name__ == '__main__':
+    project_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    assignments_per_judge = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    request_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    for name, (avg_ms, queries) in bench_judge_worklist(project_count, assignments_per_judge, request_count).items():
+        print(f'{name}：平均 {avg_ms:.3f} ms/请求，{queries:.1f} 次SQL查询/请求')
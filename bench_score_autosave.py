@@ -0,0 +1,139 @@
+"""
+评分自动保存并发压测脚本
+使用临时 SQLite 数据库，多名评委（每人一个线程）同时通过 /judge/api/scores 分批自动保存评分，
+每名评委另用一个过期的版本号提交一次以检查乐观并发冲突。
+输出请求数、平均/P95耗时和失败数，并检查评分版本号、项目评分汇总与评分表一致，且保存评分不改动决赛名单
+
+用法：python bench_score_autosave.py [评委数] [每名评委的项目数] [每名评委的保存次数]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 在导入应用前指定临时数据库，避免影响正式数据
+_tmp_dir = tempfile.mkdtemp(prefix='bench_score_autosave_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from sqlalchemy import func
+from app import app
+from models import db, User, UserRole, Competition, Team, Project, JudgeAssignment, Score, ReviewStatus
+from utils.scoring import calculate_trimmed_avg
+
+# 每次自动保存提交的评分数
+BATCH_SIZE = 5
+
+
+def create_data(judge_count, projects_per_judge):
+    """创建竞赛、项目和评委，每个项目分配给相邻的3名评委；返回 {评委ID: [项目ID]}"""
+    leader = User(username='bench_leader', real_name='队长', role=UserRole.STUDENT, password_hash='bench')
+    judges = [User(username=f'bench_judge_{i}', real_name=f'评委{i}', role=UserRole.JUDGE, password_hash='bench')
+              for i in range(judge_count)]
+    competition = Competition(name='评分压测', year=2024, final_quota=10)
+    db.session.add_all([leader, competition] + judges)
+    db.session.flush()
+    team = Team(name='压测队伍', leader_id=leader.id, competition_id=competition.id)
+    db.session.add(team)
+    db.session.flush()
+    project_count = judge_count * projects_per_judge // 3
+    projects = [Project(title=f'项目{i}', team_id=team.id, competition_id=competition.id,
+                        status=ReviewStatus.FINAL_APPROVED) for i in range(project_count)]
+    db.session.add_all(projects)
+    db.session.flush()
+    judge_projects = {judge.id: [] for judge in judges}
+    for index, project in enumerate(projects):
+        for offset in range(3):
+            judge = judges[(index * 3 // projects_per_judge + offset) % judge_count]
+            if project.id not in judge_projects[judge.id]:
+                judge_projects[judge.id].append(project.id)
+                db.session.add(JudgeAssignment(judge_id=judge.id, project_id=project.id))
+    db.session.commit()
+    return judge_projects
+
+
+def run_judge(judge_id, project_ids, save_count):
+    """模拟一名评委的自动保存：每次保存 BATCH_SIZE 个项目，带上次保存返回的版本号；返回 (耗时列表, 失败数, 冲突数)"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(judge_id)
+        session['_fresh'] = True
+    versions = {project_id: 0 for project_id in project_ids}
+    latencies = []
+    failures = 0
+    for i in range(save_count):
+        batch = [project_ids[(i * BATCH_SIZE + k) % len(project_ids)] for k in range(BATCH_SIZE)]
+        scores = [{'project_id': project_id, 'score_value': 60 + (i * 7 + k) % 40, 'comment': f'第{i}次保存',
+                   'version': versions[project_id]} for k, project_id in enumerate(dict.fromkeys(batch))]
+        start = time.perf_counter()
+        response = client.post('/judge/api/scores', json={'scores': scores})
+        latencies.append(time.perf_counter() - start)
+        data = response.get_json(silent=True) or {}
+        if response.status_code != 200 or not data.get('success'):
+            failures += 1
+            continue
+        for saved in data['saved']:
+            versions[saved['project_id']] = saved['version']
+
+    # 使用过期的版本号提交，应返回冲突且不覆盖评分
+    stale_project = project_ids[0]
+    response = client.post('/judge/api/scores', json={'scores': [
+        {'project_id': stale_project, 'score_value': 1, 'version': versions[stale_project] - 1}
+    ]})
+    conflicts = len((response.get_json(silent=True) or {}).get('conflicts', []))
+    return latencies, failures, conflicts
+
+
+def bench_score_autosave(judge_count=30, projects_per_judge=20, save_count=40):
+    """返回统计结果字典，数据不一致时抛出 AssertionError"""
+    with app.app_context():
+        db.create_all()
+        judge_projects = create_data(judge_count, projects_per_judge)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=judge_count) as executor:
+        results = list(executor.map(lambda item: run_judge(item[0], item[1], save_count), judge_projects.items()))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for judge_latencies, _, _ in results for latency in judge_latencies)
+    failures = sum(failure for _, failure, _ in results)
+    conflicts = sum(conflict for _, _, conflict in results)
+
+    with app.app_context():
+        assert not db.session.query(Score.id).filter(Score.score_value == 1).first(), '过期版本号的评分被保存'
+        # 每个评分的版本号等于该评委保存该项目的次数
+        for judge_id, project_ids in judge_projects.items():
+            expected = {}
+            for i in range(save_count):
+                for project_id in dict.fromkeys(project_ids[(i * BATCH_SIZE + k) % len(project_ids)] for k in range(BATCH_SIZE)):
+                    expected[project_id] = expected.get(project_id, 0) + 1
+            stored = dict(db.session.query(Score.project_id, Score.version).filter(Score.judge_id == judge_id))
+            assert stored == expected, f'评委 {judge_id} 的评分版本号不正确'
+        # 项目评分汇总与评分表一致
+        stats = db.session.query(Score.project_id, func.count(Score.id), func.sum(Score.score_value),
+                                 func.min(Score.score_value), func.max(Score.score_value)).group_by(Score.project_id)
+        for project_id, count, total, low, high in stats:
+            project = db.session.get(Project, project_id)
+            assert project.score_count == count and abs(project.score_sum - total) < 1e-6, f'项目 {project_id} 评分汇总不正确'
+            assert abs(project.score_trimmed_avg - calculate_trimmed_avg(count, total, low, high)) < 1e-6
+        # 保存评分不更新决赛名单（由管理员设置名额或更新决赛名单时计算）
+        assert not Project.query.filter(Project.is_final == True).count(), '保存评分时更新了决赛名单'
+
+    return {
+        'requests': len(latencies),
+        'elapsed': elapsed,
+        'avg_ms': sum(latencies) / len(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'failures': failures,
+        'conflicts': conflicts,
+    }
+
+
+if __name__ == '__main__':
+    judge_count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    projects_per_judge = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    save_count = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+    stats = bench_score_autosave(judge_count, projects_per_judge, save_count)
+    print(f'{judge_count} 名评委同时自动保存，每次 {BATCH_SIZE} 个评分，共 {stats["requests"]} 次请求，耗时 {stats["elapsed"]:.2f} 秒')
+    print(f'平均 {stats["avg_ms"]:.1f} ms/请求，P95 {stats["p95_ms"]:.1f} ms；失败 {stats["failures"]} 次；'
+          f'过期版本号冲突 {stats["conflicts"]}/{judge_count}')
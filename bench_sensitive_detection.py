@@ -0,0 +1,137 @@
+"""
+脱敏识别并发检测（SensitiveDetector.iter_detect_attachments）测试脚本
+在本机启动一个模拟千问视觉API的HTTP服务（按图片内容决定响应延迟），检查：
+并发请求数不超过 SENSITIVE_DETECTION_WORKERS、超过总时限时已完成的附件正常返回而其余附件返回超时结果、
+单次请求超时生效，并输出各场景的耗时
+
+用法：python bench_sensitive_detection.py [并发数] [附件数量]
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import Config
+
+# 图片文件内容即模拟API的响应延迟（秒）
+FAST_DELAY = 0.2
+SLOW_DELAY = 5.0
+
+
+class StubQwenHandler(BaseHTTPRequestHandler):
+    """模拟千问视觉API：按请求中图片的内容延迟响应，并记录同时处理的请求数"""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        image = payload['input']['messages'][0]['content'][0]['image']
+        delay = float(base64.b64decode(image.split(',', 1)[1]))
+
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(delay)
+            body = json.dumps({'output': {'choices': [{'message': {'content': '检测结果：未发现敏感信息'}}]}}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已超时断开
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    """启动模拟API服务，返回 (服务, URL)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubQwenHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def make_images(directory, delays):
+    """生成内容为响应延迟的图片文件，返回 [(文件路径, 文件类型)]"""
+    attachments = []
+    for index, delay in enumerate(delays):
+        file_path = os.path.join(directory, f'{index}.png')
+        with open(file_path, 'w') as f:
+            f.write(str(delay))
+        attachments.append((file_path, 'png'))
+    return attachments
+
+
+def run_detection(url, attachments, workers, total_timeout, request_timeout):
+    """按给定限制检测附件，返回 (结果列表, 每个结果返回时的耗时秒数, 总耗时秒数)"""
+    from utils.ai_sensitive_detection import SensitiveDetector
+    Config.SENSITIVE_DETECTION_WORKERS = workers
+    Config.SENSITIVE_TOTAL_TIMEOUT = total_timeout
+    Config.SENSITIVE_REQUEST_TIMEOUT = request_timeout
+    results = [None] * len(attachments)
+    arrived = [None] * len(attachments)
+    start = time.perf_counter()
+    with SensitiveDetector(api_key='bench', vl_api_base_url=url) as detector:
+        for index, result in detector.iter_detect_attachments(attachments):
+            results[index] = result
+            arrived[index] = time.perf_counter() - start
+    return results, arrived, time.perf_counter() - start
+
+
+def bench_sensitive_detection(workers=4, attachment_count=12):
+    """返回 {场景: 耗时秒数}，结果不正确时抛出 AssertionError"""
+    server, url = start_stub_server()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_sensitive_') as directory:
+        # 并发上限：同时发往API的请求数不超过并发数，全部附件正常返回
+        attachments = make_images(directory, [FAST_DELAY] * attachment_count)
+        detected, _, elapsed = run_detection(url, attachments, workers, total_timeout=30, request_timeout=10)
+        assert all(result['error'] is None for result in detected), [result['error'] for result in detected]
+        assert server.max_active == min(workers, attachment_count), f'同时处理的请求数为 {server.max_active}'
+        expected = FAST_DELAY * -(-attachment_count // workers)
+        assert elapsed < expected * 2, f'并发检测耗时 {elapsed:.2f} 秒，预期约 {expected:.2f} 秒'
+        results['并发上限'] = elapsed
+
+        # 总时限：快的附件按完成先后立即返回，慢的附件在总时限到达时返回超时结果
+        total_timeout = 1.0
+        delays = [FAST_DELAY, SLOW_DELAY] * (workers // 2 or 1)
+        attachments = make_images(directory, delays)
+        detected, arrived, elapsed = run_detection(url, attachments, workers, total_timeout=total_timeout, request_timeout=10)
+        for delay, result, arrived_at in zip(delays, detected, arrived):
+            if delay == FAST_DELAY:
+                assert result['error'] is None, result['error']
+                assert arrived_at < total_timeout, f'已完成的附件在 {arrived_at:.2f} 秒才返回'
+            else:
+                assert result['error'], '超过总时限的附件没有返回超时结果'
+        assert elapsed < total_timeout + 0.5, f'超过总时限后仍等待了 {elapsed:.2f} 秒'
+        results['总时限（部分结果）'] = elapsed
+
+        # 单次请求超时：总时限内单个请求超过 SENSITIVE_REQUEST_TIMEOUT 时返回失败结果
+        request_timeout = 0.5
+        attachments = make_images(directory, [SLOW_DELAY])
+        detected, _, elapsed = run_detection(url, attachments, workers, total_timeout=30, request_timeout=request_timeout)
+        assert detected[0]['error'], '单次请求超时没有生效'
+        assert elapsed < request_timeout + 0.5, f'单次请求超时后仍等待了 {elapsed:.2f} 秒'
+        results['单次请求超时'] = elapsed
+    server.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    attachment_count = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    print(f'并发数 {workers}，{attachment_count} 个附件，模拟API响应延迟 {FAST_DELAY} 秒（慢请求 {SLOW_DELAY} 秒）')
+    for name, elapsed in bench_sensitive_detection(workers, attachment_count).items():
+        print(f'{name}：{elapsed:.2f} 秒')
@@ -0,0 +1,112 @@
+"""
+附件访问路由（uploaded_file）微基准脚本
+使用临时数据库和临时上传目录，生成若干项目的附件后分别以校级管理员和队长身份反复请求预览和下载，
+输出每次请求的平均耗时和SQL查询次数（含加载登录用户和权限检查），并检查其他队伍的学生访问时返回403
+
+用法：python bench_uploaded_file.py [附件数量] [请求次数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 在导入应用前指定临时数据库，避免影响正式数据
+_tmp_dir = tempfile.mkdtemp(prefix='bench_uploads_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.pop('USE_X_ACCEL_REDIRECT', None)
+
+from pathlib import Path
+from sqlalchemy import event
+from app import app
+from config import Config
+from models import db, User, UserRole, Competition, Team, TeamMember, Project, ProjectAttachment
+from utils.file_handler import file_sha256
+
+FILE_TYPES = ('pdf', 'png', 'docx', 'zip')
+
+
+# 每个项目的附件数
+ATTACHMENTS_PER_PROJECT = 10
+
+
+def create_projects(project_count):
+    """生成校级管理员、一名队长（所有项目属于其队伍）和一名其他队伍的学生，返回 (项目ID列表, {身份: 用户ID})"""
+    school_admin = User(username='bench_school_admin', real_name='校级管理员', role=UserRole.SCHOOL_ADMIN, password_hash='bench')
+    leader = User(username='bench_leader', real_name='队长', role=UserRole.STUDENT, password_hash='bench')
+    outsider = User(username='bench_outsider', real_name='其他学生', role=UserRole.STUDENT, password_hash='bench')
+    competition = Competition(name='附件访问压测', year=2024)
+    db.session.add_all([school_admin, leader, outsider, competition])
+    db.session.flush()
+    team = Team(name='压测队伍', leader_id=leader.id, competition_id=competition.id)
+    db.session.add(team)
+    db.session.flush()
+    db.session.add(TeamMember(team_id=team.id, user_id=leader.id, role='leader'))
+    projects = [Project(title=f'项目{i}', team_id=team.id, competition_id=competition.id) for i in range(project_count)]
+    db.session.add_all(projects)
+    db.session.flush()
+    users = {'school_admin': school_admin.id, 'leader': leader.id, 'outsider': outsider.id}
+    return [project.id for project in projects], users
+
+
+def logged_in_client(user_id):
+    """以指定用户登录的测试客户端"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def bench_uploaded_file(attachment_count=2000, request_count=500):
+    """生成附件并请求 uploaded_file，返回 {场景: (平均毫秒, 每次请求的SQL查询数)}，权限检查不正确时抛出 AssertionError"""
+    Config.UPLOAD_FOLDER = Path(_tmp_dir) / 'uploads'
+
+    with app.app_context():
+        db.create_all()
+        project_ids, users = create_projects(-(-attachment_count // ATTACHMENTS_PER_PROJECT))
+        paths = []
+        for i in range(attachment_count):
+            file_type = FILE_TYPES[i % len(FILE_TYPES)]
+            relative_path = f'project_{i // 10}/20240101_000000_{i:08d}.{file_type}'
+            file_path = Config.UPLOAD_FOLDER / relative_path
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_bytes(b'0' * 1024)
+            db.session.add(ProjectAttachment(project_id=project_ids[i // ATTACHMENTS_PER_PROJECT], filename=file_path.name,
+                                             original_filename=f'附件{i}.{file_type}', file_path=relative_path,
+                                             file_size=1024, file_type=file_type, content_hash=file_sha256(file_path)))
+            paths.append(relative_path)
+        db.session.commit()
+
+        query_count = [0]
+
+        def count_query(*args):
+            query_count[0] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    # 请求在应用上下文外发出，登录用户不会在客户端之间共享
+    outsider = logged_in_client(users['outsider'])
+    for path in paths[:10]:
+        response = outsider.get(f'/uploads/{path}')
+        assert response.status_code == 403, f'其他队伍的学生访问附件返回 {response.status_code}'
+
+    results = {}
+    for name, role, query_string in (('校级管理员预览', 'school_admin', ''), ('校级管理员下载', 'school_admin', '?download=true'),
+                                     ('队长预览', 'leader', '')):
+        client = logged_in_client(users[role])
+        query_count[0] = 0
+        start = time.perf_counter()
+        for i in range(request_count):
+            response = client.get(f'/uploads/{paths[i % len(paths)]}{query_string}')
+            assert response.status_code == 200, response.status_code
+            response.close()
+        elapsed = time.perf_counter() - start
+        results[name] = (elapsed * 1000 / request_count, query_count[0] / request_count)
+    return results
+
+
+if __name__ == '__main__':
+    attachment_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    request_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    for name, (avg_ms, queries) in bench_uploaded_file(attachment_count, request_count).items():
+        print(f'{name}：平均 {avg_ms:.3f} ms/请求，{queries:.1f} 次SQL查询/请求')
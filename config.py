@@ -12,14 +12,61 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         f'sqlite:///{basedir}/competition.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite 连接设置：WAL 模式下读写互不阻塞（评委同时打分时页面查询不必等待写入），写锁被占用时等待而不是立即报错
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT = 30000  # 毫秒
     
     # 文件上传配置
     UPLOAD_FOLDER = basedir / 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'zip', 'rar'}
     
+    # 分片上传配置（项目附件中的大文件，如答辩视频、演示文稿）
+    UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # 分片大小，需小于 MAX_CONTENT_LENGTH 和 nginx 的 client_max_body_size
+    CHUNKED_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024  # 分片上传的单个文件大小上限（1GB）
+    CHUNKED_UPLOAD_EXTENSIONS = ALLOWED_EXTENSIONS | {'ppt', 'pptx', 'mp4', 'mov'}
+    UPLOAD_SESSION_TTL = 24 * 3600  # 超过此时间未继续上传的会话及其临时文件被清理
+    
+    # 附件缩略图配置（评审页面的附件列表只加载缩略图，见 utils/thumbnails.py）
+    THUMBNAIL_SIZE = 320  # 缩略图最长边（像素）
+    THUMBNAIL_QUALITY = 75  # WebP质量
+    
     # 证书生成配置
     CERTIFICATE_FOLDER = basedir / 'certificates'
+    # 证书字体：依次查找，使用第一个存在的字体（环境变量 CERTIFICATE_FONT_PATH 优先）；都不存在时使用Pillow默认字体
+    CERTIFICATE_FONT_PATHS = [path for path in [
+        os.environ.get('CERTIFICATE_FONT_PATH'),
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',  # apt install fonts-noto-cjk
+        '/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc',
+        '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',  # apt install fonts-wqy-microhei
+        '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+        'C:/Windows/Fonts/simhei.ttf',  # 黑体（本地开发）
+        'C:/Windows/Fonts/simsun.ttc',  # 宋体
+        'C:/Windows/Fonts/msyh.ttc',  # 微软雅黑
+    ] if path]
+    CERTIFICATE_WORKERS = int(os.environ.get('CERTIFICATE_WORKERS') or os.cpu_count() or 2)  # 批量生成证书的进程数
+    CERTIFICATE_FORMAT = (os.environ.get('CERTIFICATE_FORMAT') or 'png').lower()  # 证书文件格式：png、jpeg、webp
+    # 各格式的保存参数（PNG压缩级别越高文件越小、生成越慢；证书为大面积纯色，低压缩级别已足够小）
+    CERTIFICATE_SAVE_OPTIONS = {
+        'png': {'compress_level': 3},
+        'jpeg': {'quality': 90},
+        'webp': {'quality': 90, 'method': 2},
+    }
+    # 清理旧证书时只删除修改时间早于该秒数的文件：刚生成、奖项记录尚未提交的证书不会被当作无引用文件删除
+    CERTIFICATE_STALE_GRACE_SECONDS = 3600
+    
+    # 由nginx发送附件和证书（X-Accel-Redirect）：Flask只做权限检查并返回响应头，文件内容由nginx的internal location发送
+    # 未部署nginx（如本地开发）时保持关闭，由Flask直接发送文件
+    USE_X_ACCEL_REDIRECT = (os.environ.get('USE_X_ACCEL_REDIRECT') or '').lower() in ('1', 'true', 'yes')
+    UPLOADS_INTERNAL_LOCATION = '/protected/uploads'  # 对应 nginx.conf 中上传目录的 internal location
+    CERTIFICATES_INTERNAL_LOCATION = '/protected/certificates'  # 对应 nginx.conf 中证书目录的 internal location
+    
+    # 后台导出任务配置
+    EXPORT_FOLDER = basedir / 'exports'  # 导出文件目录
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS') or 2)  # 导出进程池大小
+    EXPORT_REUSE_SECONDS = 5 * 60  # 相同条件的导出在此时间内直接复用已生成的文件
+    EXPORT_RETENTION_SECONDS = 24 * 3600  # 导出文件保留时间
+    EXPORT_JOB_TIMEOUT = 30 * 60  # 超过此时间仍未完成的任务视为失败
     
     # 分页配置
     POSTS_PER_PAGE = 20
@@ -29,4 +76,12 @@ class Config:
     QWEN_API_BASE_URL = os.environ.get('QWEN_API_BASE_URL') or 'https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation'  # 文本生成API
     QWEN_VL_API_BASE_URL = os.environ.get('QWEN_VL_API_BASE_URL') or 'https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation'  # 视觉模型API
     SENSITIVE_KEYWORDS = ['西南交通大学']  # 敏感关键词列表，可根据需要修改
+    SENSITIVE_TEXT_REMOTE_CHECK = (os.environ.get('SENSITIVE_TEXT_REMOTE_CHECK') or '').lower() in ('1', 'true', 'yes')  # PDF/Word本地关键词匹配后是否再调用千问复核
+    TEXT_EXTRACTION_WORKERS = int(os.environ.get('TEXT_EXTRACTION_WORKERS') or 1)  # 附件文本提取进程池大小
+    TEXT_EXTRACTION_TIMEOUT = 30 * 60  # 提取中的记录超过该秒数未完成时视为中断（如进程崩溃），识别或上传时重新提交
+    SENSITIVE_DETECTION_WORKERS = int(os.environ.get('SENSITIVE_DETECTION_WORKERS') or 4)  # 脱敏识别并发检测的附件数
+    # 总时限须明显小于 gunicorn --timeout 和 nginx proxy_read_timeout（均为120秒，见 stic.service、nginx.conf），
+    # 否则工作进程在返回部分结果前就会被终止；单次请求超时不超过总时限
+    SENSITIVE_REQUEST_TIMEOUT = 30  # 单次调用千问API的超时时间（秒）
+    SENSITIVE_TOTAL_TIMEOUT = 90  # 一个项目全部附件识别的总时限（秒），超时的附件返回部分结果
 
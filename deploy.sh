@@ -49,6 +49,7 @@ init_deploy() {
     mkdir -p ${APP_DIR}/logs
     mkdir -p ${APP_DIR}/uploads
     mkdir -p ${APP_DIR}/certificates
+    mkdir -p ${APP_DIR}/exports
     mkdir -p ${APP_DIR}/backup
     
     # 设置权限
@@ -56,6 +57,7 @@ init_deploy() {
     chmod -R 755 ${APP_DIR}
     chmod -R 775 ${APP_DIR}/uploads
     chmod -R 775 ${APP_DIR}/certificates
+    chmod -R 775 ${APP_DIR}/exports
     chmod -R 775 ${APP_DIR}/logs
     
     # 创建虚拟环境
@@ -3,7 +3,7 @@
 """
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, BooleanField, TextAreaField, SelectField, FloatField, IntegerField, DateTimeLocalField
+from wtforms import StringField, PasswordField, BooleanField, TextAreaField, SelectField, FloatField, IntegerField, DateTimeLocalField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, Optional, NumberRange
 from datetime import datetime
 from models import COLLEGES
@@ -85,6 +85,7 @@ class ScoreForm(FlaskForm):
                             render_kw={'placeholder': '请输入0-100之间的分数', 'step': '0.1'})
     comment = TextAreaField('项目意见', validators=[Optional()], 
                            render_kw={'placeholder': '请输入对项目的评价意见', 'rows': 5})
+    version = HiddenField()  # 打开页面时的评分版本号（尚未评分时为0），保存时用于检查是否已在其他页面修改
 
 class AwardForm(FlaskForm):
     """奖项设置表单"""
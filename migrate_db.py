@@ -6,6 +6,104 @@ from app import app
 from models import db
 import sqlite3
 
+def migrate_attachments_to_blobs(cursor):
+    """
+    将早期按项目目录保存的附件复制到内容寻址存储，内容相同的附件合并为一个文件
+
+    迁移事务提交前只复制文件，原文件保留：后续步骤失败回滚时附件仍指向原路径，重新运行迁移即可。
+    返回需要在提交后删除的原文件路径（见 remove_legacy_attachment_files）
+    """
+    import os
+    import shutil
+    import uuid
+    from config import Config
+    from utils.blob_store import blob_relative_path
+    from utils.file_handler import file_sha256
+    from utils.timezone import beijing_now
+    
+    upload_folder = str(Config.UPLOAD_FOLDER)
+    cursor.execute("SELECT id, file_path FROM project_attachments WHERE blob_id IS NULL")
+    legacy_paths = set()
+    copied = merged = 0
+    for attachment_id, file_path in cursor.fetchall():
+        legacy_path = os.path.join(upload_folder, file_path.replace('/', os.sep))
+        if not os.path.isfile(legacy_path):
+            continue
+        
+        content_hash = file_sha256(legacy_path)
+        relative_path = blob_relative_path(content_hash)
+        blob_path = os.path.join(upload_folder, relative_path.replace('/', os.sep))
+        
+        cursor.execute("SELECT id FROM file_blobs WHERE content_hash = ?", (content_hash,))
+        row = cursor.fetchone()
+        if row:
+            blob_id = row[0]
+        else:
+            cursor.execute("INSERT INTO file_blobs (content_hash, file_path, file_size, ref_count, created_at) VALUES (?, ?, ?, 0, ?)",
+                           (content_hash, relative_path, os.path.getsize(legacy_path), beijing_now()))
+            blob_id = cursor.lastrowid
+        cursor.execute("UPDATE file_blobs SET ref_count = ref_count + 1 WHERE id = ?", (blob_id,))
+        cursor.execute("UPDATE project_attachments SET file_path = ?, content_hash = ?, blob_id = ? WHERE id = ?",
+                       (relative_path, content_hash, blob_id, attachment_id))
+        # 旧路径的文本提取结果作废，识别时按新路径重新提取
+        cursor.execute("DELETE FROM attachment_text_pages WHERE attachment_text_id IN (SELECT id FROM attachment_texts WHERE file_path = ?)", (file_path,))
+        cursor.execute("DELETE FROM attachment_texts WHERE file_path = ?", (file_path,))
+        
+        if os.path.exists(blob_path):
+            merged += 1
+        else:
+            # 先复制到临时文件再改名，中断时不会留下不完整的存储文件
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = f'{blob_path}.{uuid.uuid4().hex}.tmp'
+            try:
+                shutil.copyfile(legacy_path, temp_path)
+                os.replace(temp_path, blob_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            copied += 1
+        legacy_paths.add(legacy_path)
+    
+    if copied or merged:
+        print(f"✓ 已将 {copied + merged} 个附件复制到内容寻址存储（其中 {merged} 个与已有文件内容相同，已合并）")
+    return legacy_paths
+
+def remove_legacy_attachment_files(legacy_paths):
+    """迁移事务提交后删除已复制到内容寻址存储的原附件文件（删除失败时保留，不影响附件访问）"""
+    import os
+    
+    removed = 0
+    for legacy_path in legacy_paths:
+        try:
+            os.remove(legacy_path)
+            removed += 1
+        except OSError:
+            continue
+    if removed:
+        print(f"✓ 已删除 {removed} 个已迁移的原附件文件")
+
+def backfill_attachment_hashes(cursor):
+    """为早期没有保存内容哈希的附件补算SHA-256（附件下载用作ETag，不在读取请求中写数据库）"""
+    import os
+    from config import Config
+    from utils.file_handler import file_sha256
+    
+    upload_folder = str(Config.UPLOAD_FOLDER)
+    cursor.execute("SELECT id, file_path, file_type FROM project_attachments WHERE content_hash IS NULL")
+    filled = 0
+    for attachment_id, file_path, file_type in cursor.fetchall():
+        full_path = os.path.join(upload_folder, file_path.replace('/', os.sep))
+        # 兼容早期保存时缺少扩展名的文件
+        if not os.path.isfile(full_path) and file_type and os.path.isfile(f'{full_path}.{file_type}'):
+            full_path = f'{full_path}.{file_type}'
+        if not os.path.isfile(full_path):
+            continue
+        cursor.execute("UPDATE project_attachments SET content_hash = ? WHERE id = ?", (file_sha256(full_path), attachment_id))
+        filled += 1
+    
+    if filled:
+        print(f"✓ 已补算 {filled} 个附件的内容哈希")
+
 def migrate_database():
     """迁移数据库，添加新字段"""
     with app.app_context():
@@ -44,6 +142,58 @@ def migrate_database():
                 cursor.execute("ALTER TABLE projects ADD COLUMN allow_award_collection BOOLEAN DEFAULT 0")
                 print("✓ 已添加 allow_award_collection 字段到 projects 表")
             
+            # 评分汇总字段
+            score_stat_fields = [
+                ('score_count', 'INTEGER NOT NULL DEFAULT 0'),
+                ('score_sum', 'REAL NOT NULL DEFAULT 0'),
+                ('score_avg', 'REAL'),
+                ('score_min', 'REAL'),
+                ('score_max', 'REAL'),
+                ('score_trimmed_avg', 'REAL'),
+            ]
+            score_stats_added = False
+            for field_name, field_type in score_stat_fields:
+                if field_name not in columns:
+                    cursor.execute(f"ALTER TABLE projects ADD COLUMN {field_name} {field_type}")
+                    print(f"✓ 已添加 {field_name} 字段到 projects 表")
+                    score_stats_added = True
+            
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_projects_score_avg ON projects (score_avg)")
+            
+            if score_stats_added:
+                # 根据已有评分回填汇总字段
+                cursor.execute("""
+                    UPDATE projects SET
+                        score_count = (SELECT COUNT(*) FROM scores WHERE scores.project_id = projects.id),
+                        score_sum = COALESCE((SELECT SUM(score_value) FROM scores WHERE scores.project_id = projects.id), 0),
+                        score_avg = (SELECT AVG(score_value) FROM scores WHERE scores.project_id = projects.id),
+                        score_min = (SELECT MIN(score_value) FROM scores WHERE scores.project_id = projects.id),
+                        score_max = (SELECT MAX(score_value) FROM scores WHERE scores.project_id = projects.id)
+                """)
+                cursor.execute("""
+                    UPDATE projects SET score_trimmed_avg = CASE
+                        WHEN score_count >= 3 THEN (score_sum - score_min - score_max) / (score_count - 2)
+                        WHEN score_count > 0 THEN score_avg
+                        ELSE NULL
+                    END
+                """)
+                print("✓ 已回填项目评分汇总数据")
+            
+            # 附件路径统一为正斜杠并建立索引，下载附件时按路径只查询一次
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='project_attachments'")
+            if cursor.fetchone():
+                cursor.execute("UPDATE project_attachments SET file_path = REPLACE(file_path, '\\', '/') WHERE file_path LIKE '%\\%'")
+                if cursor.rowcount:
+                    print(f"✓ 已统一 {cursor.rowcount} 个附件路径的分隔符")
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_project_attachments_file_path ON project_attachments (file_path)")
+                # 评委评审清单按项目统计附件数
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_project_attachments_project_id ON project_attachments (project_id)")
+                
+                cursor.execute("PRAGMA table_info(project_attachments)")
+                if 'content_hash' not in [col[1] for col in cursor.fetchall()]:
+                    cursor.execute("ALTER TABLE project_attachments ADD COLUMN content_hash VARCHAR(64)")
+                    print("✓ 已添加 content_hash 字段到 project_attachments 表")
+            
             # 检查并添加 project_members 表的新字段
             cursor.execute("PRAGMA table_info(project_members)")
             columns = [row[1] for row in cursor.fetchall()]
@@ -253,7 +403,211 @@ def migrate_database():
                         cursor.execute(f"ALTER TABLE assessment_config ADD COLUMN {field_name} {field_type}")
                         print(f"✓ 已添加 {field_name} 字段到 assessment_config 表")
             
+            # 检查并创建 assessment_snapshots 表（考核统计快照，对应年度的数据首次变更时或重建快照时生成）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='assessment_snapshots'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE assessment_snapshots (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        year INTEGER NOT NULL,
+                        college VARCHAR(100) NOT NULL,
+                        challenge_cup_registration INTEGER DEFAULT 0,
+                        challenge_cup_school_gold INTEGER DEFAULT 0,
+                        challenge_cup_school_silver INTEGER DEFAULT 0,
+                        challenge_cup_school_bronze INTEGER DEFAULT 0,
+                        challenge_cup_provincial_gold INTEGER DEFAULT 0,
+                        challenge_cup_provincial_silver INTEGER DEFAULT 0,
+                        challenge_cup_provincial_bronze INTEGER DEFAULT 0,
+                        challenge_cup_national_gold INTEGER DEFAULT 0,
+                        challenge_cup_national_silver INTEGER DEFAULT 0,
+                        challenge_cup_national_bronze INTEGER DEFAULT 0,
+                        challenge_cup_total_awards INTEGER DEFAULT 0,
+                        challenge_cup_max_award_score REAL DEFAULT 0,
+                        red_travel_registration INTEGER DEFAULT 0,
+                        red_travel_school_gold INTEGER DEFAULT 0,
+                        red_travel_school_silver INTEGER DEFAULT 0,
+                        red_travel_school_bronze INTEGER DEFAULT 0,
+                        red_travel_provincial_gold INTEGER DEFAULT 0,
+                        red_travel_provincial_silver INTEGER DEFAULT 0,
+                        red_travel_provincial_bronze INTEGER DEFAULT 0,
+                        red_travel_national_gold INTEGER DEFAULT 0,
+                        red_travel_national_silver INTEGER DEFAULT 0,
+                        red_travel_national_bronze INTEGER DEFAULT 0,
+                        red_travel_total_awards INTEGER DEFAULT 0,
+                        red_travel_max_award_score REAL DEFAULT 0,
+                        updated_at DATETIME,
+                        CONSTRAINT unique_snapshot_year_college UNIQUE (year, college)
+                    )
+                """)
+                print("✓ 已创建 assessment_snapshots 表")
+            
+            # 检查并创建 export_jobs 表（后台导出任务）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='export_jobs'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE export_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        job_type VARCHAR(50) NOT NULL,
+                        params TEXT NOT NULL,
+                        params_hash VARCHAR(64) NOT NULL,
+                        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                        progress INTEGER DEFAULT 0,
+                        file_name VARCHAR(200),
+                        file_path VARCHAR(500),
+                        error_message TEXT,
+                        created_by INTEGER,
+                        created_at DATETIME,
+                        started_at DATETIME,
+                        finished_at DATETIME,
+                        FOREIGN KEY (created_by) REFERENCES users(id)
+                    )
+                """)
+                cursor.execute("CREATE INDEX ix_export_jobs_lookup ON export_jobs (job_type, params_hash, status)")
+                print("✓ 已创建 export_jobs 表")
+            
+            # 检查并创建 sensitive_detection_results 表（脱敏识别结果缓存）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sensitive_detection_results'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE sensitive_detection_results (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        file_hash VARCHAR(64) NOT NULL,
+                        fingerprint VARCHAR(64) NOT NULL,
+                        has_sensitive BOOLEAN NOT NULL DEFAULT 0,
+                        detected_keywords TEXT,
+                        details TEXT,
+                        created_at DATETIME,
+                        CONSTRAINT unique_sensitive_file_fingerprint UNIQUE (file_hash, fingerprint)
+                    )
+                """)
+                print("✓ 已创建 sensitive_detection_results 表")
+            
+            # 检查并创建 attachment_texts / attachment_text_pages 表（附件文本提取结果）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='attachment_texts'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE attachment_texts (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        file_path VARCHAR(500) NOT NULL UNIQUE,
+                        file_type VARCHAR(50),
+                        status VARCHAR(20) NOT NULL DEFAULT 'running',
+                        page_count INTEGER DEFAULT 0,
+                        error_message TEXT,
+                        extracted_at DATETIME
+                    )
+                """)
+                print("✓ 已创建 attachment_texts 表")
+            
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='attachment_text_pages'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE attachment_text_pages (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        attachment_text_id INTEGER NOT NULL,
+                        page_number INTEGER NOT NULL,
+                        label VARCHAR(50) NOT NULL,
+                        content TEXT,
+                        FOREIGN KEY (attachment_text_id) REFERENCES attachment_texts(id)
+                    )
+                """)
+                cursor.execute("CREATE INDEX ix_attachment_text_pages_attachment_text_id ON attachment_text_pages (attachment_text_id)")
+                print("✓ 已创建 attachment_text_pages 表")
+            
+            # 检查并创建 file_blobs 表（附件内容寻址存储）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='file_blobs'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE file_blobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        content_hash VARCHAR(64) NOT NULL UNIQUE,
+                        file_path VARCHAR(500) NOT NULL,
+                        file_size INTEGER,
+                        ref_count INTEGER NOT NULL DEFAULT 0,
+                        created_at DATETIME
+                    )
+                """)
+                print("✓ 已创建 file_blobs 表")
+            
+            cursor.execute("PRAGMA table_info(project_attachments)")
+            if 'blob_id' not in [col[1] for col in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE project_attachments ADD COLUMN blob_id INTEGER REFERENCES file_blobs(id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_project_attachments_blob_id ON project_attachments (blob_id)")
+                print("✓ 已添加 blob_id 字段到 project_attachments 表")
+            
+            legacy_attachment_paths = migrate_attachments_to_blobs(cursor)
+            backfill_attachment_hashes(cursor)
+            
+            # 检查并创建 upload_sessions 表（分片上传会话）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='upload_sessions'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE upload_sessions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        project_id INTEGER NOT NULL,
+                        user_id INTEGER NOT NULL,
+                        original_filename VARCHAR(255) NOT NULL,
+                        file_type VARCHAR(50),
+                        total_size BIGINT NOT NULL,
+                        chunk_size INTEGER NOT NULL,
+                        received_size BIGINT NOT NULL DEFAULT 0,
+                        expected_hash VARCHAR(64),
+                        status VARCHAR(20) NOT NULL DEFAULT 'uploading',
+                        attachment_id INTEGER,
+                        created_at DATETIME,
+                        updated_at DATETIME,
+                        FOREIGN KEY (project_id) REFERENCES projects(id),
+                        FOREIGN KEY (user_id) REFERENCES users(id),
+                        FOREIGN KEY (attachment_id) REFERENCES project_attachments(id) ON DELETE SET NULL
+                    )
+                """)
+                print("✓ 已创建 upload_sessions 表")
+            
+            # 检查并创建 defense_slots 表（答辩顺序抽签号）
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='defense_slots'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    CREATE TABLE defense_slots (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        competition_id INTEGER NOT NULL,
+                        defense_order INTEGER NOT NULL,
+                        draw_position INTEGER NOT NULL,
+                        project_id INTEGER UNIQUE,
+                        claimed_at DATETIME,
+                        FOREIGN KEY (competition_id) REFERENCES competitions(id),
+                        FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE SET NULL,
+                        CONSTRAINT unique_competition_defense_slot UNIQUE (competition_id, defense_order)
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_defense_slots_draw ON defense_slots (competition_id, draw_position)")
+                print("✓ 已创建 defense_slots 表")
+            
+            # 同一竞赛中答辩顺序唯一：先清除重复的答辩顺序（保留最早的项目），再创建部分唯一索引
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='uq_projects_competition_defense_order'")
+            if not cursor.fetchone():
+                cursor.execute("""
+                    UPDATE projects SET defense_order = NULL
+                    WHERE defense_order IS NOT NULL AND id NOT IN (
+                        SELECT MIN(id) FROM projects WHERE defense_order IS NOT NULL
+                        GROUP BY competition_id, defense_order
+                    )
+                """)
+                if cursor.rowcount:
+                    print(f"✓ 已清除 {cursor.rowcount} 个重复的答辩顺序，相关项目需重新抽取")
+                cursor.execute("""
+                    CREATE UNIQUE INDEX uq_projects_competition_defense_order
+                    ON projects (competition_id, defense_order) WHERE defense_order IS NOT NULL
+                """)
+                print("✓ 已添加答辩顺序唯一索引到 projects 表")
+            
+            # 评分版本号（评分接口的乐观并发检查）
+            cursor.execute("PRAGMA table_info(scores)")
+            if 'version' not in [col[1] for col in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE scores ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+                print("✓ 已添加 version 字段到 scores 表")
+            
             conn.commit()
+            # 附件记录已指向内容寻址存储，再删除原文件
+            remove_legacy_attachment_files(legacy_attachment_paths)
             print("\n数据库迁移完成！")
             
         except Exception as e:
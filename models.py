@@ -198,6 +198,8 @@ class Team(db.Model):
     competition = db.relationship('Competition')
     members = db.relationship('TeamMember', back_populates='team', lazy='dynamic', cascade='all, delete-orphan')
     projects = db.relationship('Project', back_populates='team', lazy='dynamic')
+    # 普通列表形式的只读关系，可配合 selectinload 批量预加载（如导出）
+    member_list = db.relationship('TeamMember', viewonly=True)
     
     def __repr__(self):
         return f'<Team {self.name}>'
@@ -249,6 +251,13 @@ class Project(db.Model):
     college_review_comment = db.Column(db.Text)  # 学院审核备注
     school_review_comment = db.Column(db.Text)  # 校级审核备注
     defense_order = db.Column(db.Integer, nullable=True)  # 答辩顺序（抽签结果）
+    # 评分汇总（评委打分时由 utils.scoring.save_scores 维护）
+    score_count = db.Column(db.Integer, default=0, nullable=False)  # 评分数
+    score_sum = db.Column(db.Float, default=0, nullable=False)  # 总分之和
+    score_avg = db.Column(db.Float, nullable=True, index=True)  # 平均分
+    score_min = db.Column(db.Float, nullable=True)  # 最低分
+    score_max = db.Column(db.Float, nullable=True)  # 最高分
+    score_trimmed_avg = db.Column(db.Float, nullable=True)  # 去掉最高分和最低分后的平均分（评分不足3个时同平均分）
     created_at = db.Column(db.DateTime, default=beijing_now)
     updated_at = db.Column(db.DateTime, default=beijing_now, onupdate=beijing_now)
     
@@ -263,6 +272,19 @@ class Project(db.Model):
     external_awards = db.relationship('ExternalAward', back_populates='project', lazy='dynamic', cascade='all, delete-orphan')
     project_members = db.relationship('ProjectMember', back_populates='project', lazy='dynamic', cascade='all, delete-orphan', order_by='ProjectMember.order')
     
+    # 以上 dynamic 关系对应的只读列表关系，可配合 selectinload 批量预加载（如导出），避免逐个项目查询
+    track_list = db.relationship('ProjectTrack', viewonly=True)
+    score_list = db.relationship('Score', viewonly=True)
+    award_list = db.relationship('Award', viewonly=True)
+    external_award_list = db.relationship('ExternalAward', viewonly=True)
+    member_list = db.relationship('ProjectMember', viewonly=True, order_by='ProjectMember.order')
+    
+    # 同一竞赛中答辩顺序不能重复（部分唯一索引，未抽取的项目不受限制）
+    __table_args__ = (
+        db.Index('uq_projects_competition_defense_order', 'competition_id', 'defense_order', unique=True,
+                 sqlite_where=defense_order.isnot(None), postgresql_where=defense_order.isnot(None)),
+    )
+    
     def all_members_confirmed(self):
         """检查所有成员是否已确认"""
         members = self.project_members.all()
@@ -273,6 +295,26 @@ class Project(db.Model):
     def __repr__(self):
         return f'<Project {self.title}>'
 
+# 答辩抽签号
+class DefenseSlot(db.Model):
+    """答辩抽签号：每个竞赛按决赛项目数预先生成 1..N 号并随机排列抽取位置，抽签时按抽取位置领取第一个未被领取的号"""
+    __tablename__ = 'defense_slots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    competition_id = db.Column(db.Integer, db.ForeignKey('competitions.id'), nullable=False)
+    defense_order = db.Column(db.Integer, nullable=False)  # 答辩顺序
+    draw_position = db.Column(db.Integer, nullable=False)  # 抽取位置（生成时随机）
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='SET NULL'), nullable=True, unique=True)  # 领取该号的项目
+    claimed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('competition_id', 'defense_order', name='unique_competition_defense_slot'),
+        db.Index('ix_defense_slots_draw', 'competition_id', 'draw_position'),
+    )
+    
+    def __repr__(self):
+        return f'<DefenseSlot {self.competition_id}#{self.defense_order} project={self.project_id}>'
+
 # 项目成员表（项目-成员，包含确认状态和顺位）
 class ProjectMember(db.Model):
     """项目成员表"""
@@ -326,20 +368,64 @@ class ProjectAttachment(db.Model):
     __tablename__ = 'project_attachments'
     
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
-    file_path = db.Column(db.String(500), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False, index=True)  # 相对于上传目录，统一使用正斜杠
     file_size = db.Column(db.Integer)  # 文件大小（字节）
     file_type = db.Column(db.String(50))  # 文件类型
+    content_hash = db.Column(db.String(64))  # 文件内容SHA-256（用作ETag；早期附件由 migrate_db.py 补算）
+    blob_id = db.Column(db.Integer, db.ForeignKey('file_blobs.id'), nullable=True, index=True)  # 内容寻址存储中的文件（早期附件为空）
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # 关系
     project = db.relationship('Project', back_populates='attachments')
+    blob = db.relationship('FileBlob')
     
     def __repr__(self):
         return f'<ProjectAttachment {self.original_filename}>'
 
+# 内容寻址文件模型
+class FileBlob(db.Model):
+    """按SHA-256保存的附件文件，内容相同的附件共用一个文件；引用计数为0时删除（见 utils/blob_store.py）"""
+    __tablename__ = 'file_blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # 文件内容SHA-256
+    file_path = db.Column(db.String(500), nullable=False)  # 文件路径（相对于上传目录），如 blobs/ab/cd/<sha256>
+    file_size = db.Column(db.Integer)  # 文件大小（字节）
+    ref_count = db.Column(db.Integer, default=0, nullable=False)  # 引用该文件的附件数
+    created_at = db.Column(db.DateTime, default=beijing_now)
+    
+    def __repr__(self):
+        return f'<FileBlob {self.content_hash[:12]} refs={self.ref_count}>'
+
+# 分片上传会话状态枚举
+class UploadSessionStatus:
+    UPLOADING = 'uploading'  # 上传中
+    COMPLETED = 'completed'  # 已完成（已生成附件）
+
+class UploadSession(db.Model):
+    """分片上传会话：大文件按固定大小分片依次上传到临时文件，断线后可从已接收位置继续，全部接收后校验并生成附件"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 上传者（队长）
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(50))
+    total_size = db.Column(db.BigInteger, nullable=False)  # 文件总大小（字节）
+    chunk_size = db.Column(db.Integer, nullable=False)  # 分片大小（字节），除最后一片外每片必须等于该大小
+    received_size = db.Column(db.BigInteger, default=0, nullable=False)  # 已连续接收的字节数（即下一片的起始位置）
+    expected_hash = db.Column(db.String(64))  # 客户端提供的文件SHA-256（可选，完成时校验）
+    status = db.Column(db.String(20), default=UploadSessionStatus.UPLOADING, nullable=False)
+    attachment_id = db.Column(db.Integer, db.ForeignKey('project_attachments.id', ondelete='SET NULL'), nullable=True)  # 生成的附件
+    created_at = db.Column(db.DateTime, default=beijing_now)
+    updated_at = db.Column(db.DateTime, default=beijing_now, onupdate=beijing_now)
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received_size}/{self.total_size}>'
+
 # 评委分配关联表（多对多：评委-项目）
 class JudgeAssignment(db.Model):
     """评委分配关联表"""
@@ -374,6 +460,7 @@ class Score(db.Model):
     social_value_score = db.Column(db.Float)  # 社会价值得分
     presentation_score = db.Column(db.Float)  # 展示效果得分
     comment = db.Column(db.Text)  # 评语
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # 版本号（每次保存加1，用于乐观并发检查）
     scored_at = db.Column(db.DateTime, default=beijing_now)
     updated_at = db.Column(db.DateTime, default=beijing_now, onupdate=beijing_now)
     
@@ -427,6 +514,96 @@ class ExternalAward(db.Model):
     def __repr__(self):
         return f'<ExternalAward {self.award_level}-{self.award_name} for Project {self.project_id}>'
 
+# 后台导出任务状态枚举
+class ExportJobStatus:
+    PENDING = 'pending'  # 排队中
+    RUNNING = 'running'  # 导出中
+    FINISHED = 'finished'  # 已完成
+    FAILED = 'failed'  # 失败
+    EXPIRED = 'expired'  # 文件已过期清理
+
+class ExportJob(db.Model):
+    """后台导出任务模型，导出在进程池中执行，文件保存在导出目录"""
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # 导出类型：projects/scores/assessment
+    params = db.Column(db.Text, nullable=False)  # 导出参数（JSON）
+    params_hash = db.Column(db.String(64), nullable=False)  # 导出类型+参数的哈希，用于复用相同导出
+    status = db.Column(db.String(20), default=ExportJobStatus.PENDING, nullable=False)
+    progress = db.Column(db.Integer, default=0)  # 进度（0-100）
+    file_name = db.Column(db.String(200))  # 下载文件名
+    file_path = db.Column(db.String(500))  # 文件路径（相对于导出目录）
+    error_message = db.Column(db.Text)  # 失败原因
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=beijing_now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # 关系
+    creator = db.relationship('User')
+    
+    __table_args__ = (db.Index('ix_export_jobs_lookup', 'job_type', 'params_hash', 'status'),)
+    
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.job_type} {self.status}>'
+
+# 附件文本提取状态枚举
+class TextExtractionStatus:
+    RUNNING = 'running'  # 提取中
+    DONE = 'done'  # 已完成
+    FAILED = 'failed'  # 失败（如扫描版PDF、文件损坏）
+
+class AttachmentText(db.Model):
+    """附件文本提取结果（PDF、DOCX），上传后由后台进程提取，供脱敏识别、搜索和预览使用"""
+    __tablename__ = 'attachment_texts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(500), unique=True, nullable=False)  # 文件路径（相对于上传目录，与 ProjectAttachment.file_path 一致）
+    file_type = db.Column(db.String(50))
+    status = db.Column(db.String(20), default=TextExtractionStatus.RUNNING, nullable=False)
+    page_count = db.Column(db.Integer, default=0)  # PDF为页数，DOCX为段落和表格行数
+    error_message = db.Column(db.Text)  # 失败原因
+    extracted_at = db.Column(db.DateTime, default=beijing_now)  # 完成时间（提取中为开始时间）
+    
+    # 关系
+    pages = db.relationship('AttachmentTextPage', backref='attachment_text', lazy='dynamic',
+                            cascade='all, delete-orphan', order_by='AttachmentTextPage.page_number')
+    
+    def __repr__(self):
+        return f'<AttachmentText {self.file_path} {self.status}>'
+
+class AttachmentTextPage(db.Model):
+    """附件逐页（段）文本"""
+    __tablename__ = 'attachment_text_pages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    attachment_text_id = db.Column(db.Integer, db.ForeignKey('attachment_texts.id'), nullable=False, index=True)
+    page_number = db.Column(db.Integer, nullable=False)  # 顺序号（从1开始）
+    label = db.Column(db.String(50), nullable=False)  # 位置描述，如"第3页"、"第5段"、"表格1第2行"
+    content = db.Column(db.Text)  # 文本内容
+    
+    def __repr__(self):
+        return f'<AttachmentTextPage {self.attachment_text_id}:{self.page_number}>'
+
+# 脱敏识别结果缓存模型
+class SensitiveDetectionResult(db.Model):
+    """脱敏识别结果缓存，以文件内容SHA-256和检测指纹（关键词、模型、提示词版本）为键，文件未变化时直接复用"""
+    __tablename__ = 'sensitive_detection_results'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_hash = db.Column(db.String(64), nullable=False)  # 文件内容SHA-256
+    fingerprint = db.Column(db.String(64), nullable=False)  # 敏感关键词+模型+提示词版本的哈希
+    has_sensitive = db.Column(db.Boolean, default=False, nullable=False)
+    detected_keywords = db.Column(db.Text)  # 检测到的关键词（JSON列表）
+    details = db.Column(db.Text)  # 详细说明
+    created_at = db.Column(db.DateTime, default=beijing_now)  # 识别时间
+    
+    __table_args__ = (db.UniqueConstraint('file_hash', 'fingerprint', name='unique_sensitive_file_fingerprint'),)
+    
+    def __repr__(self):
+        return f'<SensitiveDetectionResult {self.file_hash[:12]}>'
+
 # 考核配置模型（存储任务要求、配套活动、特殊情况备注等）
 class AssessmentConfig(db.Model):
     """考核配置模型，用于存储年度任务要求和手动输入的奖项数据"""
@@ -492,3 +669,47 @@ class AssessmentConfig(db.Model):
     def __repr__(self):
         return f'<AssessmentConfig {self.year}-{self.college}>'
 
+# 考核统计快照模型（按年度、学院持久化自动统计结果）
+class AssessmentSnapshot(db.Model):
+    """考核统计快照模型，按年度、学院持久化自动统计的报名数和奖项数据，项目、奖项或竞赛变更时在提交前刷新"""
+    __tablename__ = 'assessment_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)  # 年度
+    college = db.Column(db.String(100), nullable=False)  # 学院
+    
+    # 挑战杯主赛道
+    challenge_cup_registration = db.Column(db.Integer, default=0)  # 报名数
+    challenge_cup_school_gold = db.Column(db.Integer, default=0)
+    challenge_cup_school_silver = db.Column(db.Integer, default=0)
+    challenge_cup_school_bronze = db.Column(db.Integer, default=0)
+    challenge_cup_provincial_gold = db.Column(db.Integer, default=0)
+    challenge_cup_provincial_silver = db.Column(db.Integer, default=0)
+    challenge_cup_provincial_bronze = db.Column(db.Integer, default=0)
+    challenge_cup_national_gold = db.Column(db.Integer, default=0)
+    challenge_cup_national_silver = db.Column(db.Integer, default=0)
+    challenge_cup_national_bronze = db.Column(db.Integer, default=0)
+    challenge_cup_total_awards = db.Column(db.Integer, default=0)  # 获奖总数
+    challenge_cup_max_award_score = db.Column(db.Float, default=0)  # 最高奖项得分
+    
+    # 红旅赛道
+    red_travel_registration = db.Column(db.Integer, default=0)  # 申报队伍数
+    red_travel_school_gold = db.Column(db.Integer, default=0)
+    red_travel_school_silver = db.Column(db.Integer, default=0)
+    red_travel_school_bronze = db.Column(db.Integer, default=0)
+    red_travel_provincial_gold = db.Column(db.Integer, default=0)
+    red_travel_provincial_silver = db.Column(db.Integer, default=0)
+    red_travel_provincial_bronze = db.Column(db.Integer, default=0)
+    red_travel_national_gold = db.Column(db.Integer, default=0)
+    red_travel_national_silver = db.Column(db.Integer, default=0)
+    red_travel_national_bronze = db.Column(db.Integer, default=0)
+    red_travel_total_awards = db.Column(db.Integer, default=0)  # 获奖总数
+    red_travel_max_award_score = db.Column(db.Float, default=0)  # 最高奖项得分
+    
+    updated_at = db.Column(db.DateTime, default=beijing_now, onupdate=beijing_now)
+    
+    __table_args__ = (db.UniqueConstraint('year', 'college', name='unique_snapshot_year_college'),)
+    
+    def __repr__(self):
+        return f'<AssessmentSnapshot {self.year}-{self.college}>'
+
@@ -1,12 +1,15 @@
 """
 学院管理员路由
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, abort, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, send_file
 from flask_login import login_required, current_user
 from models import db, Project, ReviewStatus, User, Team, Track, ProjectTrack, UserRole, Score, Award, ExternalAward
 from forms import ReviewForm, FilterForm
 from utils.decorators import college_admin_required
-from utils.export import export_detailed_projects_to_excel
+from utils.export import (export_detailed_projects_to_excel, with_detailed_export_options, iter_export_projects,
+                          DETAILED_EXPORT_COLLECTIONS)
+from utils.file_handler import send_protected_file
+from utils.certificate import certificate_mimetype, ensure_certificate
 from config import Config
 from datetime import datetime
 import os
@@ -18,7 +21,6 @@ college_admin_bp = Blueprint('college_admin', __name__)
 @college_admin_required
 def view_certificate(project_id, award_id):
     """查看项目证书（在线预览）"""
-    from flask import send_file
     project = Project.query.get_or_404(project_id)
     award = Award.query.get_or_404(award_id)
     
@@ -26,9 +28,10 @@ def view_certificate(project_id, award_id):
     if project.push_college != current_user.college:
         abort(403)
     
-    # 检查证书是否存在
-    if not award.certificate_path:
+    # 证书在首次查看或下载时生成，奖项名称、队伍名等变化后重新生成
+    if award.project_id != project.id:
         abort(404)
+    ensure_certificate(award)
     
     # 构建证书文件路径
     cert_folder = str(Config.CERTIFICATE_FOLDER)
@@ -43,10 +46,12 @@ def view_certificate(project_id, award_id):
     if not os.path.exists(cert_path):
         abort(404)
     
-    # 直接使用send_file发送文件，避免路径问题
-    return send_file(
-        cert_path,
-        mimetype='image/png',
+    relative_path = os.path.relpath(cert_path, cert_folder).replace('\\', '/')
+    return send_protected_file(
+        cert_folder,
+        relative_path,
+        Config.CERTIFICATES_INTERNAL_LOCATION,
+        mimetype=certificate_mimetype(award.certificate_path),
         as_attachment=False
     )
 
@@ -63,10 +68,10 @@ def download_certificate(project_id, award_id):
         flash('您没有权限下载此证书', 'error')
         abort(403)
     
-    # 检查证书是否存在
-    if not award.certificate_path:
-        flash('证书文件不存在', 'error')
+    # 证书在首次查看或下载时生成，奖项名称、队伍名等变化后重新生成
+    if award.project_id != project.id:
         abort(404)
+    ensure_certificate(award)
     
     # 构建证书文件路径
     cert_folder = str(Config.CERTIFICATE_FOLDER)
@@ -84,19 +89,21 @@ def download_certificate(project_id, award_id):
     # 生成下载文件名：项目名+奖项名
     safe_project_name = "".join(c for c in project.title if c.isalnum() or c in (' ', '-', '_', '，', '。', '、')).strip()
     safe_award_name = "".join(c for c in award.award_name if c.isalnum() or c in (' ', '-', '_', '，', '。', '、')).strip()
-    download_filename = f"{safe_project_name}+{safe_award_name}.png"
+    extension = os.path.splitext(award.certificate_path)[1] or '.png'
+    download_filename = f"{safe_project_name}+{safe_award_name}{extension}"
     download_filename = download_filename.replace(' ', '_')
     
-    # send_from_directory需要相对于cert_folder的路径
+    # send_protected_file需要相对于cert_folder的路径
     relative_path = os.path.relpath(cert_path, cert_folder)
     relative_path = relative_path.replace('\\', '/')
     
-    return send_from_directory(
+    return send_protected_file(
         cert_folder,
         relative_path,
+        Config.CERTIFICATES_INTERNAL_LOCATION,
         as_attachment=True,
         download_name=download_filename,
-        mimetype='image/png'
+        mimetype=certificate_mimetype(award.certificate_path)
     )
 
 @college_admin_bp.route('/dashboard', methods=['GET', 'POST'])
@@ -365,7 +372,8 @@ def export_projects():
     if status:
         query = query.filter(Project.status == status)
     
-    projects = query.order_by(Project.created_at.desc()).all()
+    projects = list(iter_export_projects(with_detailed_export_options(query).order_by(Project.created_at.desc()),
+                                         DETAILED_EXPORT_COLLECTIONS))
     
     if not projects:
         flash('没有可导出的项目数据', 'info')
@@ -6,6 +6,7 @@ from flask_login import login_required, current_user
 from models import db, Project, JudgeAssignment, Score
 from forms import ScoreForm
 from utils.decorators import judge_required
+from utils.scoring import save_scores
 
 judge_bp = Blueprint('judge', __name__)
 
@@ -92,15 +93,38 @@ def dashboard():
 @judge_required
 def projects():
     """评审项目列表"""
-    # 获取分配给当前评委的所有项目
-    assignments = JudgeAssignment.query.filter_by(
-        judge_id=current_user.id,
-        is_active=True
-    ).all()
-    
-    projects = [assignment.project for assignment in assignments]
-    
-    return render_template('judge/projects.html', projects=projects)
+    from utils.judge_worklist import judge_worklist, judge_competitions
+    
+    competition_id = request.args.get('competition_id', type=int)
+    unscored_only = request.args.get('unscored', 'false').lower() in ('1', 'true')
+    worklist = judge_worklist(
+        current_user.id,
+        competition_id=competition_id,
+        unscored_only=unscored_only,
+        page=request.args.get('page', 1, type=int)
+    )
+    
+    return render_template('judge/projects.html',
+                         worklist=worklist,
+                         competitions=judge_competitions(current_user.id),
+                         selected_competition_id=competition_id,
+                         unscored_only=unscored_only)
+
+@judge_bp.route('/api/worklist')
+@login_required
+@judge_required
+def worklist_api():
+    """评审清单接口：分配给当前评委的项目及本人的评分状态，支持分页和筛选"""
+    from utils.judge_worklist import judge_worklist, DEFAULT_PER_PAGE
+    
+    worklist = judge_worklist(
+        current_user.id,
+        competition_id=request.args.get('competition_id', type=int),
+        unscored_only=request.args.get('unscored', 'false').lower() in ('1', 'true'),
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    )
+    return jsonify({'success': True, **worklist})
 
 @judge_bp.route('/project/<int:project_id>')
 @login_required
@@ -135,6 +159,26 @@ def score_project(project_id):
     """在线打分"""
     project = Project.query.get_or_404(project_id)
     
+    form = ScoreForm()
+    
+    if form.validate_on_submit():
+        # 权限检查、写入评分（INSERT ... ON CONFLICT）和刷新评分汇总在 save_scores 中完成
+        version = int(form.version.data) if (form.version.data or '').isdigit() else None
+        result = save_scores(current_user.id, [{
+            'project_id': project_id,
+            'score_value': form.score_value.data,
+            'comment': form.comment.data or '',
+            'version': version
+        }])
+        if result['errors']:
+            flash(result['errors'][0]['message'], 'error')
+            return redirect(url_for('judge.projects'))
+        if result['conflicts']:
+            flash('评分已在其他页面修改，请查看最新评分后重新提交', 'error')
+            return redirect(url_for('judge.score_project', project_id=project_id))
+        flash('评分提交成功' if result['saved'][0]['version'] == 1 else '评分已更新', 'success')
+        return redirect(url_for('judge.view_project', project_id=project_id))
+    
     # 检查权限
     assignment = JudgeAssignment.query.filter_by(
         judge_id=current_user.id,
@@ -146,83 +190,46 @@ def score_project(project_id):
         flash('您没有权限为此项目打分', 'error')
         return redirect(url_for('judge.projects'))
     
-    form = ScoreForm()
-    
-    if form.validate_on_submit():
-        # 检查是否已评分
+    # 如果是GET请求，加载已有评分和版本号
+    if request.method == 'GET':
         existing_score = Score.query.filter_by(
             project_id=project_id,
             judge_id=current_user.id
         ).first()
-        
         if existing_score:
-            # 更新评分
-            existing_score.score_value = form.score_value.data
-            existing_score.comment = form.comment.data
-            flash('评分已更新', 'success')
-        else:
-            # 创建新评分
-            score = Score(
-                project_id=project_id,
-                judge_id=current_user.id,
-                score_value=form.score_value.data,
-                comment=form.comment.data
-            )
-            db.session.add(score)
-            flash('评分提交成功', 'success')
-        
-        db.session.commit()
-        return redirect(url_for('judge.view_project', project_id=project_id))
-    
-    # 如果是GET请求，加载已有评分
-    existing_score = Score.query.filter_by(
-        project_id=project_id,
-        judge_id=current_user.id
-    ).first()
-    
-    if existing_score:
-        form.score_value.data = existing_score.score_value
-        form.comment.data = existing_score.comment
+            form.score_value.data = existing_score.score_value
+            form.comment.data = existing_score.comment
+        form.version.data = existing_score.version if existing_score else 0
     
     return render_template('judge/score_project.html', project=project, form=form)
 
 @judge_bp.route('/project/<int:project_id>/score_ajax', methods=['POST'])
 @login_required
 @judge_required
-def score_project_ajax():
-    """AJAX驱动的实时打分接口"""
-    project = Project.query.get_or_404(project_id)
-    
-    # 检查权限
-    assignment = JudgeAssignment.query.filter_by(
-        judge_id=current_user.id,
-        project_id=project_id,
-        is_active=True
-    ).first()
-    
-    if not assignment:
-        return jsonify({'error': '没有权限'}), 403
-    
-    data = request.get_json()
-    
-    # 检查是否已评分
-    existing_score = Score.query.filter_by(
-        project_id=project_id,
-        judge_id=current_user.id
-    ).first()
-    
-    if existing_score:
-        existing_score.score_value = data.get('score_value')
-        existing_score.comment = data.get('comment', '')
-    else:
-        score = Score(
-            project_id=project_id,
-            judge_id=current_user.id,
-            score_value=data.get('score_value'),
-            comment=data.get('comment', '')
-        )
-        db.session.add(score)
-    
-    db.session.commit()
-    return jsonify({'success': True, 'message': '评分已保存'})
+def score_project_ajax(project_id):
+    """AJAX驱动的实时打分接口（单个项目，参数同 /api/scores 中的一条评分）"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': '缺少评分数据'}), 400
+    result = save_scores(current_user.id, [{**data, 'project_id': project_id}])
+    if result['errors']:
+        message = result['errors'][0]['message']
+        return jsonify({'success': False, 'message': message}), 403 if message == '没有权限为此项目打分' else 400
+    if result['conflicts']:
+        return jsonify({'success': False, 'message': '评分已在其他页面修改', 'current': result['conflicts'][0]}), 409
+    return jsonify({'success': True, 'message': '评分已保存', 'version': result['saved'][0]['version']})
 
+@judge_bp.route('/api/scores', methods=['POST'])
+@login_required
+@judge_required
+def save_scores_api():
+    """
+    批量保存评分（自动保存）：{"scores": [{"project_id", "score_value", "comment", "version"}, ...]}
+    版本号与数据库不一致的评分不保存，在 conflicts 中返回数据库中的当前评分
+    """
+    data = request.get_json(silent=True)
+    entries = data.get('scores') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'success': False, 'message': '缺少评分数据'}), 400
+    result = save_scores(current_user.id, entries)
+    return jsonify({'success': not result['conflicts'] and not result['errors'], **result})
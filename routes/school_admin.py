@@ -1,16 +1,17 @@
 """
 校级管理员路由
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
-from models import db, Project, User, ReviewStatus, JudgeAssignment, Award, ExternalAward, Competition, Track, Team, ProjectTrack, UserRole, Score, UserRoleAssignment, AssessmentConfig
+from models import db, Project, User, ReviewStatus, JudgeAssignment, Award, ExternalAward, Competition, Track, Team, ProjectTrack, UserRole, Score, UserRoleAssignment, AssessmentConfig, ExportJob, ExportJobStatus
 from datetime import datetime
 from forms import FilterForm, AwardForm, ReviewForm, CompetitionForm, UserEditForm, UserCreateForm, QQGroupForm, DefenseOrderTimeForm, FinalQuotaForm, ExternalAwardForm, AssessmentConfigForm
 from utils.decorators import school_admin_required
-from utils.certificate import generate_certificate
-from utils.export import export_projects_to_excel, export_scores_to_excel, export_detailed_projects_to_excel
+from utils.export import (export_projects_to_excel, iter_detailed_project_rows, iter_score_rows, build_xlsx_file,
+                          iter_csv_chunks, attachment_header, with_detailed_export_options, with_score_export_options,
+                          build_school_projects_export_query, iter_export_projects,
+                          SCORE_COLUMNS, DETAILED_PROJECT_COLUMNS, SCORE_EXPORT_COLLECTIONS, DETAILED_EXPORT_COLLECTIONS)
 from utils.file_handler import save_uploaded_file
-from utils.timezone import beijing_now
 from config import Config
 import random
 
@@ -165,24 +166,16 @@ def sensitive_detection(project_id):
     from config import Config
     import os
     
-    detector = SensitiveDetector()
-    
+    # 先找出存在的文件，再并发识别
+    pending = []
     for attachment in attachments:
         # 构建完整文件路径
         file_path = os.path.join(Config.UPLOAD_FOLDER, attachment.file_path.replace('/', os.sep).replace('\\', os.sep))
         file_path = os.path.normpath(file_path)
         
         if os.path.exists(file_path):
-            # 进行识别
-            result = detector.detect_attachment(file_path, attachment.file_type or '')
-            
-            detection_results.append({
-                'attachment': attachment,
-                'has_sensitive': result.get('has_sensitive', False),
-                'detected_keywords': result.get('detected_keywords', []),
-                'details': result.get('details', ''),
-                'error': result.get('error')
-            })
+            pending.append((len(detection_results), attachment, file_path))
+            detection_results.append(None)
         else:
             detection_results.append({
                 'attachment': attachment,
@@ -192,6 +185,24 @@ def sensitive_detection(project_id):
                 'error': '文件不存在'
             })
     
+    with SensitiveDetector() as detector:
+        # force=1 时忽略缓存，重新识别全部附件；缓存键使用附件保存的内容哈希，不逐个读取文件计算
+        results = detector.detect_attachments(
+            ((file_path, attachment.file_type or '', attachment.content_hash) for _, attachment, file_path in pending),
+            force_rescan=request.args.get('force') == '1'
+        )
+    
+    for (index, attachment, _), result in zip(pending, results):
+        detection_results[index] = {
+            'attachment': attachment,
+            'has_sensitive': result.get('has_sensitive', False),
+            'detected_keywords': result.get('detected_keywords', []),
+            'details': result.get('details', ''),
+            'error': result.get('error'),
+            'cached': result.get('cached', False),
+            'detected_at': result.get('detected_at')
+        }
+    
     return render_template('school_admin/sensitive_detection.html', 
                          project=project, 
                          detection_results=detection_results,
@@ -262,15 +273,13 @@ def expert_review():
     # 获取所有竞赛用于筛选下拉框
     competitions = Competition.query.filter_by(is_active=True).all()
     
-    # 为每个项目获取评分信息
+    # 评分信息直接取项目上的评分汇总字段
     projects_with_scores = []
     for project in projects:
-        scores = Score.query.filter_by(project_id=project.id).all()
         projects_with_scores.append({
             'project': project,
-            'scores': scores,
-            'score_count': len(scores),
-            'avg_score': sum(s.score_value for s in scores) / len(scores) if scores else None
+            'score_count': project.score_count,
+            'avg_score': project.score_avg
         })
     
     return render_template('school_admin/expert_review.html', 
@@ -331,16 +340,9 @@ def assign_judge(project_id):
             return redirect(next_page)
         return redirect(url_for('school_admin.assign_judge', project_id=project_id, next=next_page))
     
-    # 获取所有评委（包括主角色为judge的用户，以及通过额外角色拥有judge身份的用户）
-    from models import UserRoleAssignment
-    # 主角色为judge的用户
-    primary_judges = User.query.filter_by(role='judge', is_active=True).all()
-    # 通过额外角色拥有judge身份的用户
-    additional_judge_ids = [ur.user_id for ur in UserRoleAssignment.query.filter_by(role='judge').all()]
-    additional_judges = User.query.filter(User.id.in_(additional_judge_ids), User.is_active == True).all() if additional_judge_ids else []
-    # 合并并去重
-    all_judge_ids = set([j.id for j in primary_judges] + [j.id for j in additional_judges])
-    judges = User.query.filter(User.id.in_(all_judge_ids), User.is_active == True).all()
+    # 获取所有评委（包括主角色为judge的用户，以及通过额外角色拥有judge身份的用户），一次查询
+    from utils.judge_assignment import active_judges_query
+    judges = active_judges_query().all()
     
     # 获取已分配的评委
     assigned_judges = [ja.judge for ja in project.judge_assignments.filter_by(is_active=True).all()]
@@ -357,6 +359,77 @@ def assign_judge(project_id):
     return render_template('school_admin/assign_judge.html', project=project, judges=judges, assigned_judges=assigned_judges, next_page=next_page)
 
 
+@school_admin_bp.route('/assign_judges', methods=['GET', 'POST'])
+@login_required
+@school_admin_required
+def assign_judges():
+    """批量分配评委：按竞赛为已通过学校审核的项目分配评委（回避推送学院、平均负载），可先预览"""
+    from sqlalchemy.exc import IntegrityError
+    from utils.judge_assignment import active_judges_query, plan_judge_assignments, apply_judge_assignments
+    
+    competitions = Competition.query.filter_by(is_active=True).all()
+    judges = active_judges_query().all()
+    
+    competition_id = request.values.get('competition_id', type=int)
+    judges_per_project = request.values.get('judges_per_project', 3, type=int)
+    selected_judge_ids = request.form.getlist('judge_ids', type=int) if request.method == 'POST' else [judge.id for judge in judges]
+    
+    plan = None
+    if request.method == 'POST':
+        if not competition_id:
+            flash('请选择竞赛', 'error')
+        elif not selected_judge_ids:
+            flash('请选择评委', 'error')
+        elif not judges_per_project or judges_per_project < 1:
+            flash('每个项目的评委数必须大于0', 'error')
+        else:
+            plan = plan_judge_assignments(competition_id, selected_judge_ids, judges_per_project)
+            # 只写入预览过的方案：重新计算的方案与预览时的指纹不同时不写入，显示新的方案
+            if request.form.get('action') == 'apply' and request.form.get('plan_fingerprint') != plan['fingerprint']:
+                flash('分配方案与预览时不同（项目、评委或已有分配发生了变化），请确认新的方案后再分配', 'warning')
+            elif request.form.get('action') == 'apply':
+                try:
+                    count = apply_judge_assignments(plan)
+                except IntegrityError:
+                    db.session.rollback()
+                    flash('分配期间评委分配发生了变化，请重新预览', 'error')
+                else:
+                    flash(f'已分配 {count} 条评审任务', 'success')
+                    if plan['shortfalls']:
+                        flash(f'{len(plan["shortfalls"])} 个项目可选评委不足，请补充评委后再次分配', 'warning')
+                    return redirect(url_for('school_admin.assign_judges', competition_id=competition_id,
+                                            judges_per_project=judges_per_project))
+    
+    # 预览：按项目列出新分配和重新启用的评委，并列出分配后各评委的评审数量
+    preview = None
+    if plan is not None:
+        judge_names = {judge.id: judge.real_name for judge in judges}
+        project_ids = ({project_id for project_id, _ in plan['assignments']}
+                       | {project_id for _, project_id, _ in plan['reactivate']} | set(plan['shortfalls']))
+        project_titles = dict(db.session.query(Project.id, Project.title).filter(Project.id.in_(project_ids))) if project_ids else {}
+        new_judges = {}
+        for project_id, judge_id in plan['assignments']:
+            new_judges.setdefault(project_id, []).append(judge_names.get(judge_id, judge_id))
+        for _, project_id, judge_id in plan['reactivate']:
+            new_judges.setdefault(project_id, []).append(f'{judge_names.get(judge_id, judge_id)}（重新启用）')
+        preview = {
+            'projects': [{'title': project_titles.get(project_id, project_id),
+                          'judges': new_judges.get(project_id, []),
+                          'shortfall': plan['shortfalls'].get(project_id, 0)}
+                         for project_id in sorted(project_ids)],
+            'loads': [(judge_names.get(judge_id, judge_id), load) for judge_id, load in plan['judge_loads'].items()],
+        }
+    
+    return render_template('school_admin/assign_judges.html',
+                         competitions=competitions,
+                         judges=judges,
+                         selected_competition_id=competition_id,
+                         selected_judge_ids=set(selected_judge_ids),
+                         judges_per_project=judges_per_project,
+                         plan=plan,
+                         preview=preview)
+
+
 @school_admin_bp.route('/project/<int:project_id>/award', methods=['GET', 'POST'])
 @login_required
 @school_admin_required
@@ -368,24 +441,15 @@ def set_award(project_id):
     if form.validate_on_submit():
         award_name = form.award_name.data
         
-        # 生成证书
-        certificate_path = generate_certificate(
-            team_name=project.team.name,
-            award_name=award_name,
-            competition_name=project.competition.name,
-            year=project.competition.year
-        )
-        
-        # 创建奖项记录
+        # 创建奖项记录（证书在首次查看或发布证书时生成，见 utils/certificate.py）
         award = Award(
             project_id=project_id,
-            award_name=award_name,
-            certificate_path=certificate_path
+            award_name=award_name
         )
         db.session.add(award)
         db.session.commit()
         
-        flash(f'奖项设置成功，证书已生成：{project.team.name}_{award_name}', 'success')
+        flash(f'奖项设置成功：{project.team.name}_{award_name}', 'success')
         return redirect(url_for('school_admin.dashboard'))
     
     return render_template('school_admin/set_award.html', project=project, form=form)
@@ -394,41 +458,39 @@ def set_award(project_id):
 @login_required
 @school_admin_required
 def export_projects():
-    """导出项目数据（包含完整的项目、成员信息）"""
+    """导出项目数据（包含完整的项目、成员信息），支持 format=xlsx/csv，逐批读取数据流式输出"""
+    from datetime import datetime
+    
     # 获取筛选条件
     project_name = request.args.get('project_name', '').strip()
     competition_id = request.args.get('competition_id', type=int)
     college = request.args.get('college', '').strip()
+    export_format = request.args.get('format', 'xlsx').lower()
     
-    # 基础查询：只显示学校已通过的项目
-    query = Project.query.filter(
-        Project.status == ReviewStatus.FINAL_APPROVED
-    )
-    
-    if project_name:
-        query = query.filter(Project.title.contains(project_name))
-    
-    if competition_id:
-        query = query.filter(Project.competition_id == competition_id)
-    
-    if college:
-        query = query.join(Team, Project.team_id == Team.id).join(User, Team.leader_id == User.id).filter(User.college.contains(college))
-    
-    projects = query.distinct().all()
+    query = build_school_projects_export_query(project_name, competition_id, college)
     
-    if not projects:
+    if query.first() is None:
         flash('没有可导出的项目数据', 'info')
         return redirect(url_for('school_admin.projects'))
     
+    filename = f'全校项目数据导出_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    
+    if export_format == 'csv':
+        rows = iter_detailed_project_rows(iter_export_projects(with_detailed_export_options(query), DETAILED_EXPORT_COLLECTIONS))
+        return Response(
+            stream_with_context(iter_csv_chunks(rows, DETAILED_PROJECT_COLUMNS)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': attachment_header(f'{filename}.csv')}
+        )
+    
     try:
-        output = export_detailed_projects_to_excel(projects)
-        from datetime import datetime
-        filename = f'全校项目数据导出_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        rows = iter_detailed_project_rows(iter_export_projects(with_detailed_export_options(query), DETAILED_EXPORT_COLLECTIONS))
+        output = build_xlsx_file(rows, '项目数据')
         return send_file(
             output,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
-            download_name=filename
+            download_name=f'{filename}.xlsx'
         )
     except Exception as e:
         flash(f'导出失败：{str(e)}', 'error')
@@ -438,9 +500,20 @@ def export_projects():
 @login_required
 @school_admin_required
 def export_scores():
-    """导出评分数据"""
-    projects = Project.query.all()
-    output = export_scores_to_excel(projects)
+    """导出评分数据，支持 format=xlsx/csv，逐批读取数据流式输出"""
+    export_format = request.args.get('format', 'xlsx').lower()
+    query = Project.query.order_by(Project.id.asc())
+    
+    if export_format == 'csv':
+        rows = iter_score_rows(iter_export_projects(with_score_export_options(query), SCORE_EXPORT_COLLECTIONS))
+        return Response(
+            stream_with_context(iter_csv_chunks(rows, SCORE_COLUMNS)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': attachment_header('scores_export.csv')}
+        )
+    
+    rows = iter_score_rows(iter_export_projects(with_score_export_options(query), SCORE_EXPORT_COLLECTIONS))
+    output = build_xlsx_file(rows, '评分数据', SCORE_COLUMNS)
     return send_file(
         output,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -448,6 +521,57 @@ def export_scores():
         download_name='scores_export.xlsx'
     )
 
+def _export_job_to_dict(job):
+    """导出任务状态（供前端轮询）"""
+    data = {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'progress': job.progress or 0,
+        'error_message': job.error_message,
+        'status_url': url_for('school_admin.export_job_status', job_id=job.id),
+    }
+    if job.status == ExportJobStatus.FINISHED:
+        data['download_url'] = url_for('school_admin.download_export_job', job_id=job.id)
+    return data
+
+@school_admin_bp.route('/export/jobs/<job_type>', methods=['POST'])
+@login_required
+@school_admin_required
+def create_export_job(job_type):
+    """提交后台导出任务（导出参数与同步导出接口相同，放在查询参数中），立即返回任务状态"""
+    from utils.export_jobs import EXPORT_JOB_TYPES, normalize_export_params, submit_export_job
+    
+    if job_type not in EXPORT_JOB_TYPES:
+        return jsonify({'success': False, 'message': '不支持的导出类型'}), 400
+    
+    params = normalize_export_params(job_type, request.args)
+    job = submit_export_job(job_type, params, current_user.id)
+    return jsonify({'success': True, 'job': _export_job_to_dict(job)})
+
+@school_admin_bp.route('/export/jobs/<int:job_id>')
+@login_required
+@school_admin_required
+def export_job_status(job_id):
+    """查询后台导出任务状态"""
+    job = ExportJob.query.get_or_404(job_id)
+    return jsonify({'success': True, 'job': _export_job_to_dict(job)})
+
+@school_admin_bp.route('/export/jobs/<int:job_id>/download')
+@login_required
+@school_admin_required
+def download_export_job(job_id):
+    """下载后台导出任务生成的文件"""
+    from utils.export_jobs import get_export_file_path
+    
+    job = ExportJob.query.get_or_404(job_id)
+    file_path = get_export_file_path(job) if job.status == ExportJobStatus.FINISHED else None
+    if not file_path:
+        flash('导出文件不存在或已过期，请重新导出', 'error')
+        return redirect(url_for('school_admin.dashboard'))
+    
+    return send_file(str(file_path), as_attachment=True, download_name=job.file_name)
+
 @school_admin_bp.route('/competitions')
 @login_required
 @school_admin_required
@@ -619,52 +743,14 @@ def final_competition():
     # 筛选条件
     competition_id = request.args.get('competition_id', type=int)
     
-    # 查询已通过学校审核且有评分的项目
-    query = Project.query.filter(
-        Project.status == ReviewStatus.FINAL_APPROVED
-    ).join(Competition)
-    
-    if competition_id:
-        query = query.filter(Project.competition_id == competition_id)
-    
-    projects = query.all()
-    
-    # 按竞赛分组处理项目
-    competition_projects = {}
-    for project in projects:
-        comp_id = project.competition_id
-        if comp_id not in competition_projects:
-            competition_projects[comp_id] = []
-        
-        scores = Score.query.filter_by(project_id=project.id).all()
-        if scores:
-            avg_score = sum(s.score_value for s in scores) / len(scores)
-            competition_projects[comp_id].append({
-                'project': project,
-                'avg_score': avg_score,
-                'score_count': len(scores)
-            })
-    
-    # 为每个竞赛的项目按平均分降序排序，并确定进入决赛的项目
-    all_final_projects = []
-    all_non_final_projects = []
+    # 按竞赛排名已通过学校审核且有评分的项目（只读，is_final 只在设置名额或更新决赛名单时计算）
+    from utils.ranking import get_competition_rankings
+    rankings = get_competition_rankings(competition_id)
     
-    for comp_id, projects_list in competition_projects.items():
-        competition = Competition.query.get(comp_id)
-        # 按平均分降序排序
-        projects_list.sort(key=lambda x: x['avg_score'], reverse=True)
-        
-        # 根据竞赛的决赛名额确定哪些项目进入决赛
-        for idx, item in enumerate(projects_list, start=1):
-            project = item['project']
-            if competition.final_quota and idx <= competition.final_quota:
-                project.is_final = True
-                all_final_projects.append(item)
-            else:
-                project.is_final = False
-                all_non_final_projects.append(item)
-    
-    db.session.commit()
+    all_final_projects = [item for item in rankings if item['project'].is_final]
+    all_non_final_projects = [item for item in rankings if not item['project'].is_final]
+    # 评审期间评分仍在变化：按当前评分排名的决赛名单与已确定的名单不一致时提示管理员更新
+    ranking_changed = any(item['is_final'] != bool(item['project'].is_final) for item in rankings)
     
     # 校赛决赛不按评分排序，按项目ID或创建时间排序（保持稳定顺序）
     all_final_projects.sort(key=lambda x: x['project'].id)
@@ -673,14 +759,30 @@ def final_competition():
     return render_template('school_admin/final_competition.html', 
                          final_projects=all_final_projects, 
                          non_final_projects=all_non_final_projects,
+                         ranking_changed=ranking_changed,
                          competitions=competitions,
                          selected_competition_id=competition_id)
 
+@school_admin_bp.route('/final_competition/update', methods=['POST'])
+@login_required
+@school_admin_required
+def update_final_competition():
+    """按当前评分和决赛名额更新决赛名单（未选择竞赛时更新全部竞赛）"""
+    competition_id = request.form.get('competition_id', type=int)
+    if competition_id:
+        update_final_projects_by_quota(competition_id)
+    else:
+        for competition in Competition.query.filter_by(is_active=True).all():
+            update_final_projects_by_quota(competition.id)
+    flash('已根据专家评审评分和决赛名额更新决赛名单', 'success')
+    return redirect(url_for('school_admin.final_competition', competition_id=competition_id))
+
 @school_admin_bp.route('/defense_order')
 @login_required
 @school_admin_required
 def defense_order():
     """答辩顺序管理页"""
+    from sqlalchemy.orm import joinedload
     # 获取所有竞赛
     competitions = Competition.query.filter_by(is_active=True).all()
     
@@ -698,43 +800,13 @@ def defense_order():
     if competition_id:
         query = query.filter(Project.competition_id == competition_id)
     
-    projects = query.all()
+    projects = query.options(
+        joinedload(Project.competition),
+        joinedload(Project.team).joinedload(Team.leader)
+    ).all()
     
-    # 处理每个项目的抽取状态
-    final_projects = []
-    for project in projects:
-        competition = project.competition
-        now = beijing_now()
-        
-        # 检查是否需要自动分配（超过截止时间且未抽取）
-        if (competition.defense_order_end and 
-            now > competition.defense_order_end and 
-            project.defense_order is None):
-            # 自动分配：获取该竞赛所有已抽取的顺序
-            existing_orders = set()
-            other_projects = Project.query.filter(
-                Project.competition_id == project.competition_id,
-                Project.is_final == True,
-                Project.defense_order.isnot(None)
-            ).all()
-            for p in other_projects:
-                if p.defense_order:
-                    existing_orders.add(p.defense_order)
-            
-            # 获取所有进入决赛的项目数量
-            all_final = Project.query.filter(
-                Project.competition_id == project.competition_id,
-                Project.is_final == True
-            ).count()
-            
-            # 找到第一个未使用的顺序
-            for order in range(1, all_final + 1):
-                if order not in existing_orders:
-                    project.defense_order = order
-                    db.session.commit()
-                    break
-        
-        final_projects.append({'project': project})
+    # 截止后未抽取的项目由定时任务 flask assign-defense-orders 分配，页面只读取
+    final_projects = [{'project': project} for project in projects]
     
     # 按答辩顺序排序，未抽取的排在后面
     final_projects.sort(key=lambda x: (x['project'].defense_order is None, x['project'].defense_order or 999999))
@@ -749,6 +821,7 @@ def defense_order():
 @school_admin_required
 def update_defense_order():
     """更新答辩顺序"""
+    from utils.defense_order import set_defense_order
     data = request.get_json()
     project_id = data.get('project_id')
     defense_order = data.get('defense_order')
@@ -768,25 +841,10 @@ def update_defense_order():
         if defense_order < 1:
             return jsonify({'success': False, 'message': '答辩顺序必须大于0'}), 400
         
-        # 保存当前项目的原顺序
-        old_order = project.defense_order
-        
         # 如果新顺序已被其他项目使用，则交换位置
-        existing = Project.query.filter(
-            Project.competition_id == project.competition_id,
-            Project.is_final == True,
-            Project.defense_order == defense_order,
-            Project.id != project_id
-        ).first()
-        
-        if existing:
-            # 交换位置：将B调整到A的原位置
-            existing.defense_order = old_order
-        
-        # 将当前项目调整到新位置
-        project.defense_order = defense_order
+        set_defense_order(project, defense_order)
     else:
-        project.defense_order = None
+        set_defense_order(project, None)
     
     db.session.commit()
     
@@ -945,48 +1003,10 @@ def update_final_projects_by_quota(competition_id):
     Args:
         competition_id: 竞赛ID
     """
-    from models import Score
-    
-    competition = Competition.query.get_or_404(competition_id)
-    
-    # 获取该竞赛所有已通过学校审核的项目
-    projects = Project.query.filter(
-        Project.competition_id == competition_id,
-        Project.status == ReviewStatus.FINAL_APPROVED
-    ).all()
-    
-    # 计算每个项目的平均分，并过滤掉没有评分的项目
-    projects_with_scores = []
-    for project in projects:
-        scores = Score.query.filter_by(project_id=project.id).all()
-        if scores:  # 只处理有评分的项目
-            avg_score = sum(s.score_value for s in scores) / len(scores)
-            projects_with_scores.append({
-                'project': project,
-                'avg_score': avg_score
-            })
-    
-    # 按平均分降序排序
-    projects_with_scores.sort(key=lambda x: x['avg_score'], reverse=True)
-    
-    # 根据决赛名额设置is_final
-    if competition.final_quota and competition.final_quota > 0:
-        # 如果设置了名额，将前N名设为进入决赛
-        for idx, item in enumerate(projects_with_scores, start=1):
-            if idx <= competition.final_quota:
-                item['project'].is_final = True
-            else:
-                item['project'].is_final = False
-    else:
-        # 如果没有设置名额，将所有项目设为不进入决赛
-        for item in projects_with_scores:
-            item['project'].is_final = False
-    
-    # 对于没有评分的项目，也设为不进入决赛
-    projects_without_scores = [p for p in projects if not any(ps['project'].id == p.id for ps in projects_with_scores)]
-    for project in projects_without_scores:
-        project.is_final = False
+    from utils.ranking import apply_final_quota
     
+    Competition.query.get_or_404(competition_id)
+    apply_final_quota(competition_id)
     db.session.commit()
 
 @school_admin_bp.route('/final_quota', methods=['GET', 'POST'])
@@ -1163,32 +1183,17 @@ def set_award_for_final(project_id):
         # 检查是否已有奖项
         existing_award = Award.query.filter_by(project_id=project_id).first()
         if existing_award:
-            # 更新奖项
+            # 更新奖项（证书在下次查看时按新的奖项名称重新生成）
             existing_award.award_name = award_name
-            # 重新生成证书
-            certificate_path = generate_certificate(
-                team_name=project.team.name,
-                award_name=award_name,
-                competition_name=project.competition.name,
-                year=project.competition.year
-            )
-            existing_award.certificate_path = certificate_path
-            flash('奖项已更新，证书已重新生成', 'success')
+            flash('奖项已更新', 'success')
         else:
-            # 创建新奖项
-            certificate_path = generate_certificate(
-                team_name=project.team.name,
-                award_name=award_name,
-                competition_name=project.competition.name,
-                year=project.competition.year
-            )
+            # 创建新奖项（证书在首次查看或发布证书时生成）
             award = Award(
                 project_id=project_id,
-                award_name=award_name,
-                certificate_path=certificate_path
+                award_name=award_name
             )
             db.session.add(award)
-            flash('奖项设置成功，证书已生成', 'success')
+            flash('奖项设置成功', 'success')
         
         db.session.commit()
         return redirect(url_for('school_admin.awards', competition_id=project.competition_id))
@@ -1556,301 +1561,21 @@ def assessment():
     """考核模块主页 - 科创竞赛参与与获奖数据"""
     from models import COLLEGES
     from datetime import datetime
+    from utils.assessment import build_college_stats, get_available_years
     
     # 获取年度筛选参数（默认为当前年份）
     selected_year = request.args.get('year', type=int)
     if not selected_year:
         selected_year = datetime.now().year
     
-    # 获取所有可用年份（从竞赛中提取）
-    available_years = db.session.query(Competition.year).distinct().order_by(Competition.year.desc()).all()
-    available_years = [y[0] for y in available_years if y[0]]
-    
-    # 挑战杯系列赛事类型
-    challenge_cup_types = [
-        '"挑战杯"全国大学生课外学术科技作品竞赛',
-        '"挑战杯"中国大学生创业计划大赛'
-    ]
-    
-    # 获取指定年度的挑战杯系列竞赛（同一类型只取先创建的）
-    challenge_cup_competitions = []
-    for comp_type in challenge_cup_types:
-        comp = Competition.query.filter(
-            Competition.competition_type == comp_type,
-            Competition.is_active == True,
-            Competition.year == selected_year
-        ).order_by(Competition.created_at.asc()).first()  # 取最先创建的
-        if comp:
-            challenge_cup_competitions.append(comp)
-    
-    # 按学院统计数据
-    college_stats = {}
-    
-    for college in COLLEGES:
-        # 初始化统计数据
-        stats = {
-            'college': college,
-            # 挑战杯主赛道
-            'challenge_cup': {
-                'registration_count': 0,  # 报名数
-                'school_awards': {
-                    'gold': 0,  # 校级金奖（一等奖/特等奖）
-                    'silver': 0,  # 校级银奖（二等奖）
-                    'bronze': 0,  # 校级铜奖（三等奖）
-                },
-                'provincial_awards': {
-                    'gold': 0,  # 省级金奖（一等奖/特等奖）
-                    'silver': 0,  # 省级银奖（二等奖）
-                    'bronze': 0,  # 省级铜奖（三等奖）
-                },
-                'national_awards': {
-                    'gold': 0,  # 国家级金奖（所有奖项都算，加满3分）
-                    'silver': 0,  # 国家级银奖（所有奖项都算，加满3分）
-                    'bronze': 0,  # 国家级铜奖（所有奖项都算，加满3分）
-                },
-                'total_awards': 0,  # 获奖总数
-                'special_notes': '',  # 特殊情况备注
-            },
-            # 配套活动
-            'challenge_cup_activities': {
-                'registration_count': 0,
-                'national_awards': {
-                    'gold': 0,
-                    'silver': 0,
-                    'bronze': 0
-                },
-                'notes': ''  # 配套活动备注（暂时保留，但表格中不再显示）
-            },
-            # 红旅赛道
-            'red_travel': {
-                'registration_count': 0,
-                'school_awards': {
-                    'gold': 0,  # 校级金奖（一等奖/特等奖）
-                    'silver': 0,  # 校级银奖（二等奖）
-                    'bronze': 0,  # 校级铜奖（三等奖）
-                },
-                'provincial_awards': {
-                    'gold': 0,  # 省级金奖
-                    'silver': 0,  # 省级银奖
-                    'bronze': 0,  # 省级铜奖
-                },
-                'national_awards': {
-                    'gold': 0,  # 国家级金奖（所有奖项都算，加满3分）
-                    'silver': 0,  # 国家级银奖（所有奖项都算，加满3分）
-                    'bronze': 0,  # 国家级铜奖（所有奖项都算，加满3分）
-                },
-                'total_awards': 0,  # 获奖总数
-                'special_notes': ''  # 特殊情况备注
-            }
-        }
-        
-        # 统计挑战杯主赛道数据
-        for comp in challenge_cup_competitions:
-            # 查询该学院在该竞赛中的项目（已通过学校审核）
-            projects = Project.query.filter(
-                Project.competition_id == comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            
-            stats['challenge_cup']['registration_count'] += len(projects)
-            
-            # 统计每个项目的奖项
-            for project in projects:
-                # 统计校赛奖项（Award表）- 统一识别为金奖/银奖/铜奖
-                awards = Award.query.filter_by(project_id=project.id).all()
-                for award in awards:
-                    award_name = award.award_name
-                    # 兼容"一等奖/特等奖"和"金奖"，统一识别为金奖
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        stats['challenge_cup']['school_awards']['gold'] += 1
-                        stats['challenge_cup']['total_awards'] += 1
-                    # 兼容"二等奖"和"银奖"，统一识别为银奖
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        stats['challenge_cup']['school_awards']['silver'] += 1
-                        stats['challenge_cup']['total_awards'] += 1
-                    # 兼容"三等奖"和"铜奖"，统一识别为铜奖
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        stats['challenge_cup']['school_awards']['bronze'] += 1
-                        stats['challenge_cup']['total_awards'] += 1
-                
-                # 统计外部奖项（ExternalAward表）- 统一识别为金奖/银奖/铜奖
-                external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-                for ext_award in external_awards:
-                    if ext_award.award_level == '省赛':
-                        award_name = ext_award.award_name
-                        # 兼容"一等奖/特等奖"和"金奖"，统一识别为金奖
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            stats['challenge_cup']['provincial_awards']['gold'] += 1
-                            stats['challenge_cup']['total_awards'] += 1
-                        # 兼容"二等奖"和"银奖"，统一识别为银奖
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            stats['challenge_cup']['provincial_awards']['silver'] += 1
-                            stats['challenge_cup']['total_awards'] += 1
-                        # 兼容"三等奖"和"铜奖"，统一识别为铜奖
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            stats['challenge_cup']['provincial_awards']['bronze'] += 1
-                            stats['challenge_cup']['total_awards'] += 1
-                    elif ext_award.award_level == '国赛':
-                        award_name = ext_award.award_name
-                        # 国赛所有奖项都统计（无论金银铜，计分时都加满3分）
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            stats['challenge_cup']['national_awards']['gold'] += 1
-                            stats['challenge_cup']['total_awards'] += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            stats['challenge_cup']['national_awards']['silver'] += 1
-                            stats['challenge_cup']['total_awards'] += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            stats['challenge_cup']['national_awards']['bronze'] += 1
-                            stats['challenge_cup']['total_awards'] += 1
-        
-        # 统计红旅赛道数据（指定年度，只取先创建的）
-        red_travel_comp = Competition.query.filter(
-            Competition.competition_type == '中国国际大学生创新大赛"青年红色筑梦之旅"赛道',
-            Competition.is_active == True,
-            Competition.year == selected_year
-        ).order_by(Competition.created_at.asc()).first()  # 取最先创建的
-        red_travel_competitions = [red_travel_comp] if red_travel_comp else []
-        
-        for comp in red_travel_competitions:
-            projects = Project.query.filter(
-                Project.competition_id == comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            
-            stats['red_travel']['registration_count'] += len(projects)
-            
-            # 统计每个项目的奖项
-            for project in projects:
-                # 统计校赛奖项 - 统一识别为金奖/银奖/铜奖
-                awards = Award.query.filter_by(project_id=project.id).all()
-                for award in awards:
-                    award_name = award.award_name
-                    # 兼容"一等奖/特等奖"和"金奖"，统一识别为金奖
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        stats['red_travel']['school_awards']['gold'] += 1
-                        stats['red_travel']['total_awards'] += 1
-                    # 兼容"二等奖"和"银奖"，统一识别为银奖
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        stats['red_travel']['school_awards']['silver'] += 1
-                        stats['red_travel']['total_awards'] += 1
-                    # 兼容"三等奖"和"铜奖"，统一识别为铜奖
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        stats['red_travel']['school_awards']['bronze'] += 1
-                        stats['red_travel']['total_awards'] += 1
-                
-                # 统计外部奖项
-                external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-                for ext_award in external_awards:
-                    if ext_award.award_level == '省赛':
-                        award_name = ext_award.award_name
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            stats['red_travel']['provincial_awards']['gold'] += 1
-                            stats['red_travel']['total_awards'] += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            stats['red_travel']['provincial_awards']['silver'] += 1
-                            stats['red_travel']['total_awards'] += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            stats['red_travel']['provincial_awards']['bronze'] += 1
-                            stats['red_travel']['total_awards'] += 1
-                    elif ext_award.award_level == '国赛':
-                        award_name = ext_award.award_name
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            stats['red_travel']['national_awards']['gold'] += 1
-                            stats['red_travel']['total_awards'] += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            stats['red_travel']['national_awards']['silver'] += 1
-                            stats['red_travel']['total_awards'] += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            stats['red_travel']['national_awards']['bronze'] += 1
-                            stats['red_travel']['total_awards'] += 1
-        
-        # 获取配置数据（任务要求、特殊情况备注、配套活动、可编辑的统计数据）- 按学院获取
-        config = AssessmentConfig.query.filter_by(year=selected_year, college=college).first()
-        if config:
-            # 任务要求
-            stats['challenge_cup']['requirement'] = config.challenge_cup_requirement if config.challenge_cup_requirement else None
-            stats['red_travel']['requirement'] = config.red_travel_requirement if config.red_travel_requirement else None
-            # 特殊情况备注
-            stats['challenge_cup']['special_notes'] = config.challenge_cup_special_notes or '' if config.challenge_cup_special_notes else ''
-            stats['red_travel']['special_notes'] = config.red_travel_special_notes or '' if config.red_travel_special_notes else ''
-            # 配套活动数据（从JSON解析，如果challenge_cup_activities是JSON格式）
-            # 暂时保留notes字段的兼容性，后续可以改为存储JSON
-            stats['challenge_cup_activities']['notes'] = config.challenge_cup_activities or '' if config.challenge_cup_activities else ''
-            
-            # 从配置中获取可编辑的统计数据
-            # 挑战杯主赛道
-            if config.challenge_cup_main_registration is not None:
-                stats['challenge_cup']['registration_count'] = config.challenge_cup_main_registration
-            if config.challenge_cup_main_school_gold is not None:
-                stats['challenge_cup']['school_awards']['gold'] = config.challenge_cup_main_school_gold
-            if config.challenge_cup_main_school_silver is not None:
-                stats['challenge_cup']['school_awards']['silver'] = config.challenge_cup_main_school_silver
-            if config.challenge_cup_main_school_bronze is not None:
-                stats['challenge_cup']['school_awards']['bronze'] = config.challenge_cup_main_school_bronze
-            if config.challenge_cup_main_provincial_gold is not None:
-                stats['challenge_cup']['provincial_awards']['gold'] = config.challenge_cup_main_provincial_gold
-            if config.challenge_cup_main_provincial_silver is not None:
-                stats['challenge_cup']['provincial_awards']['silver'] = config.challenge_cup_main_provincial_silver
-            if config.challenge_cup_main_provincial_bronze is not None:
-                stats['challenge_cup']['provincial_awards']['bronze'] = config.challenge_cup_main_provincial_bronze
-            if config.challenge_cup_main_national_gold is not None:
-                stats['challenge_cup']['national_awards']['gold'] = config.challenge_cup_main_national_gold
-            if config.challenge_cup_main_national_silver is not None:
-                stats['challenge_cup']['national_awards']['silver'] = config.challenge_cup_main_national_silver
-            if config.challenge_cup_main_national_bronze is not None:
-                stats['challenge_cup']['national_awards']['bronze'] = config.challenge_cup_main_national_bronze
-            if config.challenge_cup_main_total_awards is not None:
-                stats['challenge_cup']['total_awards'] = config.challenge_cup_main_total_awards
-            
-            # 挑战杯配套活动
-            if config.challenge_cup_activities_registration is not None:
-                stats['challenge_cup_activities']['registration_count'] = config.challenge_cup_activities_registration
-            if config.challenge_cup_activities_national_gold is not None:
-                stats['challenge_cup_activities']['national_awards']['gold'] = config.challenge_cup_activities_national_gold
-            if config.challenge_cup_activities_national_silver is not None:
-                stats['challenge_cup_activities']['national_awards']['silver'] = config.challenge_cup_activities_national_silver
-            if config.challenge_cup_activities_national_bronze is not None:
-                stats['challenge_cup_activities']['national_awards']['bronze'] = config.challenge_cup_activities_national_bronze
-            
-            # 红旅赛道
-            if config.red_travel_registration is not None:
-                stats['red_travel']['registration_count'] = config.red_travel_registration
-            if config.red_travel_school_gold is not None:
-                stats['red_travel']['school_awards']['gold'] = config.red_travel_school_gold
-            if config.red_travel_school_silver is not None:
-                stats['red_travel']['school_awards']['silver'] = config.red_travel_school_silver
-            if config.red_travel_school_bronze is not None:
-                stats['red_travel']['school_awards']['bronze'] = config.red_travel_school_bronze
-            if config.red_travel_provincial_gold is not None:
-                stats['red_travel']['provincial_awards']['gold'] = config.red_travel_provincial_gold
-            if config.red_travel_provincial_silver is not None:
-                stats['red_travel']['provincial_awards']['silver'] = config.red_travel_provincial_silver
-            if config.red_travel_provincial_bronze is not None:
-                stats['red_travel']['provincial_awards']['bronze'] = config.red_travel_provincial_bronze
-            if config.red_travel_national_gold is not None:
-                stats['red_travel']['national_awards']['gold'] = config.red_travel_national_gold
-            if config.red_travel_national_silver is not None:
-                stats['red_travel']['national_awards']['silver'] = config.red_travel_national_silver
-            if config.red_travel_national_bronze is not None:
-                stats['red_travel']['national_awards']['bronze'] = config.red_travel_national_bronze
-            if config.red_travel_total_awards is not None:
-                stats['red_travel']['total_awards'] = config.red_travel_total_awards
-        else:
-            stats['challenge_cup']['requirement'] = None
-            stats['red_travel']['requirement'] = None
-            stats['challenge_cup']['special_notes'] = ''
-            stats['red_travel']['special_notes'] = ''
-            stats['challenge_cup_activities']['notes'] = ''
-        
-        college_stats[college] = stats
+    # 按学院统计数据（含任务要求、特殊情况备注和手动编辑的统计数据）
+    college_stats = build_college_stats(selected_year)
     
     return render_template('school_admin/assessment_data_aggrid.html', 
                          colleges=COLLEGES,
                          college_stats=college_stats,
                          selected_year=selected_year,
-                         available_years=available_years)
+                         available_years=get_available_years())
 
 @school_admin_bp.route('/assessment/aggrid')
 @login_required
@@ -1870,404 +1595,43 @@ def assessment_score():
     """年度考核分数统计"""
     from models import COLLEGES
     from datetime import datetime
+    from utils.assessment import build_college_scores, get_available_years
     
     # 获取年度筛选参数（默认为当前年份）
     selected_year = request.args.get('year', type=int)
     if not selected_year:
         selected_year = datetime.now().year
     
-    # 获取所有可用年份（从竞赛中提取）
-    available_years = db.session.query(Competition.year).distinct().order_by(Competition.year.desc()).all()
-    available_years = [y[0] for y in available_years if y[0]]
-    
-    # 重新计算统计数据（与assessment()函数相同的逻辑）
-    challenge_cup_types = [
-        '"挑战杯"全国大学生课外学术科技作品竞赛',
-        '"挑战杯"中国大学生创业计划大赛'
-    ]
-    
-    # 获取指定年度的挑战杯系列竞赛（同一类型只取先创建的）
-    challenge_cup_competitions = []
-    for comp_type in challenge_cup_types:
-        comp = Competition.query.filter(
-            Competition.competition_type == comp_type,
-            Competition.is_active == True,
-            Competition.year == selected_year
-        ).order_by(Competition.created_at.asc()).first()  # 取最先创建的
-        if comp:
-            challenge_cup_competitions.append(comp)
-    
-    # 获取红旅竞赛（只取先创建的）
-    red_travel_comp = Competition.query.filter(
-        Competition.competition_type == '中国国际大学生创新大赛"青年红色筑梦之旅"赛道',
-        Competition.is_active == True,
-        Competition.year == selected_year
-    ).order_by(Competition.created_at.asc()).first()  # 取最先创建的
-    red_travel_competitions = [red_travel_comp] if red_travel_comp else []
-    
-    # 按学院统计分数
-    college_scores = {}
-    
-    for college in COLLEGES:
-        # 初始化分数统计
-        score_data = {
-            'college': college,
-            'red_travel_participation': 0,  # 红旅参与（申报队伍数）
-            'red_travel_award': 0,  # 红旅获奖（最高奖项分数）
-            'challenge_cup_participation': 0,  # 挑战杯参与（报名数）
-            'challenge_cup_award': 0,  # 挑战杯获奖（最高奖项分数）
-            'total_score': 0,  # 总分
-            'score_details': {
-                'red_travel_participation': {'score': 0, 'note': ''},
-                'red_travel_award': {'score': 0, 'note': ''},
-                'challenge_cup_participation': {'score': 0, 'note': ''},
-                'challenge_cup_award': {'score': 0, 'note': ''}
-            }
-        }
-        
-        # 统计红旅数据
-        red_travel_projects = []
-        if red_travel_comp:
-            projects = Project.query.filter(
-                Project.competition_id == red_travel_comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            red_travel_projects.extend(projects)
-        
-        score_data['red_travel_participation'] = len(red_travel_projects)
-        # 红旅参与分数计算（2分满分，实际申报/要求申报*2分，上限2分，缺项为空）
-        actual_count = len(red_travel_projects)
-        # 按学院获取任务要求
-        college_config = AssessmentConfig.query.filter_by(year=selected_year, college=college).first()
-        target_count = college_config.red_travel_requirement if college_config and college_config.red_travel_requirement else None
-        
-        if target_count is None or target_count == 0:
-            # 缺项：任务要求未设置，分数为空
-            score_data['score_details']['red_travel_participation']['score'] = None
-            score_data['score_details']['red_travel_participation']['note'] = f'申报队伍数：{actual_count}（任务要求未设置）'
-        else:
-            # 实际申报/要求申报*2分，上限2分
-            calculated_score = min(2.0, (actual_count / target_count) * 2.0)
-            score_data['score_details']['red_travel_participation']['score'] = calculated_score
-            score_data['score_details']['red_travel_participation']['note'] = f'申报队伍数：{actual_count}，任务要求：{target_count}'
-        
-        # 红旅获奖分数计算（3分满分，取最高奖项）
-        max_red_travel_score = 0
-        for project in red_travel_projects:
-            # 检查校赛奖项 - 统一识别为金奖/银奖/铜奖
-            awards = Award.query.filter_by(project_id=project.id).all()
-            for award in awards:
-                award_name = award.award_name
-                # 校赛：金奖=1分，银奖=0.6分，铜奖=0.3分（特等奖按金奖算）
-                if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 1.0)
-                elif '银奖' in award_name or '二等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 0.6)
-                elif '铜奖' in award_name or '三等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 0.3)
-            
-            # 检查外部奖项
-            external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-            for ext_award in external_awards:
-                award_name = ext_award.award_name
-                if ext_award.award_level == '省赛':
-                    # 省赛：金奖=3分，银奖=2分，铜奖=1分
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 3.0)
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 2.0)
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 1.0)
-                elif ext_award.award_level == '国赛':
-                    # 国赛：无论金银铜都加满（3分）
-                    if '金奖' in award_name or '银奖' in award_name or '铜奖' in award_name or '一等奖' in award_name or '二等奖' in award_name or '三等奖' in award_name or '特等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 3.0)
-        
-        score_data['red_travel_award'] = max_red_travel_score
-        score_data['score_details']['red_travel_award']['score'] = min(3.0, max_red_travel_score)
-        if max_red_travel_score == 0:
-            score_data['score_details']['red_travel_award']['note'] = '无获奖'
-        else:
-            score_data['score_details']['red_travel_award']['note'] = f'最高奖项得分：{max_red_travel_score}分'
-        
-        # 统计挑战杯数据
-        challenge_cup_projects = []
-        for comp in challenge_cup_competitions:
-            projects = Project.query.filter(
-                Project.competition_id == comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            challenge_cup_projects.extend(projects)
-        
-        score_data['challenge_cup_participation'] = len(challenge_cup_projects)
-        # 挑战杯参与分数计算（2分满分，实际申报/要求申报*2分，上限2分，缺项为空）
-        actual_count = len(challenge_cup_projects)
-        # 按学院获取任务要求
-        college_config = AssessmentConfig.query.filter_by(year=selected_year, college=college).first()
-        target_count = college_config.challenge_cup_requirement if college_config and college_config.challenge_cup_requirement else None
-        
-        if target_count is None or target_count == 0:
-            # 缺项：任务要求未设置，分数为空
-            score_data['score_details']['challenge_cup_participation']['score'] = None
-            score_data['score_details']['challenge_cup_participation']['note'] = f'报名数：{actual_count}（任务要求未设置）'
-        else:
-            # 实际申报/要求申报*2分，上限2分
-            calculated_score = min(2.0, (actual_count / target_count) * 2.0)
-            score_data['score_details']['challenge_cup_participation']['score'] = calculated_score
-            score_data['score_details']['challenge_cup_participation']['note'] = f'报名数：{actual_count}，任务要求：{target_count}'
-        
-        # 挑战杯获奖分数计算（3分满分，取最高奖项）
-        max_challenge_cup_score = 0
-        for project in challenge_cup_projects:
-            # 检查校赛奖项 - 统一识别为金奖/银奖/铜奖
-            awards = Award.query.filter_by(project_id=project.id).all()
-            for award in awards:
-                award_name = award.award_name
-                # 校赛：金奖=1分，银奖=0.6分，铜奖=0.3分（特等奖按金奖算）
-                if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 1.0)
-                elif '银奖' in award_name or '二等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 0.6)
-                elif '铜奖' in award_name or '三等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 0.3)
-            
-            # 检查外部奖项
-            external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-            for ext_award in external_awards:
-                award_name = ext_award.award_name
-                if ext_award.award_level == '省赛':
-                    # 省赛：金奖=3分，银奖=2分，铜奖=1分（特等奖按金奖算）
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 3.0)
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 2.0)
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 1.0)
-                elif ext_award.award_level == '国赛':
-                    # 国赛：无论金银铜都加满（3分）
-                    if '金奖' in award_name or '银奖' in award_name or '铜奖' in award_name or '一等奖' in award_name or '二等奖' in award_name or '三等奖' in award_name or '特等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 3.0)
-        
-        score_data['challenge_cup_award'] = max_challenge_cup_score
-        score_data['score_details']['challenge_cup_award']['score'] = min(3.0, max_challenge_cup_score)
-        if max_challenge_cup_score == 0:
-            score_data['score_details']['challenge_cup_award']['note'] = '无获奖'
-        else:
-            score_data['score_details']['challenge_cup_award']['note'] = f'最高奖项得分：{max_challenge_cup_score}分'
-        
-        # 计算总分（如果某项为空则不计入）
-        total_score = 0
-        if score_data['score_details']['red_travel_participation']['score'] is not None:
-            total_score += score_data['score_details']['red_travel_participation']['score']
-        total_score += score_data['score_details']['red_travel_award']['score']
-        if score_data['score_details']['challenge_cup_participation']['score'] is not None:
-            total_score += score_data['score_details']['challenge_cup_participation']['score']
-        total_score += score_data['score_details']['challenge_cup_award']['score']
-        score_data['total_score'] = total_score
-        
-        college_scores[college] = score_data
+    # 按学院统计分数（使用计算值）
+    college_scores = build_college_scores(selected_year)
     
     return render_template('school_admin/assessment_score.html', 
                          colleges=COLLEGES,
                          college_scores=college_scores,
                          selected_year=selected_year,
-                         available_years=available_years)
+                         available_years=get_available_years())
 
 @school_admin_bp.route('/assessment/score/aggrid')
 @login_required
 @school_admin_required
 def assessment_score_aggrid():
     """年度考核分数统计 - AG Grid 版本"""
-    # 复用 assessment_score() 的数据准备逻辑
     from models import COLLEGES
     from datetime import datetime
+    from utils.assessment import build_college_scores, get_available_years
     
     selected_year = request.args.get('year', type=int)
     if not selected_year:
         selected_year = datetime.now().year
     
-    available_years = db.session.query(Competition.year).distinct().order_by(Competition.year.desc()).all()
-    available_years = [y[0] for y in available_years if y[0]]
-    
-    # 重新计算统计数据（与assessment_score()函数相同的逻辑）
-    challenge_cup_types = [
-        '"挑战杯"全国大学生课外学术科技作品竞赛',
-        '"挑战杯"中国大学生创业计划大赛'
-    ]
-    
-    challenge_cup_competitions = []
-    for comp_type in challenge_cup_types:
-        comp = Competition.query.filter(
-            Competition.competition_type == comp_type,
-            Competition.is_active == True,
-            Competition.year == selected_year
-        ).order_by(Competition.created_at.asc()).first()
-        if comp:
-            challenge_cup_competitions.append(comp)
-    
-    red_travel_comp = Competition.query.filter(
-        Competition.competition_type == '中国国际大学生创新大赛"青年红色筑梦之旅"赛道',
-        Competition.is_active == True,
-        Competition.year == selected_year
-    ).order_by(Competition.created_at.asc()).first()
-    
-    college_scores = {}
-    
-    for college in COLLEGES:
-        score_data = {
-            'college': college,
-            'red_travel_participation': 0,
-            'red_travel_award': 0,
-            'challenge_cup_participation': 0,
-            'challenge_cup_award': 0,
-            'total_score': 0,
-            'score_details': {
-                'red_travel_participation': {'score': 0, 'note': ''},
-                'red_travel_award': {'score': 0, 'note': ''},
-                'challenge_cup_participation': {'score': 0, 'note': ''},
-                'challenge_cup_award': {'score': 0, 'note': ''}
-            }
-        }
-        
-        red_travel_projects = []
-        if red_travel_comp:
-            projects = Project.query.filter(
-                Project.competition_id == red_travel_comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            red_travel_projects.extend(projects)
-        
-        score_data['red_travel_participation'] = len(red_travel_projects)
-        actual_count = len(red_travel_projects)
-        college_config = AssessmentConfig.query.filter_by(year=selected_year, college=college).first()
-        target_count = college_config.red_travel_requirement if college_config and college_config.red_travel_requirement else None
-        
-        # 优先使用保存的分数，否则使用计算值
-        if college_config and college_config.red_travel_participation_score is not None:
-            score_data['score_details']['red_travel_participation']['score'] = college_config.red_travel_participation_score
-        elif target_count is None or target_count == 0:
-            score_data['score_details']['red_travel_participation']['score'] = None
-            score_data['score_details']['red_travel_participation']['note'] = f'申报队伍数：{actual_count}（任务要求未设置）'
-        else:
-            calculated_score = min(2.0, (actual_count / target_count) * 2.0)
-            score_data['score_details']['red_travel_participation']['score'] = calculated_score
-            score_data['score_details']['red_travel_participation']['note'] = f'申报队伍数：{actual_count}，任务要求：{target_count}'
-        
-        max_red_travel_score = 0
-        for project in red_travel_projects:
-            awards = Award.query.filter_by(project_id=project.id).all()
-            for award in awards:
-                award_name = award.award_name
-                if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 1.0)
-                elif '银奖' in award_name or '二等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 0.6)
-                elif '铜奖' in award_name or '三等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 0.3)
-            
-            external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-            for ext_award in external_awards:
-                award_name = ext_award.award_name
-                if ext_award.award_level == '省赛':
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 3.0)
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 2.0)
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 1.0)
-                elif ext_award.award_level == '国赛':
-                    max_red_travel_score = max(max_red_travel_score, 3.0)
-        
-        score_data['red_travel_award'] = max_red_travel_score
-        # 优先使用保存的分数，否则使用计算值
-        if college_config and college_config.red_travel_award_score is not None:
-            score_data['score_details']['red_travel_award']['score'] = college_config.red_travel_award_score
-        else:
-            score_data['score_details']['red_travel_award']['score'] = min(3.0, max_red_travel_score)
-        if max_red_travel_score == 0:
-            score_data['score_details']['red_travel_award']['note'] = '无获奖'
-        else:
-            score_data['score_details']['red_travel_award']['note'] = f'最高奖项得分：{max_red_travel_score}分'
-        
-        challenge_cup_projects = []
-        for comp in challenge_cup_competitions:
-            projects = Project.query.filter(
-                Project.competition_id == comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            challenge_cup_projects.extend(projects)
-        
-        score_data['challenge_cup_participation'] = len(challenge_cup_projects)
-        actual_count = len(challenge_cup_projects)
-        target_count = college_config.challenge_cup_requirement if college_config and college_config.challenge_cup_requirement else None
-        
-        # 优先使用保存的分数，否则使用计算值
-        if college_config and college_config.challenge_cup_participation_score is not None:
-            score_data['score_details']['challenge_cup_participation']['score'] = college_config.challenge_cup_participation_score
-        elif target_count is None or target_count == 0:
-            score_data['score_details']['challenge_cup_participation']['score'] = None
-            score_data['score_details']['challenge_cup_participation']['note'] = f'报名数：{actual_count}（任务要求未设置）'
-        else:
-            calculated_score = min(2.0, (actual_count / target_count) * 2.0)
-            score_data['score_details']['challenge_cup_participation']['score'] = calculated_score
-            score_data['score_details']['challenge_cup_participation']['note'] = f'报名数：{actual_count}，任务要求：{target_count}'
-        
-        max_challenge_cup_score = 0
-        for project in challenge_cup_projects:
-            awards = Award.query.filter_by(project_id=project.id).all()
-            for award in awards:
-                award_name = award.award_name
-                if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 1.0)
-                elif '银奖' in award_name or '二等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 0.6)
-                elif '铜奖' in award_name or '三等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 0.3)
-            
-            external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-            for ext_award in external_awards:
-                award_name = ext_award.award_name
-                if ext_award.award_level == '省赛':
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 3.0)
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 2.0)
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 1.0)
-                elif ext_award.award_level == '国赛':
-                    max_challenge_cup_score = max(max_challenge_cup_score, 3.0)
-        
-        score_data['challenge_cup_award'] = max_challenge_cup_score
-        # 优先使用保存的分数，否则使用计算值
-        if college_config and college_config.challenge_cup_award_score is not None:
-            score_data['score_details']['challenge_cup_award']['score'] = college_config.challenge_cup_award_score
-        else:
-            score_data['score_details']['challenge_cup_award']['score'] = min(3.0, max_challenge_cup_score)
-        if max_challenge_cup_score == 0:
-            score_data['score_details']['challenge_cup_award']['note'] = '无获奖'
-        else:
-            score_data['score_details']['challenge_cup_award']['note'] = f'最高奖项得分：{max_challenge_cup_score}分'
-        
-        total_score = 0
-        if score_data['score_details']['red_travel_participation']['score'] is not None:
-            total_score += score_data['score_details']['red_travel_participation']['score']
-        total_score += score_data['score_details']['red_travel_award']['score']
-        if score_data['score_details']['challenge_cup_participation']['score'] is not None:
-            total_score += score_data['score_details']['challenge_cup_participation']['score']
-        total_score += score_data['score_details']['challenge_cup_award']['score']
-        score_data['total_score'] = total_score
-        
-        college_scores[college] = score_data
+    # 优先使用保存的分数，否则使用计算值
+    college_scores = build_college_scores(selected_year, use_saved_scores=True)
     
     return render_template('school_admin/assessment_score_aggrid.html', 
                          colleges=COLLEGES,
                          college_scores=college_scores,
                          selected_year=selected_year,
-                         available_years=available_years)
+                         available_years=get_available_years())
 
 @school_admin_bp.route('/assessment/config/save', methods=['POST'])
 @login_required
@@ -2514,339 +1878,44 @@ def save_assessment_score():
         traceback.print_exc()
         return jsonify({'success': False, 'message': '保存失败: ' + str(e)}), 500
 
+@school_admin_bp.route('/assessment/rebuild', methods=['POST'])
+@login_required
+@school_admin_required
+def rebuild_assessment():
+    """重建年度考核统计快照（一致性校验）"""
+    from datetime import datetime
+    from utils.assessment import rebuild_assessment_year
+    
+    selected_year = request.form.get('year', type=int)
+    if not selected_year:
+        selected_year = datetime.now().year
+    
+    try:
+        changed_count = rebuild_assessment_year(selected_year)
+    except Exception as e:
+        db.session.rollback()
+        flash(f'重建统计快照失败：{str(e)}', 'error')
+        return redirect(url_for('school_admin.assessment', year=selected_year))
+    
+    if changed_count:
+        flash(f'{selected_year}年度统计快照已重建，修正了 {changed_count} 个学院的数据', 'success')
+    else:
+        flash(f'{selected_year}年度统计快照已重建，数据一致', 'success')
+    return redirect(url_for('school_admin.assessment', year=selected_year))
+
 @school_admin_bp.route('/assessment/export')
 @login_required
 @school_admin_required
 def export_assessment():
     """导出考核数据到Excel（2个sheet：情况统计、算分）"""
     from datetime import datetime
-    from io import BytesIO
-    import pandas as pd
-    from models import COLLEGES
+    from utils.assessment import build_assessment_workbook
     
     selected_year = request.args.get('year', type=int)
     if not selected_year:
         selected_year = datetime.now().year
     
-    # 挑战杯系列赛事类型
-    challenge_cup_types = [
-        '"挑战杯"全国大学生课外学术科技作品竞赛',
-        '"挑战杯"中国大学生创业计划大赛'
-    ]
-    
-    # 获取指定年度的挑战杯系列竞赛（同一类型只取先创建的）
-    challenge_cup_competitions = []
-    for comp_type in challenge_cup_types:
-        comp = Competition.query.filter(
-            Competition.competition_type == comp_type,
-            Competition.is_active == True,
-            Competition.year == selected_year
-        ).order_by(Competition.created_at.asc()).first()
-        if comp:
-            challenge_cup_competitions.append(comp)
-    
-    # 获取红旅竞赛（只取先创建的）
-    red_travel_comp = Competition.query.filter(
-        Competition.competition_type == '中国国际大学生创新大赛"青年红色筑梦之旅"赛道',
-        Competition.is_active == True,
-        Competition.year == selected_year
-    ).order_by(Competition.created_at.asc()).first()
-    
-    # Sheet 1: 情况统计
-    data_stats = []
-    for college in COLLEGES:
-        # 统计挑战杯数据
-        challenge_cup_count = 0
-        challenge_cup_school_gold = 0
-        challenge_cup_school_silver = 0
-        challenge_cup_school_bronze = 0
-        challenge_cup_provincial_gold = 0
-        challenge_cup_provincial_silver = 0
-        challenge_cup_provincial_bronze = 0
-        challenge_cup_national_gold = 0
-        challenge_cup_national_silver = 0
-        challenge_cup_national_bronze = 0
-        
-        for comp in challenge_cup_competitions:
-            projects = Project.query.filter(
-                Project.competition_id == comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            challenge_cup_count += len(projects)
-            
-            for project in projects:
-                awards = Award.query.filter_by(project_id=project.id).all()
-                for award in awards:
-                    award_name = award.award_name
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        challenge_cup_school_gold += 1
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        challenge_cup_school_silver += 1
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        challenge_cup_school_bronze += 1
-                
-                external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-                for ext_award in external_awards:
-                    award_name = ext_award.award_name
-                    if ext_award.award_level == '省赛':
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            challenge_cup_provincial_gold += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            challenge_cup_provincial_silver += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            challenge_cup_provincial_bronze += 1
-                    elif ext_award.award_level == '国赛':
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            challenge_cup_national_gold += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            challenge_cup_national_silver += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            challenge_cup_national_bronze += 1
-        
-        # 统计红旅数据
-        red_travel_count = 0
-        red_travel_school_gold = 0
-        red_travel_school_silver = 0
-        red_travel_school_bronze = 0
-        red_travel_provincial_gold = 0
-        red_travel_provincial_silver = 0
-        red_travel_provincial_bronze = 0
-        red_travel_national_gold = 0
-        red_travel_national_silver = 0
-        red_travel_national_bronze = 0
-        red_travel_total = 0
-        
-        if red_travel_comp:
-            projects = Project.query.filter(
-                Project.competition_id == red_travel_comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            red_travel_count = len(projects)
-            
-            for project in projects:
-                awards = Award.query.filter_by(project_id=project.id).all()
-                for award in awards:
-                    award_name = award.award_name
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        red_travel_school_gold += 1
-                        red_travel_total += 1
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        red_travel_school_silver += 1
-                        red_travel_total += 1
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        red_travel_school_bronze += 1
-                        red_travel_total += 1
-                
-                external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-                for ext_award in external_awards:
-                    award_name = ext_award.award_name
-                    if ext_award.award_level == '省赛':
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            red_travel_provincial_gold += 1
-                            red_travel_total += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            red_travel_provincial_silver += 1
-                            red_travel_total += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            red_travel_provincial_bronze += 1
-                            red_travel_total += 1
-                    elif ext_award.award_level == '国赛':
-                        if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                            red_travel_national_gold += 1
-                            red_travel_total += 1
-                        elif '银奖' in award_name or '二等奖' in award_name:
-                            red_travel_national_silver += 1
-                            red_travel_total += 1
-                        elif '铜奖' in award_name or '三等奖' in award_name:
-                            red_travel_national_bronze += 1
-                            red_travel_total += 1
-        
-        # 获取配置数据（按学院）
-        college_config = AssessmentConfig.query.filter_by(year=selected_year, college=college).first()
-        challenge_cup_requirement = college_config.challenge_cup_requirement if college_config else None
-        challenge_cup_special_notes = college_config.challenge_cup_special_notes if college_config else ''
-        red_travel_requirement = college_config.red_travel_requirement if college_config else None
-        red_travel_special_notes = college_config.red_travel_special_notes if college_config else ''
-        
-        # 计算挑战杯获奖总数
-        challenge_cup_total = challenge_cup_school_gold + challenge_cup_school_silver + challenge_cup_school_bronze + \
-                              challenge_cup_provincial_gold + challenge_cup_provincial_silver + challenge_cup_provincial_bronze + \
-                              challenge_cup_national_gold + challenge_cup_national_silver + challenge_cup_national_bronze
-        
-        # 配套活动数据（从challenge_cup_activities字段解析JSON，如果存在）
-        import json
-        activities_registration = 0
-        activities_national_gold = 0
-        activities_national_silver = 0
-        activities_national_bronze = 0
-        if college_config and college_config.challenge_cup_activities:
-            try:
-                activities_data = json.loads(college_config.challenge_cup_activities)
-                activities_registration = activities_data.get('registration_count', 0)
-                national_awards = activities_data.get('national_awards', {})
-                activities_national_gold = national_awards.get('gold', 0)
-                activities_national_silver = national_awards.get('silver', 0)
-                activities_national_bronze = national_awards.get('bronze', 0)
-            except (json.JSONDecodeError, TypeError, AttributeError):
-                # 如果不是JSON格式，忽略
-                pass
-        
-        data_stats.append({
-            '序号': len(data_stats) + 1,
-            '学院': college,
-            # 挑战杯主赛道
-            '挑战杯任务要求': challenge_cup_requirement if challenge_cup_requirement else '',
-            '挑战杯报名数': challenge_cup_count,
-            '挑战杯校赛金奖': challenge_cup_school_gold,
-            '挑战杯校赛银奖': challenge_cup_school_silver,
-            '挑战杯校赛铜奖': challenge_cup_school_bronze,
-            '挑战杯省赛金奖': challenge_cup_provincial_gold,
-            '挑战杯省赛银奖': challenge_cup_provincial_silver,
-            '挑战杯省赛铜奖': challenge_cup_provincial_bronze,
-            '挑战杯国赛金奖': challenge_cup_national_gold,
-            '挑战杯国赛银奖': challenge_cup_national_silver,
-            '挑战杯国赛铜奖': challenge_cup_national_bronze,
-            '挑战杯获奖总数': challenge_cup_total,
-            '挑战杯特殊情况备注': challenge_cup_special_notes,
-            # 配套活动
-            '配套活动报名数': activities_registration,
-            '配套活动国赛金奖': activities_national_gold,
-            '配套活动国赛银奖': activities_national_silver,
-            '配套活动国赛铜奖': activities_national_bronze,
-            # 红旅赛道
-            '红旅任务要求': red_travel_requirement if red_travel_requirement else '',
-            '红旅报名数': red_travel_count,
-            '红旅校赛金奖': red_travel_school_gold,
-            '红旅校赛银奖': red_travel_school_silver,
-            '红旅校赛铜奖': red_travel_school_bronze,
-            '红旅省赛金奖': red_travel_provincial_gold,
-            '红旅省赛银奖': red_travel_provincial_silver,
-            '红旅省赛铜奖': red_travel_provincial_bronze,
-            '红旅国赛金奖': red_travel_national_gold,
-            '红旅国赛银奖': red_travel_national_silver,
-            '红旅国赛铜奖': red_travel_national_bronze,
-            '红旅获奖总数': red_travel_total,
-            '红旅特殊情况备注': red_travel_special_notes,
-        })
-    
-    # Sheet 2: 算分（复用assessment_score的逻辑）
-    score_stats = []
-    for college in COLLEGES:
-        # 重新计算分数（简化版，复用assessment_score的逻辑）
-        red_travel_projects = []
-        if red_travel_comp:
-            projects = Project.query.filter(
-                Project.competition_id == red_travel_comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            red_travel_projects.extend(projects)
-        
-        challenge_cup_projects = []
-        for comp in challenge_cup_competitions:
-            projects = Project.query.filter(
-                Project.competition_id == comp.id,
-                Project.push_college == college,
-                Project.status == ReviewStatus.FINAL_APPROVED
-            ).all()
-            challenge_cup_projects.extend(projects)
-        
-        # 计算参与分数（按学院获取任务要求）
-        college_config = AssessmentConfig.query.filter_by(year=selected_year, college=college).first()
-        red_travel_actual = len(red_travel_projects)
-        red_travel_target = college_config.red_travel_requirement if college_config and college_config.red_travel_requirement else None
-        red_travel_participation_score = None if red_travel_target is None or red_travel_target == 0 else min(2.0, (red_travel_actual / red_travel_target) * 2.0)
-        
-        challenge_cup_actual = len(challenge_cup_projects)
-        challenge_cup_target = college_config.challenge_cup_requirement if college_config and college_config.challenge_cup_requirement else None
-        challenge_cup_participation_score = None if challenge_cup_target is None or challenge_cup_target == 0 else min(2.0, (challenge_cup_actual / challenge_cup_target) * 2.0)
-        
-        # 计算获奖分数（简化版，只计算最高奖项）
-        max_red_travel_score = 0
-        for project in red_travel_projects:
-            awards = Award.query.filter_by(project_id=project.id).all()
-            for award in awards:
-                award_name = award.award_name
-                if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 1.0)
-                elif '银奖' in award_name or '二等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 0.6)
-                elif '铜奖' in award_name or '三等奖' in award_name:
-                    max_red_travel_score = max(max_red_travel_score, 0.3)
-            
-            external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-            for ext_award in external_awards:
-                award_name = ext_award.award_name
-                if ext_award.award_level == '省赛':
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 3.0)
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 2.0)
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        max_red_travel_score = max(max_red_travel_score, 1.0)
-                elif ext_award.award_level == '国赛':
-                    max_red_travel_score = max(max_red_travel_score, 3.0)
-        
-        max_challenge_cup_score = 0
-        for project in challenge_cup_projects:
-            awards = Award.query.filter_by(project_id=project.id).all()
-            for award in awards:
-                award_name = award.award_name
-                if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 1.0)
-                elif '银奖' in award_name or '二等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 0.6)
-                elif '铜奖' in award_name or '三等奖' in award_name:
-                    max_challenge_cup_score = max(max_challenge_cup_score, 0.3)
-            
-            external_awards = ExternalAward.query.filter_by(project_id=project.id).all()
-            for ext_award in external_awards:
-                award_name = ext_award.award_name
-                if ext_award.award_level == '省赛':
-                    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 3.0)
-                    elif '银奖' in award_name or '二等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 2.0)
-                    elif '铜奖' in award_name or '三等奖' in award_name:
-                        max_challenge_cup_score = max(max_challenge_cup_score, 1.0)
-                elif ext_award.award_level == '国赛':
-                    max_challenge_cup_score = max(max_challenge_cup_score, 3.0)
-        
-        red_travel_award_score = min(3.0, max_red_travel_score)
-        challenge_cup_award_score = min(3.0, max_challenge_cup_score)
-        
-        total_score = 0
-        if red_travel_participation_score is not None:
-            total_score += red_travel_participation_score
-        total_score += red_travel_award_score
-        if challenge_cup_participation_score is not None:
-            total_score += challenge_cup_participation_score
-        total_score += challenge_cup_award_score
-        
-        score_stats.append({
-            '序号': len(score_stats) + 1,
-            '学院': college,
-            '红旅参与得分': red_travel_participation_score if red_travel_participation_score is not None else '',
-            '红旅获奖得分': red_travel_award_score,
-            '挑战杯参与得分': challenge_cup_participation_score if challenge_cup_participation_score is not None else '',
-            '挑战杯获奖得分': challenge_cup_award_score,
-            '总分': total_score,
-        })
-    
-    # 创建Excel文件
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        if data_stats:
-            df_data = pd.DataFrame(data_stats)
-            df_data.to_excel(writer, index=False, sheet_name='情况统计')
-        
-        if score_stats:
-            df_score = pd.DataFrame(score_stats)
-            df_score.to_excel(writer, index=False, sheet_name='算分')
-    
-    output.seek(0)
+    output = build_assessment_workbook(selected_year)
     
     filename = f'考核数据_{selected_year}年度.xlsx'
     return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -1,18 +1,19 @@
 """
 学生端路由
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, session, abort
 from flask_login import login_required, current_user
 from models import db, User, Team, Project, Competition, Track, ProjectTrack, ProjectMember, ReviewStatus, TeamMember, UserRole, Score, ProjectAttachment, Award, ExternalAward
 from forms import ProjectForm, ExternalAwardForm
 from utils.decorators import student_required
-from utils.file_handler import save_uploaded_file, allowed_file
+from utils.file_handler import save_uploaded_file, allowed_file, send_protected_file
+from utils.certificate import certificate_mimetype, ensure_certificate
+from utils.blob_store import get_or_create_blob
 from utils.timezone import beijing_now
 from config import Config
 from pathlib import Path
 from datetime import datetime
 import os
-import random
 
 student_bp = Blueprint('student', __name__)
 
@@ -217,18 +218,31 @@ def expert_suggestions():
     # 去重
     projects = list(set(projects))
     
-    # 为每个项目获取专家评分和建议
+    # 一次性获取所有已评分项目的专家建议（未评分的项目不查询）
+    scored_project_ids = [project.id for project in projects if project.score_count]
+    suggestions_by_project = {}
+    if scored_project_ids:
+        comments = db.session.query(Score.project_id, Score.comment).filter(
+            Score.project_id.in_(scored_project_ids),
+            Score.comment.isnot(None),
+            Score.comment != ''
+        ).order_by(Score.id.asc()).all()
+        for project_id, comment in comments:
+            suggestions_by_project.setdefault(project_id, []).append(comment)
+    
+    # 为每个项目汇总专家评分和建议
     projects_with_suggestions = []
     for project in projects:
-        scores = Score.query.filter_by(project_id=project.id).all()
-        suggestions = [s.comment for s in scores if s.comment]
-        if scores or suggestions:
-            projects_with_suggestions.append({
-                'project': project,
-                'scores': scores,
-                'suggestions': suggestions,
-                'has_suggestions': len(suggestions) > 0
-            })
+        if not project.score_count:
+            continue
+        suggestions = suggestions_by_project.get(project.id, [])
+        projects_with_suggestions.append({
+            'project': project,
+            'score_count': project.score_count,
+            'avg_score': project.score_avg,
+            'suggestions': suggestions,
+            'has_suggestions': len(suggestions) > 0
+        })
     
     # 按创建时间倒序排序
     projects_with_suggestions.sort(key=lambda x: x['project'].created_at, reverse=True)
@@ -681,7 +695,7 @@ def create_project_info(project_id=None):
                 files = request.files.getlist('attachments')
                 for file in files:
                     if file and file.filename and allowed_file(file.filename):
-                        file_info = save_uploaded_file(file, subfolder=f'project_{project.id}')
+                        file_info = save_uploaded_file(file, extract_text=True, content_addressed=True)
                         if file_info:
                             attachment = ProjectAttachment(
                                 project_id=project.id,
@@ -689,7 +703,9 @@ def create_project_info(project_id=None):
                                 original_filename=file_info['original_filename'],
                                 file_path=file_info['file_path'],
                                 file_size=file_info['file_size'],
-                                file_type=file_info['file_type']
+                                file_type=file_info['file_type'],
+                                content_hash=file_info['content_hash'],
+                                blob=get_or_create_blob(file_info['content_hash'], file_info['file_path'], file_info['file_size'])
                             )
                             db.session.add(attachment)
             
@@ -1039,35 +1055,16 @@ def draw_defense_order(project_id):
             flash('答辩顺序抽取时间已过，请联系管理员', 'error')
             return redirect(url_for('student.view_project', project_id=project_id))
     
-    # 获取该竞赛所有进入决赛的项目
-    all_final_projects = Project.query.filter(
-        Project.competition_id == project.competition_id,
-        Project.is_final == True
-    ).all()
-    
-    # 获取已抽取的顺序
-    taken_orders = set()
-    for p in all_final_projects:
-        if p.defense_order:
-            taken_orders.add(p.defense_order)
+    # 领取预先随机排列的抽签号（条件 UPDATE，并发抽取不会得到相同顺序）
+    from utils.defense_order import claim_defense_order
+    selected_order = claim_defense_order(project)
     
-    # 获取可用的顺序列表
-    total_count = len(all_final_projects)
-    available_orders = [i for i in range(1, total_count + 1) if i not in taken_orders]
-    
-    if not available_orders:
+    if selected_order is None:
         if request.is_json or request.headers.get('Content-Type') == 'application/json':
             return jsonify({'success': False, 'message': '所有答辩顺序已被抽取'}), 400
         flash('所有答辩顺序已被抽取', 'error')
         return redirect(url_for('student.view_project', project_id=project_id))
     
-    # 随机抽取一个顺序
-    selected_order = random.choice(available_orders)
-    
-    # 保存结果
-    project.defense_order = selected_order
-    db.session.commit()
-    
     # 如果是 JSON 请求，返回 JSON 响应
     if request.is_json or request.headers.get('Content-Type') == 'application/json':
         return jsonify({
@@ -1084,7 +1081,7 @@ def draw_defense_order(project_id):
 @student_required
 def view_certificate(project_id, award_id):
     """查看项目证书（在线预览）"""
-    from flask import send_from_directory, abort, send_file
+    from flask import abort
     import os
     
     project = Project.query.get_or_404(project_id)
@@ -1097,9 +1094,10 @@ def view_certificate(project_id, award_id):
     if not is_team_member and not is_project_member:
         abort(403)
     
-    # 检查证书是否存在
-    if not award.certificate_path:
+    # 证书在首次查看或下载时生成，奖项名称、队伍名等变化后重新生成
+    if award.project_id != project.id:
         abort(404)
+    ensure_certificate(award)
     
     # 构建证书文件路径
     cert_folder = str(Config.CERTIFICATE_FOLDER)
@@ -1114,10 +1112,12 @@ def view_certificate(project_id, award_id):
     if not os.path.exists(cert_path):
         abort(404)
     
-    # 直接使用send_file发送文件，避免路径问题
-    return send_file(
-        cert_path,
-        mimetype='image/png',
+    relative_path = os.path.relpath(cert_path, cert_folder).replace('\\', '/')
+    return send_protected_file(
+        cert_folder,
+        relative_path,
+        Config.CERTIFICATES_INTERNAL_LOCATION,
+        mimetype=certificate_mimetype(award.certificate_path),
         as_attachment=False
     )
 
@@ -1126,7 +1126,7 @@ def view_certificate(project_id, award_id):
 @student_required
 def download_certificate(project_id, award_id):
     """下载项目证书（文件名：项目名+奖项名）"""
-    from flask import send_from_directory, abort
+    from flask import abort
     import os
     
     project = Project.query.get_or_404(project_id)
@@ -1140,10 +1140,10 @@ def download_certificate(project_id, award_id):
         flash('您没有权限下载此证书', 'error')
         abort(403)
     
-    # 检查证书是否存在
-    if not award.certificate_path:
-        flash('证书文件不存在', 'error')
+    # 证书在首次查看或下载时生成，奖项名称、队伍名等变化后重新生成
+    if award.project_id != project.id:
         abort(404)
+    ensure_certificate(award)
     
     # 构建证书文件路径
     cert_folder = str(Config.CERTIFICATE_FOLDER)
@@ -1161,21 +1161,106 @@ def download_certificate(project_id, award_id):
     # 生成下载文件名：项目名+奖项名
     safe_project_name = "".join(c for c in project.title if c.isalnum() or c in (' ', '-', '_', '，', '。', '、')).strip()
     safe_award_name = "".join(c for c in award.award_name if c.isalnum() or c in (' ', '-', '_', '，', '。', '、')).strip()
-    download_filename = f"{safe_project_name}+{safe_award_name}.png"
+    extension = os.path.splitext(award.certificate_path)[1] or '.png'
+    download_filename = f"{safe_project_name}+{safe_award_name}{extension}"
     download_filename = download_filename.replace(' ', '_')
     
-    # send_from_directory需要相对于cert_folder的路径
+    # send_protected_file需要相对于cert_folder的路径
     relative_path = os.path.relpath(cert_path, cert_folder)
     relative_path = relative_path.replace('\\', '/')
     
-    return send_from_directory(
+    return send_protected_file(
         cert_folder,
         relative_path,
+        Config.CERTIFICATES_INTERNAL_LOCATION,
         as_attachment=True,
         download_name=download_filename,
-        mimetype='image/png'
+        mimetype=certificate_mimetype(award.certificate_path)
     )
 
+def _get_leader_upload(project_id, upload_id):
+    """获取当前队长在该项目下的分片上传会话（不存在或不属于当前用户时返回404）"""
+    from models import UploadSession
+    upload = UploadSession.query.get_or_404(upload_id)
+    if upload.project_id != project_id or upload.user_id != current_user.id:
+        abort(404)
+    return upload
+
+@student_bp.route('/project/<int:project_id>/uploads', methods=['POST'])
+@login_required
+@student_required
+def create_chunked_upload(project_id):
+    """创建分片上传会话（JSON：filename、size、sha256可选），返回会话ID、分片大小和起始位置"""
+    from utils.chunked_upload import create_upload_session, upload_session_info, ChunkedUploadError
+    project = Project.query.get_or_404(project_id)
+    
+    # 检查权限：只有队长可以上传附件
+    if project.team.leader_id != current_user.id:
+        return jsonify({'success': False, 'message': '只有队长可以上传附件'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = create_upload_session(project, current_user, data.get('filename'), data.get('size'), data.get('sha256'))
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
+    return jsonify({'success': True, **upload_session_info(upload)}), 201
+
+@student_bp.route('/project/<int:project_id>/uploads/<int:upload_id>', methods=['GET'])
+@login_required
+@student_required
+def chunked_upload_status(project_id, upload_id):
+    """查询分片上传会话状态（断线重连后从返回的 offset 继续上传）"""
+    from utils.chunked_upload import upload_session_info
+    upload = _get_leader_upload(project_id, upload_id)
+    return jsonify({'success': True, **upload_session_info(upload)})
+
+@student_bp.route('/project/<int:project_id>/uploads/<int:upload_id>', methods=['PUT'])
+@login_required
+@student_required
+def upload_chunk(project_id, upload_id):
+    """上传一个分片：请求体为分片数据，查询参数 offset 为分片起始位置，可选请求头 X-Chunk-SHA256 为分片哈希"""
+    from utils.chunked_upload import write_chunk, ChunkedUploadError
+    upload = _get_leader_upload(project_id, upload_id)
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None or request.content_length is None:
+        return jsonify({'success': False, 'message': '缺少分片位置或长度', 'offset': upload.received_size}), 400
+    try:
+        received = write_chunk(upload, offset, request.stream, request.content_length,
+                               request.headers.get('X-Chunk-SHA256'))
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'message': e.message, 'offset': e.offset}), e.status
+    return jsonify({'success': True, 'offset': received, 'total_size': upload.total_size})
+
+@student_bp.route('/project/<int:project_id>/uploads/<int:upload_id>/complete', methods=['POST'])
+@login_required
+@student_required
+def complete_chunked_upload(project_id, upload_id):
+    """完成分片上传：校验文件并生成项目附件"""
+    from utils.chunked_upload import complete_upload, ChunkedUploadError
+    upload = _get_leader_upload(project_id, upload_id)
+    try:
+        attachment = complete_upload(upload)
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'message': e.message, 'offset': e.offset}), e.status
+    return jsonify({
+        'success': True,
+        'attachment_id': attachment.id,
+        'original_filename': attachment.original_filename,
+        'file_size': attachment.file_size
+    })
+
+@student_bp.route('/project/<int:project_id>/uploads/<int:upload_id>', methods=['DELETE'])
+@login_required
+@student_required
+def cancel_chunked_upload(project_id, upload_id):
+    """取消分片上传，删除已接收的数据"""
+    from utils.chunked_upload import cancel_upload
+    upload = _get_leader_upload(project_id, upload_id)
+    cancel_upload(upload)
+    db.session.commit()
+    return jsonify({'success': True})
+
 @student_bp.route('/project/<int:project_id>/delete_attachment', methods=['POST'])
 @login_required
 @student_required
@@ -1198,13 +1283,19 @@ def delete_attachment(project_id):
     if attachment.project_id != project.id:
         return jsonify({'success': False, 'message': '附件不属于该项目'}), 403
     
-    # 删除文件
-    file_path = Path(Config.UPLOAD_FOLDER) / attachment.file_path
-    if file_path.exists():
-        try:
-            file_path.unlink()
-        except Exception as e:
-            return jsonify({'success': False, 'message': f'删除文件失败: {str(e)}'}), 500
+    # 内容寻址存储中的文件可能被其他附件共用，由引用计数在最后一个引用删除后回收（见 utils.blob_store）
+    if not attachment.blob_id:
+        # 删除文件
+        file_path = Path(Config.UPLOAD_FOLDER) / attachment.file_path
+        if file_path.exists():
+            try:
+                file_path.unlink()
+            except Exception as e:
+                return jsonify({'success': False, 'message': f'删除文件失败: {str(e)}'}), 500
+        
+        # 删除提取的文本
+        from utils.text_extraction import delete_attachment_text
+        delete_attachment_text(attachment.file_path)
     
     # 删除数据库记录
     db.session.delete(attachment)
@@ -1,18 +1,34 @@
 """
 AI脱敏识别工具
 使用千问API识别附件中的敏感信息
-使用Qwen-VL识别图片，使用Qwen-Plus识别文本
+使用Qwen-VL识别图片；PDF、Word文本在本地匹配关键词，可选用Qwen-Plus复核
 """
 import os
+import json
+import time
+import hashlib
+import threading
 import base64
 import requests
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+from requests.adapters import HTTPAdapter
 from config import Config
+from utils.timezone import beijing_now
+from utils.keyword_matcher import get_keyword_matcher
+from utils.text_extraction import extract_pdf_segments, extract_docx_segments
+from utils.file_handler import get_content_hash
+
+# 提示词或结果解析方式变化时递增，使已缓存的识别结果失效
+PROMPT_VERSION = 2
 
 
 class SensitiveDetector:
     """敏感信息检测器"""
     
+    TEXT_MODEL = 'qwen-plus'  # 文本识别模型
+    VL_MODEL = 'qwen-vl-max'  # 图片识别模型
+    
     def __init__(self, api_key: str = None, api_base_url: str = None, vl_api_base_url: str = None):
         """
         初始化检测器
@@ -26,6 +42,60 @@ class SensitiveDetector:
         self.api_base_url = api_base_url or os.environ.get('QWEN_API_BASE_URL') or getattr(Config, 'QWEN_API_BASE_URL', 'https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation')
         self.vl_api_base_url = vl_api_base_url or os.environ.get('QWEN_VL_API_BASE_URL') or getattr(Config, 'QWEN_VL_API_BASE_URL', 'https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation')
         self.sensitive_keywords = getattr(Config, 'SENSITIVE_KEYWORDS', ['西南交通大学'])
+        self.text_remote_check = getattr(Config, 'SENSITIVE_TEXT_REMOTE_CHECK', False)
+        self.max_workers = max(1, getattr(Config, 'SENSITIVE_DETECTION_WORKERS', 4))
+        self.total_timeout = getattr(Config, 'SENSITIVE_TOTAL_TIMEOUT', 90)
+        self.request_timeout = min(getattr(Config, 'SENSITIVE_REQUEST_TIMEOUT', 30), self.total_timeout)
+        # 所有请求共用一个会话，复用与API服务器的连接；连接池大小与并发数一致
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # 批量检测时每个工作线程记录各自的截止时间（time.monotonic()），单个请求的超时不会超过它
+        self._local = threading.local()
+    
+    def close(self):
+        """关闭共享的HTTP会话"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _post(self, url: str, headers: Dict, payload: Dict) -> requests.Response:
+        """通过共享会话调用API，超时取单次请求超时与批量截止时间剩余时间的较小值"""
+        timeout = self.request_timeout
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('已超过批量检测的总时限')
+            timeout = min(timeout, remaining)
+        response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response
+    
+    def _detect_before(self, deadline: float, file_path: str, file_type: str,
+                       segments: Optional[List[Tuple[str, str]]] = None) -> Dict:
+        """在截止时间约束下检测单个附件（于工作线程中执行）"""
+        if time.monotonic() >= deadline:
+            return self._timeout_result()
+        self._local.deadline = deadline
+        try:
+            return self._detect_file(file_path, file_type, segments)
+        finally:
+            self._local.deadline = None
+    
+    def _timeout_result(self) -> Dict:
+        """批量检测超过总时限时的结果"""
+        return {
+            'has_sensitive': False,
+            'detected_keywords': [],
+            'details': f'识别超时：超过{self.total_timeout}秒仍未完成，请稍后重试或手动检查。',
+            'error': '识别超时'
+        }
     
     def encode_image(self, image_path: str) -> str:
         """将图片编码为base64"""
@@ -90,7 +160,7 @@ class SensitiveDetector:
                 mime_type = 'image/webp'
             
             payload = {
-                "model": "qwen-vl-max",  # 使用Qwen-VL视觉模型
+                "model": self.VL_MODEL,  # 使用Qwen-VL视觉模型
                 "input": {
                     "messages": [
                         {
@@ -111,8 +181,7 @@ class SensitiveDetector:
                 }
             }
             
-            response = requests.post(self.vl_api_base_url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
+            response = self._post(self.vl_api_base_url, headers, payload)
             
             result = response.json()
             
@@ -206,13 +275,14 @@ class SensitiveDetector:
                 'error': str(e)
             }
     
-    def detect_pdf(self, file_path: str) -> Dict:
+    def detect_pdf(self, file_path: str, segments: Optional[List[Tuple[str, str]]] = None) -> Dict:
         """
         检测PDF文件中的敏感信息
-        使用PyPDF2提取文本，然后使用Qwen-Plus进行识别
+        使用PyPDF2提取文本（已在上传后提取的直接使用），然后在本地匹配关键词（见 detect_text_segments）
         
         Args:
             file_path: PDF文件路径
+            segments: 已提取的逐页文本（为None时从文件提取）
             
         Returns:
             检测结果字典
@@ -220,17 +290,10 @@ class SensitiveDetector:
         try:
             # 尝试使用PyPDF2提取PDF文本
             try:
-                import PyPDF2
+                if segments is None:
+                    segments = extract_pdf_segments(file_path)
                 
-                text_content = ""
-                with open(file_path, 'rb') as pdf_file:
-                    pdf_reader = PyPDF2.PdfReader(pdf_file)
-                    for page_num, page in enumerate(pdf_reader.pages, 1):
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_content += f"\n--- 第{page_num}页 ---\n{page_text}\n"
-                
-                if not text_content.strip():
+                if not any(text.strip() for _, text in segments):
                     return {
                         'has_sensitive': False,
                         'detected_keywords': [],
@@ -238,8 +301,8 @@ class SensitiveDetector:
                         'error': '无法提取PDF文本内容'
                     }
                 
-                # 使用提取的文本内容进行识别
-                return self.detect_text_content(text_content)
+                # 使用提取的全部文本进行识别
+                return self.detect_text_segments(segments)
                 
             except ImportError:
                 return {
@@ -264,9 +327,47 @@ class SensitiveDetector:
                 'error': str(e)
             }
     
+    def detect_text_segments(self, segments: List[Tuple[str, str]]) -> Dict:
+        """
+        检测分段文本中的敏感信息：在本地用关键词自动机扫描全部文本（不截断），给出每个关键词的页/段/行位置。
+        SENSITIVE_TEXT_REMOTE_CHECK 开启时再调用Qwen-Plus复核，两者结果合并
+        
+        Args:
+            segments: (位置描述, 文本) 列表，见 extract_pdf_segments / extract_docx_segments
+            
+        Returns:
+            检测结果字典
+        """
+        found = get_keyword_matcher(self.sensitive_keywords).find(segments)
+        if found:
+            details = '\n'.join([
+                '检测结果：包含敏感信息',
+                f"发现的关键词：{'、'.join(found)}",
+                '详细位置：' + '；'.join(f"{keyword}：{'、'.join(locations)}" for keyword, locations in found.items())
+            ])
+        else:
+            details = '检测结果：未发现敏感信息'
+        result = {
+            'has_sensitive': bool(found),
+            'detected_keywords': list(found),
+            'details': details,
+            'error': None
+        }
+        
+        if self.text_remote_check:
+            remote = self.detect_text_content('\n'.join(f'--- {label} ---\n{text}' for label, text in segments))
+            if remote.get('error'):
+                # 复核失败不影响本地匹配结果
+                result['details'] += f"\n千问复核失败：{remote['error']}"
+            else:
+                result['has_sensitive'] = result['has_sensitive'] or remote['has_sensitive']
+                result['detected_keywords'] += [k for k in remote['detected_keywords'] if k not in found]
+                result['details'] += '\n千问复核：\n' + remote['details']
+        return result
+    
     def detect_text_content(self, text_content: str) -> Dict:
         """
-        检测文本内容中的敏感信息（使用Qwen-Plus）
+        检测文本内容中的敏感信息（使用Qwen-Plus，仅发送前8000个字符）
         
         Args:
             text_content: 文本内容
@@ -303,7 +404,7 @@ class SensitiveDetector:
             }
             
             payload = {
-                "model": "qwen-plus",
+                "model": self.TEXT_MODEL,
                 "input": {
                     "messages": [
                         {
@@ -317,8 +418,7 @@ class SensitiveDetector:
                 }
             }
             
-            response = requests.post(self.api_base_url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
+            response = self._post(self.api_base_url, headers, payload)
             
             result = response.json()
             
@@ -379,14 +479,15 @@ class SensitiveDetector:
                 'error': str(e)
             }
     
-    def detect_word(self, file_path: str, file_type: str) -> Dict:
+    def detect_word(self, file_path: str, file_type: str, segments: Optional[List[Tuple[str, str]]] = None) -> Dict:
         """
         检测Word文件中的敏感信息
-        使用python-docx提取DOCX文本，然后使用Qwen-Plus进行识别
+        使用python-docx提取DOCX文本（已在上传后提取的直接使用），然后在本地匹配关键词（见 detect_text_segments）
         
         Args:
             file_path: Word文件路径
             file_type: 文件类型（doc或docx）
+            segments: 已提取的逐段文本（为None时从文件提取）
             
         Returns:
             检测结果字典
@@ -397,19 +498,10 @@ class SensitiveDetector:
             if file_type_lower == 'docx':
                 # 使用python-docx解析docx文件
                 try:
-                    from docx import Document
+                    if segments is None:
+                        segments = extract_docx_segments(file_path)
                     
-                    doc = Document(file_path)
-                    text_content = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-                    
-                    # 也提取表格内容
-                    for table in doc.tables:
-                        for row in table.rows:
-                            row_text = ' '.join([cell.text for cell in row.cells])
-                            if row_text.strip():
-                                text_content += '\n' + row_text
-                    
-                    if not text_content.strip():
+                    if not any(text.strip() for _, text in segments):
                         return {
                             'has_sensitive': False,
                             'detected_keywords': [],
@@ -417,8 +509,8 @@ class SensitiveDetector:
                             'error': '无法提取文档文本'
                         }
                     
-                    # 使用提取的文本内容进行识别
-                    return self.detect_text_content(text_content)
+                    # 使用提取的全部文本进行识别
+                    return self.detect_text_segments(segments)
                     
                 except ImportError:
                     return {
@@ -460,17 +552,8 @@ class SensitiveDetector:
                 'error': str(e)
             }
     
-    def detect_attachment(self, file_path: str, file_type: str) -> Dict:
-        """
-        检测附件中的敏感信息（自动识别文件类型）
-        
-        Args:
-            file_path: 文件路径
-            file_type: 文件类型（pdf, jpg, png, doc, docx等）
-            
-        Returns:
-            检测结果字典
-        """
+    def _detect_file(self, file_path: str, file_type: str, segments: Optional[List[Tuple[str, str]]] = None) -> Dict:
+        """按文件类型调用对应的识别方法（不使用缓存；segments 为上传后已提取的文本）"""
         file_type_lower = file_type.lower()
         
         # 图片类型
@@ -478,10 +561,10 @@ class SensitiveDetector:
             return self.detect_image(file_path)
         # PDF文档
         elif file_type_lower == 'pdf':
-            return self.detect_pdf(file_path)
+            return self.detect_pdf(file_path, segments)
         # Word文档
         elif file_type_lower in ['doc', 'docx']:
-            return self.detect_word(file_path, file_type)
+            return self.detect_word(file_path, file_type, segments)
         else:
             return {
                 'has_sensitive': False,
@@ -489,4 +572,213 @@ class SensitiveDetector:
                 'details': f'不支持的文件类型：{file_type}，当前仅支持图片（JPG、PNG、GIF等）、PDF和Word文档（DOC、DOCX）',
                 'error': f'不支持的文件类型：{file_type}'
             }
-
+    
+    @property
+    def fingerprint(self) -> str:
+        """检测指纹：敏感关键词、模型或提示词版本任一变化时改变，对应的缓存结果随之失效"""
+        data = json.dumps({
+            'keywords': list(self.sensitive_keywords),
+            'text_remote_check': self.text_remote_check,
+            'text_model': self.TEXT_MODEL,
+            'vl_model': self.VL_MODEL,
+            'prompt_version': PROMPT_VERSION
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+    
+    def _hash_file(self, file_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+        """
+        文件内容哈希：优先使用附件上传时保存的 content_hash，没有时才读取文件计算（按修改时间和大小缓存）；
+        不在应用上下文中（无法访问数据库）或文件读取失败时返回None，即不使用缓存
+        """
+        from flask import has_app_context
+        if not has_app_context():
+            return None
+        if content_hash:
+            return content_hash
+        try:
+            return get_content_hash(file_path)
+        except OSError:
+            return None
+    
+    def _load_texts(self, attachments: List[Tuple[str, str]]) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        读取上传后已提取的附件文本，返回 {文件路径: 逐页文本}；从未提取过的PDF、DOCX补交提取任务，本次仍从文件提取
+        不在应用上下文中时返回空字典
+        """
+        from flask import has_app_context
+        from utils.text_extraction import (EXTRACTABLE_TYPES, load_text_segments, enqueue_missing_text_extractions,
+                                           relative_upload_path)
+        if not has_app_context():
+            return {}
+        
+        extractable = {file_path: (relative_upload_path(file_path), file_type) for file_path, file_type in attachments
+                       if (file_type or '').lower() in EXTRACTABLE_TYPES}
+        stored = load_text_segments(relative_path for relative_path, _ in extractable.values())
+        enqueue_missing_text_extractions(item for item in extractable.values() if item[0] not in stored)
+        return {file_path: stored[relative_path] for file_path, (relative_path, _) in extractable.items()
+                if relative_path in stored}
+    
+    def _load_cached(self, file_hashes: List[str]) -> Dict[str, Dict]:
+        """批量读取缓存的识别结果，返回 {文件哈希: 检测结果字典}"""
+        from models import SensitiveDetectionResult
+        if not file_hashes:
+            return {}
+        
+        records = SensitiveDetectionResult.query.filter(
+            SensitiveDetectionResult.fingerprint == self.fingerprint,
+            SensitiveDetectionResult.file_hash.in_(set(file_hashes))
+        ).all()
+        return {
+            record.file_hash: {
+                'has_sensitive': record.has_sensitive,
+                'detected_keywords': json.loads(record.detected_keywords or '[]'),
+                'details': record.details or '',
+                'error': None,
+                'cached': True,
+                'detected_at': record.created_at
+            }
+            for record in records
+        }
+    
+    def _save_cached(self, results: Dict[str, Dict]):
+        """保存识别成功的结果（识别异常的结果不缓存，下次重新识别），并提交"""
+        from models import db, SensitiveDetectionResult
+        from sqlalchemy.exc import IntegrityError
+        
+        fingerprint = self.fingerprint
+        saved = False
+        for file_hash, result in results.items():
+            if result.get('error'):
+                continue
+            values = {
+                'has_sensitive': bool(result.get('has_sensitive')),
+                'detected_keywords': json.dumps(result.get('detected_keywords', []), ensure_ascii=False),
+                'details': result.get('details', '')
+            }
+            record = SensitiveDetectionResult.query.filter_by(file_hash=file_hash, fingerprint=fingerprint).first()
+            if record:
+                # 强制重新识别时覆盖旧结果
+                for key, value in values.items():
+                    setattr(record, key, value)
+                record.created_at = beijing_now()
+            else:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(SensitiveDetectionResult(file_hash=file_hash, fingerprint=fingerprint, **values))
+                except IntegrityError:
+                    # 其他请求同时识别了同一文件，保留已有结果
+                    continue
+            saved = True
+        if saved:
+            db.session.commit()
+    
+    def detect_attachment(self, file_path: str, file_type: str, force_rescan: bool = False,
+                          content_hash: Optional[str] = None) -> Dict:
+        """
+        检测附件中的敏感信息（自动识别文件类型），文件内容和检测指纹未变化时直接返回缓存结果
+        
+        Args:
+            file_path: 文件路径
+            file_type: 文件类型（pdf, jpg, png, doc, docx等）
+            force_rescan: 是否忽略缓存重新识别
+            content_hash: 附件保存的文件内容哈希（ProjectAttachment.content_hash），为空时读取文件计算
+            
+        Returns:
+            检测结果字典（cached 表示是否来自缓存，detected_at 为缓存结果的识别时间）
+        """
+        file_hash = self._hash_file(file_path, content_hash)
+        if file_hash and not force_rescan:
+            cached = self._load_cached([file_hash])
+            if file_hash in cached:
+                return cached[file_hash]
+        
+        segments = self._load_texts([(file_path, file_type)]).get(file_path)
+        result = self._detect_file(file_path, file_type, segments)
+        if file_hash:
+            self._save_cached({file_hash: result})
+        result.setdefault('cached', False)
+        return result
+    
+    def iter_detect_attachments(self, attachments: Iterable[Tuple], force_rescan: bool = False) -> Iterator[Tuple[int, Dict]]:
+        """
+        并发检测多个附件，按完成先后逐个返回结果
+        
+        先批量查询缓存，命中的附件立即返回；其余附件读取上传后已提取的文本后并发识别，并发数由 SENSITIVE_DETECTION_WORKERS 限制；
+        单个API请求不超过 SENSITIVE_REQUEST_TIMEOUT 秒，全部检测不超过 SENSITIVE_TOTAL_TIMEOUT 秒，
+        到时仍未完成的附件返回超时结果。识别成功的结果在全部结束后写入缓存
+        
+        Args:
+            attachments: (文件路径, 文件类型) 或 (文件路径, 文件类型, 文件内容哈希) 列表；
+                有内容哈希（ProjectAttachment.content_hash）时直接用作缓存键，不再读取文件计算
+            force_rescan: 是否忽略缓存重新识别
+            
+        Yields:
+            (附件在列表中的下标, 检测结果字典)
+        """
+        attachments = list(attachments)
+        if not attachments:
+            return
+        # 总时限从请求开始计算（包含读取缓存和已提取文本的时间）
+        deadline = time.monotonic() + self.total_timeout
+        
+        file_hashes = [self._hash_file(item[0], item[2] if len(item) > 2 else None) for item in attachments]
+        attachments = [tuple(item[:2]) for item in attachments]
+        cached = {} if force_rescan else self._load_cached([h for h in file_hashes if h])
+        
+        pending = []
+        for index, file_hash in enumerate(file_hashes):
+            if file_hash in cached:
+                yield index, cached[file_hash]
+            else:
+                pending.append(index)
+        if not pending:
+            return
+        
+        texts = self._load_texts([attachments[index] for index in pending])
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                      thread_name_prefix='sensitive-detection')
+        futures = {
+            executor.submit(self._detect_before, deadline, *attachments[index], texts.get(attachments[index][0])): index
+            for index in pending
+        }
+        finished = set()
+        new_results = {}
+        try:
+            try:
+                for future in as_completed(futures, timeout=max(0, deadline - time.monotonic())):
+                    index = futures[future]
+                    finished.add(index)
+                    result = future.result()
+                    result.setdefault('cached', False)
+                    if file_hashes[index]:
+                        new_results[file_hashes[index]] = result
+                    yield index, result
+            except FuturesTimeoutError:
+                pass
+            
+            # 超过总时限：未开始的任务直接取消，进行中的请求会因截止时间而尽快结束
+            for future, index in futures.items():
+                if index not in finished:
+                    future.cancel()
+                    yield index, self._timeout_result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if new_results:
+                self._save_cached(new_results)
+    
+    def detect_attachments(self, attachments: Iterable[Tuple], force_rescan: bool = False) -> List[Dict]:
+        """
+        并发检测多个附件，结果顺序与传入顺序一致（超时的附件返回超时结果）
+        
+        Args:
+            attachments: (文件路径, 文件类型) 或 (文件路径, 文件类型, 文件内容哈希) 列表
+            force_rescan: 是否忽略缓存重新识别
+            
+        Returns:
+            检测结果字典列表
+        """
+        attachments = list(attachments)
+        results = [None] * len(attachments)
+        for index, result in self.iter_detect_attachments(attachments, force_rescan=force_rescan):
+            results[index] = result
+        return results
@@ -0,0 +1,673 @@
+"""
+考核统计工具
+按 学院 × 赛道 × 级别 × 奖项 一次性聚合年度考核数据，供考核相关页面和导出共用
+"""
+import json
+from io import BytesIO
+from sqlalchemy import func, event, inspect
+from models import (db, Project, Award, ExternalAward, Competition, AssessmentConfig, AssessmentSnapshot,
+                    ReviewStatus, COLLEGES)
+
+# 挑战杯系列赛事类型
+CHALLENGE_CUP_TYPES = [
+    '"挑战杯"全国大学生课外学术科技作品竞赛',
+    '"挑战杯"中国大学生创业计划大赛'
+]
+
+# 红旅赛道赛事类型
+RED_TRAVEL_TYPE = '中国国际大学生创新大赛"青年红色筑梦之旅"赛道'
+
+# 赛道标识
+TRACK_CHALLENGE_CUP = 'challenge_cup'
+TRACK_RED_TRAVEL = 'red_travel'
+
+# 奖项级别：校赛（Award表）、省赛/国赛（ExternalAward表）
+LEVEL_SCHOOL = 'school'
+LEVEL_PROVINCIAL = 'provincial'
+LEVEL_NATIONAL = 'national'
+
+EXTERNAL_LEVELS = {
+    '省赛': LEVEL_PROVINCIAL,
+    '国赛': LEVEL_NATIONAL,
+}
+
+MEDALS = ('gold', 'silver', 'bronze')
+
+# 获奖得分：校赛 金1/银0.6/铜0.3，省赛 金3/银2/铜1，国赛无论金银铜都加满（3分）
+AWARD_SCORES = {
+    LEVEL_SCHOOL: {'gold': 1.0, 'silver': 0.6, 'bronze': 0.3},
+    LEVEL_PROVINCIAL: {'gold': 3.0, 'silver': 2.0, 'bronze': 1.0},
+    LEVEL_NATIONAL: {'gold': 3.0, 'silver': 3.0, 'bronze': 3.0},
+}
+
+# 参与得分上限、获奖得分上限
+PARTICIPATION_SCORE_MAX = 2.0
+AWARD_SCORE_MAX = 3.0
+
+
+def normalize_medal(award_name):
+    """
+    将奖项名称统一识别为金奖/银奖/铜奖
+    兼容"一等奖/特等奖"→金奖，"二等奖"→银奖，"三等奖"→铜奖
+
+    Returns:
+        'gold' / 'silver' / 'bronze'，无法识别时返回 None
+    """
+    if not award_name:
+        return None
+    if '金奖' in award_name or '一等奖' in award_name or '特等奖' in award_name:
+        return 'gold'
+    if '银奖' in award_name or '二等奖' in award_name:
+        return 'silver'
+    if '铜奖' in award_name or '三等奖' in award_name:
+        return 'bronze'
+    return None
+
+
+def get_assessment_competitions(year):
+    """
+    获取指定年度参与考核的竞赛（同一类型只取先创建的）
+
+    Returns:
+        dict: 竞赛ID -> 赛道标识（challenge_cup / red_travel）
+    """
+    competitions = Competition.query.filter(
+        Competition.competition_type.in_(CHALLENGE_CUP_TYPES + [RED_TRAVEL_TYPE]),
+        Competition.is_active == True,
+        Competition.year == year
+    ).order_by(Competition.created_at.asc(), Competition.id.asc()).all()
+
+    track_by_competition = {}
+    seen_types = set()
+    for comp in competitions:
+        if comp.competition_type in seen_types:
+            continue
+        seen_types.add(comp.competition_type)
+        track = TRACK_RED_TRAVEL if comp.competition_type == RED_TRAVEL_TYPE else TRACK_CHALLENGE_CUP
+        track_by_competition[comp.id] = track
+    return track_by_competition
+
+
+def _empty_track_stats():
+    """初始化单个赛道的统计结构"""
+    return {
+        'registration_count': 0,  # 报名数
+        'school_awards': {medal: 0 for medal in MEDALS},  # 校级奖项
+        'provincial_awards': {medal: 0 for medal in MEDALS},  # 省级奖项
+        'national_awards': {medal: 0 for medal in MEDALS},  # 国家级奖项
+        'total_awards': 0,  # 获奖总数（仅统计可识别为金银铜的奖项）
+        'max_award_score': 0,  # 最高奖项得分
+    }
+
+
+def compute_assessment_matrix(year, colleges=None):
+    """
+    计算指定年度 学院 × 赛道 × 级别 × 奖项 的统计矩阵
+    报名数、校赛奖项、省赛/国赛奖项各一次分组查询，奖项名称按去重后的名称识别一次
+
+    Args:
+        year: 年度
+        colleges: 只统计这些学院（默认全部学院）
+
+    Returns:
+        dict: 学院 -> {'challenge_cup': {...}, 'red_travel': {...}}
+    """
+    colleges = [college for college in COLLEGES if colleges is None or college in colleges]
+    matrix = {college: {TRACK_CHALLENGE_CUP: _empty_track_stats(), TRACK_RED_TRAVEL: _empty_track_stats()}
+              for college in colleges}
+
+    track_by_competition = get_assessment_competitions(year)
+    if not track_by_competition or not colleges:
+        return matrix
+
+    competition_ids = list(track_by_competition.keys())
+    project_filter = (
+        Project.competition_id.in_(competition_ids),
+        Project.status == ReviewStatus.FINAL_APPROVED,
+        Project.push_college.in_(colleges)
+    )
+
+    # 报名数
+    registration_rows = db.session.query(
+        Project.push_college, Project.competition_id, func.count(Project.id)
+    ).filter(*project_filter).group_by(Project.push_college, Project.competition_id).all()
+
+    for college, competition_id, count in registration_rows:
+        matrix[college][track_by_competition[competition_id]]['registration_count'] += count
+
+    # 校赛奖项（Award表）
+    award_rows = db.session.query(
+        Project.push_college, Project.competition_id, Award.award_name, func.count(Award.id)
+    ).join(Award, Award.project_id == Project.id).filter(*project_filter).group_by(
+        Project.push_college, Project.competition_id, Award.award_name
+    ).all()
+
+    # 省赛/国赛奖项（ExternalAward表）
+    external_rows = db.session.query(
+        Project.push_college, Project.competition_id, ExternalAward.award_level, ExternalAward.award_name,
+        func.count(ExternalAward.id)
+    ).join(ExternalAward, ExternalAward.project_id == Project.id).filter(
+        *project_filter,
+        ExternalAward.award_level.in_(list(EXTERNAL_LEVELS.keys()))
+    ).group_by(
+        Project.push_college, Project.competition_id, ExternalAward.award_level, ExternalAward.award_name
+    ).all()
+
+    rows = [(college, competition_id, LEVEL_SCHOOL, award_name, count)
+            for college, competition_id, award_name, count in award_rows]
+    rows.extend((college, competition_id, EXTERNAL_LEVELS[award_level], award_name, count)
+                for college, competition_id, award_level, award_name, count in external_rows)
+
+    medal_cache = {}
+    for college, competition_id, level, award_name, count in rows:
+        if award_name not in medal_cache:
+            medal_cache[award_name] = normalize_medal(award_name)
+        medal = medal_cache[award_name]
+        stats = matrix[college][track_by_competition[competition_id]]
+
+        if medal:
+            stats[f'{level}_awards'][medal] += count
+            stats['total_awards'] += count
+            award_score = AWARD_SCORES[level][medal]
+        elif level == LEVEL_NATIONAL:
+            # 国赛所有奖项都加满（无论奖项名称能否识别为金银铜）
+            award_score = AWARD_SCORES[LEVEL_NATIONAL]['gold']
+        else:
+            continue
+        stats['max_award_score'] = max(stats['max_award_score'], award_score)
+
+    return matrix
+
+
+# 快照表中每个赛道的统计字段：(分组, 奖项, 字段后缀)
+_SNAPSHOT_FIELDS = [(None, 'registration_count', 'registration')]
+_SNAPSHOT_FIELDS += [(f'{level}_awards', medal, f'{level}_{medal}')
+                     for level in (LEVEL_SCHOOL, LEVEL_PROVINCIAL, LEVEL_NATIONAL) for medal in MEDALS]
+_SNAPSHOT_FIELDS += [(None, 'total_awards', 'total_awards'), (None, 'max_award_score', 'max_award_score')]
+
+
+def _snapshot_to_stats(snapshot):
+    """将快照记录还原为单个学院的统计结构"""
+    college_matrix = {}
+    for track in (TRACK_CHALLENGE_CUP, TRACK_RED_TRAVEL):
+        stats = _empty_track_stats()
+        for group, key, suffix in _SNAPSHOT_FIELDS:
+            value = getattr(snapshot, f'{track}_{suffix}') or 0
+            if group:
+                stats[group][key] = value
+            else:
+                stats[key] = value
+        college_matrix[track] = stats
+    return college_matrix
+
+
+def _apply_stats_to_snapshot(snapshot, college_matrix):
+    """
+    将单个学院的统计结构写入快照记录
+
+    Returns:
+        bool: 快照数据是否发生变化
+    """
+    changed = False
+    for track in (TRACK_CHALLENGE_CUP, TRACK_RED_TRAVEL):
+        stats = college_matrix[track]
+        for group, key, suffix in _SNAPSHOT_FIELDS:
+            value = stats[group][key] if group else stats[key]
+            field = f'{track}_{suffix}'
+            if getattr(snapshot, field) != value:
+                setattr(snapshot, field, value)
+                changed = True
+    return changed
+
+
+def refresh_assessment_snapshots(year, colleges=None):
+    """
+    重新统计并写入指定年度（部分学院）的考核快照，不提交事务
+
+    Args:
+        year: 年度
+        colleges: 只刷新这些学院（默认全部学院）
+
+    Returns:
+        int: 数据发生变化的学院数
+    """
+    matrix = compute_assessment_matrix(year, colleges)
+    if not matrix:
+        return 0
+
+    snapshots = AssessmentSnapshot.query.filter(
+        AssessmentSnapshot.year == year,
+        AssessmentSnapshot.college.in_(list(matrix.keys()))
+    ).all()
+    snapshot_by_college = {snapshot.college: snapshot for snapshot in snapshots}
+
+    changed_count = 0
+    for college, college_matrix in matrix.items():
+        snapshot = snapshot_by_college.get(college)
+        if snapshot is None:
+            snapshot = AssessmentSnapshot(year=year, college=college)
+            db.session.add(snapshot)
+        if _apply_stats_to_snapshot(snapshot, college_matrix):
+            changed_count += 1
+    return changed_count
+
+
+def rebuild_assessment_year(year):
+    """
+    重建指定年度全部学院的考核快照并提交，用于一致性校验
+
+    Returns:
+        int: 与原快照不一致（已修正）的学院数
+    """
+    changed_count = refresh_assessment_snapshots(year)
+    db.session.commit()
+    return changed_count
+
+
+def load_assessment_matrix(year):
+    """
+    从快照表读取指定年度的统计矩阵（只读，不写数据库）。
+    该年度尚无完整快照时直接统计；快照在该年度的项目、奖项首次变更时（见 _refresh_dirty_snapshots）或重建快照时生成
+
+    Returns:
+        dict: 学院 -> {'challenge_cup': {...}, 'red_travel': {...}}
+    """
+    snapshots = AssessmentSnapshot.query.filter_by(year=year).all()
+    snapshot_by_college = {snapshot.college: snapshot for snapshot in snapshots}
+
+    if all(college in snapshot_by_college for college in COLLEGES):
+        return {college: _snapshot_to_stats(snapshot_by_college[college]) for college in COLLEGES}
+    return compute_assessment_matrix(year)
+
+
+# ---------------- 快照增量刷新 ----------------
+
+_DIRTY_KEY = 'assessment_snapshot_dirty'
+_DIRTY_YEARS_KEY = 'assessment_snapshot_dirty_years'
+
+# 影响年度参与考核的竞赛（见 get_assessment_competitions）的竞赛字段，变更后整个年度重新统计
+_COMPETITION_ATTRS = ('is_active', 'year', 'competition_type')
+
+
+def _attribute_values(obj, attr):
+    """获取对象属性在本次变更前后的所有取值（用于定位变更前后所属的竞赛、学院）"""
+    history = inspect(obj).attrs[attr].history
+    values = set(history.added) | set(history.deleted) | set(history.unchanged)
+    if not values:
+        values.add(getattr(obj, attr))
+    return values
+
+
+def _collect_dirty_pairs(session, flush_context, instances):
+    """before_flush：记录受本次变更影响的 (竞赛ID, 学院)，以及参与考核的竞赛可能变化的年度"""
+    dirty_pairs = session.info.setdefault(_DIRTY_KEY, set())
+    dirty_years = session.info.setdefault(_DIRTY_YEARS_KEY, set())
+    project_ids = set()
+    dirty = session.dirty
+
+    for obj in session.new | dirty | session.deleted:
+        if isinstance(obj, Competition):
+            state = inspect(obj)
+            if obj in dirty and not any(state.attrs[attr].history.has_changes() for attr in _COMPETITION_ATTRS):
+                continue
+            dirty_years.update(_attribute_values(obj, 'year'))
+        elif isinstance(obj, Project):
+            state = inspect(obj)
+            if obj in dirty and not any(
+                state.attrs[attr].history.has_changes()
+                for attr in ('status', 'push_college', 'competition_id')
+            ):
+                continue
+            for competition_id in _attribute_values(obj, 'competition_id'):
+                for college in _attribute_values(obj, 'push_college'):
+                    dirty_pairs.add((competition_id, college))
+        elif isinstance(obj, (Award, ExternalAward)):
+            if obj in dirty and not session.is_modified(obj):
+                continue
+            project_ids.update(_attribute_values(obj, 'project_id'))
+
+    project_ids.discard(None)
+    if project_ids:
+        with session.no_autoflush:
+            for project_id in project_ids:
+                project = session.get(Project, project_id)
+                if project is not None:
+                    dirty_pairs.add((project.competition_id, project.push_college))
+
+
+def _refresh_dirty_snapshots(session):
+    """
+    before_commit：在同一事务内刷新受影响年度的快照
+    已生成快照的年度只刷新受影响的学院；尚未生成快照的年度在首次变更时整体生成（读取页面不写数据库）；
+    竞赛的启用状态、年度、类型变化时整个年度重新统计
+    """
+    # 先写入本次事务的变更（同时收集受影响的学院），使重新统计能读到最新数据
+    session.flush()
+    dirty_pairs = session.info.pop(_DIRTY_KEY, None) or set()
+    dirty_years = {year for year in session.info.pop(_DIRTY_YEARS_KEY, None) or () if year}
+
+    competition_ids = {competition_id for competition_id, college in dirty_pairs if competition_id}
+    year_by_competition = dict(session.query(Competition.id, Competition.year).filter(
+        Competition.id.in_(competition_ids)
+    ).all()) if competition_ids else {}
+
+    colleges_by_year = {}
+    for competition_id, college in dirty_pairs:
+        year = year_by_competition.get(competition_id)
+        if year and college in COLLEGES:
+            colleges_by_year.setdefault(year, set()).add(college)
+    if not colleges_by_year and not dirty_years:
+        return
+
+    materialized_years = {row[0] for row in session.query(AssessmentSnapshot.year).filter(
+        AssessmentSnapshot.year.in_(list(set(colleges_by_year) | dirty_years))
+    ).distinct().all()}
+    for year in dirty_years:
+        # 竞赛变化只影响已生成快照的年度（未生成的年度读取时直接统计）
+        if year in materialized_years:
+            refresh_assessment_snapshots(year)
+    for year, colleges in colleges_by_year.items():
+        if year in dirty_years and year in materialized_years:
+            continue
+        refresh_assessment_snapshots(year, colleges if year in materialized_years else None)
+
+
+def _discard_dirty_pairs(session, previous_transaction=None):
+    """事务回滚时丢弃未刷新的变更记录"""
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_DIRTY_YEARS_KEY, None)
+
+
+def register_assessment_listeners(session):
+    """在数据库会话上注册考核快照增量刷新的事件监听"""
+    event.listen(session, 'before_flush', _collect_dirty_pairs)
+    event.listen(session, 'before_commit', _refresh_dirty_snapshots)
+    event.listen(session, 'after_soft_rollback', _discard_dirty_pairs)
+
+
+def get_assessment_configs(year):
+    """一次性获取指定年度所有学院的考核配置，返回 学院 -> AssessmentConfig"""
+    configs = AssessmentConfig.query.filter_by(year=year).all()
+    return {config.college: config for config in configs}
+
+
+def calculate_participation_score(actual_count, target_count):
+    """参与得分：实际申报/要求申报*2分，上限2分；任务要求未设置时返回 None（缺项）"""
+    if not target_count:
+        return None
+    return min(PARTICIPATION_SCORE_MAX, (actual_count / target_count) * PARTICIPATION_SCORE_MAX)
+
+
+# AssessmentConfig 中可编辑统计数据字段与统计结构的对应关系：(赛道, 分组, 奖项, 字段名)
+_CONFIG_OVERRIDE_FIELDS = [
+    (TRACK_CHALLENGE_CUP, None, 'registration_count', 'challenge_cup_main_registration'),
+    (TRACK_CHALLENGE_CUP, 'school_awards', 'gold', 'challenge_cup_main_school_gold'),
+    (TRACK_CHALLENGE_CUP, 'school_awards', 'silver', 'challenge_cup_main_school_silver'),
+    (TRACK_CHALLENGE_CUP, 'school_awards', 'bronze', 'challenge_cup_main_school_bronze'),
+    (TRACK_CHALLENGE_CUP, 'provincial_awards', 'gold', 'challenge_cup_main_provincial_gold'),
+    (TRACK_CHALLENGE_CUP, 'provincial_awards', 'silver', 'challenge_cup_main_provincial_silver'),
+    (TRACK_CHALLENGE_CUP, 'provincial_awards', 'bronze', 'challenge_cup_main_provincial_bronze'),
+    (TRACK_CHALLENGE_CUP, 'national_awards', 'gold', 'challenge_cup_main_national_gold'),
+    (TRACK_CHALLENGE_CUP, 'national_awards', 'silver', 'challenge_cup_main_national_silver'),
+    (TRACK_CHALLENGE_CUP, 'national_awards', 'bronze', 'challenge_cup_main_national_bronze'),
+    (TRACK_CHALLENGE_CUP, None, 'total_awards', 'challenge_cup_main_total_awards'),
+    ('challenge_cup_activities', None, 'registration_count', 'challenge_cup_activities_registration'),
+    ('challenge_cup_activities', 'national_awards', 'gold', 'challenge_cup_activities_national_gold'),
+    ('challenge_cup_activities', 'national_awards', 'silver', 'challenge_cup_activities_national_silver'),
+    ('challenge_cup_activities', 'national_awards', 'bronze', 'challenge_cup_activities_national_bronze'),
+    (TRACK_RED_TRAVEL, None, 'registration_count', 'red_travel_registration'),
+    (TRACK_RED_TRAVEL, 'school_awards', 'gold', 'red_travel_school_gold'),
+    (TRACK_RED_TRAVEL, 'school_awards', 'silver', 'red_travel_school_silver'),
+    (TRACK_RED_TRAVEL, 'school_awards', 'bronze', 'red_travel_school_bronze'),
+    (TRACK_RED_TRAVEL, 'provincial_awards', 'gold', 'red_travel_provincial_gold'),
+    (TRACK_RED_TRAVEL, 'provincial_awards', 'silver', 'red_travel_provincial_silver'),
+    (TRACK_RED_TRAVEL, 'provincial_awards', 'bronze', 'red_travel_provincial_bronze'),
+    (TRACK_RED_TRAVEL, 'national_awards', 'gold', 'red_travel_national_gold'),
+    (TRACK_RED_TRAVEL, 'national_awards', 'silver', 'red_travel_national_silver'),
+    (TRACK_RED_TRAVEL, 'national_awards', 'bronze', 'red_travel_national_bronze'),
+    (TRACK_RED_TRAVEL, None, 'total_awards', 'red_travel_total_awards'),
+]
+
+
+def build_college_stats(year, matrix=None, configs=None):
+    """
+    构建考核数据页（情况统计）所需的按学院统计数据
+    在统计矩阵基础上合并任务要求、特殊情况备注和手动编辑的统计数据
+    """
+    if matrix is None:
+        matrix = load_assessment_matrix(year)
+    if configs is None:
+        configs = get_assessment_configs(year)
+
+    college_stats = {}
+    for college in COLLEGES:
+        track_stats = matrix[college]
+        stats = {
+            'college': college,
+            # 挑战杯主赛道
+            'challenge_cup': dict(track_stats[TRACK_CHALLENGE_CUP], special_notes=''),
+            # 配套活动
+            'challenge_cup_activities': {
+                'registration_count': 0,
+                'national_awards': {medal: 0 for medal in MEDALS},
+                'notes': ''
+            },
+            # 红旅赛道
+            'red_travel': dict(track_stats[TRACK_RED_TRAVEL], special_notes=''),
+        }
+        # 复制奖项字典，避免手动编辑的数据回写到统计矩阵
+        for track in (TRACK_CHALLENGE_CUP, TRACK_RED_TRAVEL):
+            for group in ('school_awards', 'provincial_awards', 'national_awards'):
+                stats[track][group] = dict(stats[track][group])
+
+        config = configs.get(college)
+        if config:
+            # 任务要求
+            stats['challenge_cup']['requirement'] = config.challenge_cup_requirement or None
+            stats['red_travel']['requirement'] = config.red_travel_requirement or None
+            # 特殊情况备注
+            stats['challenge_cup']['special_notes'] = config.challenge_cup_special_notes or ''
+            stats['red_travel']['special_notes'] = config.red_travel_special_notes or ''
+            # 配套活动备注
+            stats['challenge_cup_activities']['notes'] = config.challenge_cup_activities or ''
+
+            # 手动编辑的统计数据优先
+            for section, group, key, field in _CONFIG_OVERRIDE_FIELDS:
+                value = getattr(config, field)
+                if value is None:
+                    continue
+                if group:
+                    stats[section][group][key] = value
+                else:
+                    stats[section][key] = value
+        else:
+            stats['challenge_cup']['requirement'] = None
+            stats['red_travel']['requirement'] = None
+
+        college_stats[college] = stats
+    return college_stats
+
+
+def build_college_scores(year, use_saved_scores=False, matrix=None, configs=None):
+    """
+    构建年度考核分数统计数据
+
+    Args:
+        year: 年度
+        use_saved_scores: 是否优先使用 AssessmentConfig 中手动保存的分数
+    """
+    if matrix is None:
+        matrix = load_assessment_matrix(year)
+    if configs is None:
+        configs = get_assessment_configs(year)
+
+    track_labels = {
+        TRACK_RED_TRAVEL: '申报队伍数',
+        TRACK_CHALLENGE_CUP: '报名数',
+    }
+
+    college_scores = {}
+    for college in COLLEGES:
+        config = configs.get(college)
+        score_data = {
+            'college': college,
+            'total_score': 0,
+            'score_details': {}
+        }
+
+        for track in (TRACK_RED_TRAVEL, TRACK_CHALLENGE_CUP):
+            track_stats = matrix[college][track]
+            actual_count = track_stats['registration_count']
+            target_count = getattr(config, f'{track}_requirement') if config else None
+            max_award_score = track_stats['max_award_score']
+
+            score_data[f'{track}_participation'] = actual_count
+            score_data[f'{track}_award'] = max_award_score
+
+            # 参与得分
+            participation = {'score': calculate_participation_score(actual_count, target_count), 'note': ''}
+            saved_participation = getattr(config, f'{track}_participation_score') if config else None
+            if use_saved_scores and saved_participation is not None:
+                participation['score'] = saved_participation
+            elif not target_count:
+                participation['note'] = f'{track_labels[track]}：{actual_count}（任务要求未设置）'
+            else:
+                participation['note'] = f'{track_labels[track]}：{actual_count}，任务要求：{target_count}'
+
+            # 获奖得分（取最高奖项）
+            award = {'score': min(AWARD_SCORE_MAX, max_award_score), 'note': ''}
+            saved_award = getattr(config, f'{track}_award_score') if config else None
+            if use_saved_scores and saved_award is not None:
+                award['score'] = saved_award
+            award['note'] = '无获奖' if max_award_score == 0 else f'最高奖项得分：{max_award_score}分'
+
+            score_data['score_details'][f'{track}_participation'] = participation
+            score_data['score_details'][f'{track}_award'] = award
+
+        # 计算总分（如果某项为空则不计入）
+        score_data['total_score'] = sum(
+            detail['score'] for detail in score_data['score_details'].values() if detail['score'] is not None
+        )
+        college_scores[college] = score_data
+    return college_scores
+
+
+def get_available_years():
+    """获取所有可用年份（从竞赛中提取）"""
+    years = db.session.query(Competition.year).distinct().order_by(Competition.year.desc()).all()
+    return [y[0] for y in years if y[0]]
+
+
+def build_assessment_workbook(year):
+    """
+    生成年度考核数据Excel（2个sheet：情况统计、算分）
+
+    Returns:
+        BytesIO: Excel文件内容
+    """
+    # 延迟导入pandas，避免启动时的NumPy版本冲突
+    import pandas as pd
+
+    # 统计矩阵（读取快照）和配置只读取一次，两个sheet共用
+    matrix = load_assessment_matrix(year)
+    configs = get_assessment_configs(year)
+
+    # Sheet 1: 情况统计
+    data_stats = []
+    for college in COLLEGES:
+        challenge_cup = matrix[college]['challenge_cup']
+        red_travel = matrix[college]['red_travel']
+
+        # 获取配置数据（按学院）
+        college_config = configs.get(college)
+        challenge_cup_requirement = college_config.challenge_cup_requirement if college_config else None
+        challenge_cup_special_notes = college_config.challenge_cup_special_notes if college_config else ''
+        red_travel_requirement = college_config.red_travel_requirement if college_config else None
+        red_travel_special_notes = college_config.red_travel_special_notes if college_config else ''
+
+        # 配套活动数据（从challenge_cup_activities字段解析JSON，如果存在）
+        activities_registration = 0
+        activities_national_gold = 0
+        activities_national_silver = 0
+        activities_national_bronze = 0
+        if college_config and college_config.challenge_cup_activities:
+            try:
+                activities_data = json.loads(college_config.challenge_cup_activities)
+                activities_registration = activities_data.get('registration_count', 0)
+                national_awards = activities_data.get('national_awards', {})
+                activities_national_gold = national_awards.get('gold', 0)
+                activities_national_silver = national_awards.get('silver', 0)
+                activities_national_bronze = national_awards.get('bronze', 0)
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                # 如果不是JSON格式，忽略
+                pass
+
+        data_stats.append({
+            '序号': len(data_stats) + 1,
+            '学院': college,
+            # 挑战杯主赛道
+            '挑战杯任务要求': challenge_cup_requirement if challenge_cup_requirement else '',
+            '挑战杯报名数': challenge_cup['registration_count'],
+            '挑战杯校赛金奖': challenge_cup['school_awards']['gold'],
+            '挑战杯校赛银奖': challenge_cup['school_awards']['silver'],
+            '挑战杯校赛铜奖': challenge_cup['school_awards']['bronze'],
+            '挑战杯省赛金奖': challenge_cup['provincial_awards']['gold'],
+            '挑战杯省赛银奖': challenge_cup['provincial_awards']['silver'],
+            '挑战杯省赛铜奖': challenge_cup['provincial_awards']['bronze'],
+            '挑战杯国赛金奖': challenge_cup['national_awards']['gold'],
+            '挑战杯国赛银奖': challenge_cup['national_awards']['silver'],
+            '挑战杯国赛铜奖': challenge_cup['national_awards']['bronze'],
+            '挑战杯获奖总数': challenge_cup['total_awards'],
+            '挑战杯特殊情况备注': challenge_cup_special_notes,
+            # 配套活动
+            '配套活动报名数': activities_registration,
+            '配套活动国赛金奖': activities_national_gold,
+            '配套活动国赛银奖': activities_national_silver,
+            '配套活动国赛铜奖': activities_national_bronze,
+            # 红旅赛道
+            '红旅任务要求': red_travel_requirement if red_travel_requirement else '',
+            '红旅报名数': red_travel['registration_count'],
+            '红旅校赛金奖': red_travel['school_awards']['gold'],
+            '红旅校赛银奖': red_travel['school_awards']['silver'],
+            '红旅校赛铜奖': red_travel['school_awards']['bronze'],
+            '红旅省赛金奖': red_travel['provincial_awards']['gold'],
+            '红旅省赛银奖': red_travel['provincial_awards']['silver'],
+            '红旅省赛铜奖': red_travel['provincial_awards']['bronze'],
+            '红旅国赛金奖': red_travel['national_awards']['gold'],
+            '红旅国赛银奖': red_travel['national_awards']['silver'],
+            '红旅国赛铜奖': red_travel['national_awards']['bronze'],
+            '红旅获奖总数': red_travel['total_awards'],
+            '红旅特殊情况备注': red_travel_special_notes,
+        })
+
+    # Sheet 2: 算分（与assessment_score相同的计算逻辑）
+    college_scores = build_college_scores(year, matrix=matrix, configs=configs)
+    score_stats = []
+    for college in COLLEGES:
+        details = college_scores[college]['score_details']
+        red_travel_participation_score = details['red_travel_participation']['score']
+        challenge_cup_participation_score = details['challenge_cup_participation']['score']
+
+        score_stats.append({
+            '序号': len(score_stats) + 1,
+            '学院': college,
+            '红旅参与得分': red_travel_participation_score if red_travel_participation_score is not None else '',
+            '红旅获奖得分': details['red_travel_award']['score'],
+            '挑战杯参与得分': challenge_cup_participation_score if challenge_cup_participation_score is not None else '',
+            '挑战杯获奖得分': details['challenge_cup_award']['score'],
+            '总分': college_scores[college]['total_score'],
+        })
+
+    # 创建Excel文件
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        if data_stats:
+            df_data = pd.DataFrame(data_stats)
+            df_data.to_excel(writer, index=False, sheet_name='情况统计')
+
+        if score_stats:
+            df_score = pd.DataFrame(score_stats)
+            df_score.to_excel(writer, index=False, sheet_name='算分')
+
+    output.seek(0)
+    return output
@@ -0,0 +1,229 @@
+"""
+附件内容寻址存储
+附件按内容SHA-256保存在 uploads/blobs/<前2位>/<3-4位>/<sha256>，内容相同的附件（队员重复上传、驳回后重新提交、
+多个项目共用）只保存一份。file_blobs 表记录每个文件被多少附件引用：附件新增、删除（包括随项目级联删除）时
+由会话事件维护引用计数，最后一个引用删除后在同一事务中删除记录，提交后删除文件。
+上传的内容已存在时，临时文件保留到事务提交后：此时文件若已被并发的回收删除，用临时文件恢复；
+回收文件时先改名再确认数据库中没有引用，期间有新引用提交时将文件改回原名
+"""
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from sqlalchemy import event, update, select
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from models import db, FileBlob, ProjectAttachment, AttachmentText
+from utils.thumbnails import thumbnail_relative_path
+
+BLOB_SUBFOLDER = 'blobs'
+
+# 上传时边写入边计算哈希的块大小
+CHUNK_SIZE = 1024 * 1024
+
+_REF_DELTAS_KEY = 'blob_ref_deltas'
+_GARBAGE_BLOBS_KEY = 'blob_garbage_ids'
+_GARBAGE_FILES_KEY = 'blob_garbage_paths'
+_ADOPTED_TEMPS_KEY = 'blob_adopted_temps'
+
+
+def blob_relative_path(content_hash):
+    """文件哈希对应的存储路径（相对于上传目录，正斜杠）"""
+    return f'{BLOB_SUBFOLDER}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}'
+
+
+def store_blob(file):
+    """
+    将上传的文件写入内容寻址存储：边写入临时文件边计算SHA-256，内容已存在时丢弃临时文件
+
+    Args:
+        file: 上传的文件（werkzeug FileStorage）
+
+    Returns:
+        {'content_hash': 文件哈希, 'file_path': 存储路径（相对于上传目录）, 'file_size': 文件大小}
+    """
+    temp_path = blob_temp_dir() / uuid.uuid4().hex
+
+    sha256 = hashlib.sha256()
+    file_size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                f.write(chunk)
+                file_size += len(chunk)
+
+        content_hash = sha256.hexdigest()
+        relative_path = adopt_blob_file(temp_path, content_hash)
+    except BaseException:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+    return {'content_hash': content_hash, 'file_path': relative_path, 'file_size': file_size}
+
+
+def blob_temp_dir():
+    """内容寻址存储的临时目录（与存储目录在同一文件系统，写完后可直接重命名）"""
+    temp_dir = Path(Config.UPLOAD_FOLDER) / BLOB_SUBFOLDER / 'tmp'
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    return temp_dir
+
+
+def adopt_blob_file(temp_path, content_hash):
+    """
+    将已计算哈希的临时文件移入内容寻址存储
+    内容已存在时临时文件保留到当前事务结束：提交后文件若已被并发的回收删除，用临时文件恢复，否则删除临时文件
+
+    Returns:
+        存储路径（相对于上传目录）
+    """
+    relative_path = blob_relative_path(content_hash)
+    blob_path = Path(Config.UPLOAD_FOLDER) / relative_path
+    if blob_path.exists():
+        db.session.info.setdefault(_ADOPTED_TEMPS_KEY, []).append((Path(temp_path), blob_path))
+    else:
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, blob_path)
+    return relative_path
+
+
+def _settle_adopted_files(session):
+    """after_commit：新附件的引用已提交，确认其文件仍然存在（被并发回收时用临时文件恢复），再删除临时文件"""
+    for temp_path, blob_path in session.info.pop(_ADOPTED_TEMPS_KEY, []):
+        try:
+            if not blob_path.exists():
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, blob_path)
+            else:
+                temp_path.unlink()
+        except OSError:
+            continue
+
+
+def _discard_adopted_temps(session, transaction):
+    """after_transaction_end：最外层事务未提交（回滚或关闭会话）时删除保留的临时文件"""
+    if transaction.parent is not None:
+        return
+    for temp_path, _ in session.info.pop(_ADOPTED_TEMPS_KEY, []):
+        try:
+            temp_path.unlink()
+        except OSError:
+            continue
+
+
+def get_or_create_blob(content_hash, file_path, file_size):
+    """获取文件哈希对应的 FileBlob，不存在时创建（引用计数由附件的新增、删除维护，不提交事务）"""
+    blob = FileBlob.query.filter_by(content_hash=content_hash).first()
+    if blob:
+        return blob
+    try:
+        with db.session.begin_nested():
+            blob = FileBlob(content_hash=content_hash, file_path=file_path, file_size=file_size, ref_count=0)
+            db.session.add(blob)
+    except IntegrityError:
+        # 其他请求同时上传了相同内容的文件
+        blob = FileBlob.query.filter_by(content_hash=content_hash).first()
+    return blob
+
+
+def _collect_ref_deltas(session, flush_context, instances):
+    """before_flush：记录新增、删除的附件对文件引用数的影响"""
+    deltas = session.info.setdefault(_REF_DELTAS_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, ProjectAttachment) and (obj.blob is not None or obj.blob_id):
+            deltas.setdefault(obj, 0)
+            deltas[obj] += 1
+    for obj in session.deleted:
+        if isinstance(obj, ProjectAttachment) and obj.blob_id:
+            deltas.setdefault(obj, 0)
+            deltas[obj] -= 1
+
+
+def _apply_ref_deltas(session, flush_context):
+    """after_flush：按附件所属文件累计引用数变化，用 UPDATE 表达式原子更新引用计数"""
+    deltas = session.info.pop(_REF_DELTAS_KEY, None)
+    if not deltas:
+        return
+
+    blob_deltas = {}
+    for attachment, delta in deltas.items():
+        if attachment.blob_id:
+            blob_deltas[attachment.blob_id] = blob_deltas.get(attachment.blob_id, 0) + delta
+    for blob_id, delta in blob_deltas.items():
+        if delta:
+            session.execute(update(FileBlob).where(FileBlob.id == blob_id).values(ref_count=FileBlob.ref_count + delta))
+    session.info.setdefault(_GARBAGE_BLOBS_KEY, set()).update(blob_id for blob_id, delta in blob_deltas.items() if delta < 0)
+
+
+def _delete_unreferenced_blobs(session):
+    """before_commit：删除引用数降为0的文件记录及其提取的文本，记录待删除的文件和缩略图"""
+    session.flush()
+    blob_ids = session.info.pop(_GARBAGE_BLOBS_KEY, None)
+    if not blob_ids:
+        return
+
+    blobs = session.query(FileBlob).filter(FileBlob.id.in_(blob_ids), FileBlob.ref_count <= 0).all()
+    if not blobs:
+        return
+    file_paths = [blob.file_path for blob in blobs]
+    for text in session.query(AttachmentText).filter(AttachmentText.file_path.in_(file_paths)).all():
+        session.delete(text)
+    for blob in blobs:
+        session.delete(blob)
+    session.flush()
+    session.info.setdefault(_GARBAGE_FILES_KEY, []).extend(file_paths)
+    # 缩略图按内容哈希缓存，随文件一起删除
+    session.info[_GARBAGE_FILES_KEY].extend(thumbnail_relative_path(blob.content_hash) for blob in blobs)
+
+
+def _remove_garbage_files(session):
+    """
+    after_commit：删除已无引用的文件
+    先将文件改名，再用新的连接确认没有其他事务已提交引用该文件的记录（同时上传了相同内容），有则改回原名
+    """
+    file_paths = session.info.pop(_GARBAGE_FILES_KEY, None)
+    if not file_paths:
+        return
+    renamed = {}
+    for file_path in file_paths:
+        path = Path(Config.UPLOAD_FOLDER) / file_path
+        doomed = path.with_name(f'{path.name}.{uuid.uuid4().hex}.deleting')
+        try:
+            os.replace(path, doomed)
+        except OSError:
+            continue
+        renamed[file_path] = (path, doomed)
+    if not renamed:
+        return
+
+    with session.get_bind().connect() as connection:
+        referenced = set(connection.execute(
+            select(FileBlob.file_path).where(FileBlob.file_path.in_(list(renamed)))
+        ).scalars())
+    for file_path, (path, doomed) in renamed.items():
+        try:
+            if file_path in referenced and not path.exists():
+                os.replace(doomed, path)
+            else:
+                doomed.unlink()
+        except OSError:
+            continue
+
+
+def _discard_pending(session, previous_transaction=None):
+    """事务回滚时丢弃未提交的引用变更"""
+    session.info.pop(_REF_DELTAS_KEY, None)
+    session.info.pop(_GARBAGE_BLOBS_KEY, None)
+    session.info.pop(_GARBAGE_FILES_KEY, None)
+
+
+def register_blob_listeners(session):
+    """在数据库会话上注册附件文件引用计数和回收的事件监听"""
+    event.listen(session, 'before_flush', _collect_ref_deltas)
+    event.listen(session, 'after_flush', _apply_ref_deltas)
+    event.listen(session, 'before_commit', _delete_unreferenced_blobs)
+    event.listen(session, 'after_commit', _remove_garbage_files)
+    event.listen(session, 'after_commit', _settle_adopted_files)
+    event.listen(session, 'after_transaction_end', _discard_adopted_temps)
+    event.listen(session, 'after_soft_rollback', _discard_pending)
@@ -1,97 +1,199 @@
 """
 电子证书生成工具
+字体在每个进程中只加载一次；标题、比赛名称等不变的内容按比赛预先绘制成底图并缓存，
+每张证书只复制底图并绘制队伍名、奖项和日期。
+证书在首次查看或下载时生成，文件名由奖项和证书内容确定，内容变化后才重新生成
 """
 from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
 from pathlib import Path
 from config import Config
+from models import db, Award
 from datetime import datetime
+import hashlib
+import json
 import os
+import time
+import uuid
 
-def generate_certificate(team_name, award_name, competition_name, year):
+# 证书模板版本：修改证书版式后加1，已生成的证书在下次访问时按新版式重新生成
+CERTIFICATE_TEMPLATE_VERSION = 1
+
+# 证书尺寸（A4横向：297x210mm，300dpi）
+WIDTH, HEIGHT = 3508, 2480  # 约A4横向尺寸（像素）
+TITLE_FONT_SIZE = 120
+CONTENT_FONT_SIZE = 80
+LINE_HEIGHT = 120
+CONTENT_START_Y = HEIGHT // 2 - 100
+
+# 证书格式对应的扩展名和MIME类型
+CERTIFICATE_FORMATS = {
+    'png': ('png', 'image/png'),
+    'jpeg': ('jpg', 'image/jpeg'),
+    'webp': ('webp', 'image/webp'),
+}
+CERTIFICATE_MIMETYPES = {extension: mimetype for extension, mimetype in CERTIFICATE_FORMATS.values()}
+
+
+@lru_cache(maxsize=1)
+def get_fonts():
+    """加载证书字体，返回 (标题字体, 正文字体)；每个进程只加载一次"""
+    for font_path in Config.CERTIFICATE_FONT_PATHS:
+        if os.path.exists(font_path):
+            try:
+                return ImageFont.truetype(font_path, TITLE_FONT_SIZE), ImageFont.truetype(font_path, CONTENT_FONT_SIZE)
+            except OSError:
+                continue
+    # 如果没有找到字体，使用默认字体
+    return ImageFont.load_default(), ImageFont.load_default()
+
+
+def _draw_centered(draw, text, y, font):
+    """水平居中绘制一行文字"""
+    bbox = draw.textbbox((0, 0), text, font=font)
+    draw.text(((WIDTH - (bbox[2] - bbox[0])) // 2, y), text, fill='black', font=font)
+
+
+@lru_cache(maxsize=8)
+def _render_template(competition_name, year):
+    """绘制同一比赛所有证书共有的底图：标题、比赛名称和结束语（缓存，调用方需复制后再绘制）"""
+    title_font, content_font = get_fonts()
+    img = Image.new('RGB', (WIDTH, HEIGHT), color='white')
+    draw = ImageDraw.Draw(img)
+
+    _draw_centered(draw, "获奖证书", HEIGHT // 4, title_font)
+    _draw_centered(draw, f"在{year}年{competition_name}中", CONTENT_START_Y + LINE_HEIGHT, content_font)
+    _draw_centered(draw, "特发此证，以资鼓励。", CONTENT_START_Y + 4 * LINE_HEIGHT, content_font)
+    return img
+
+
+def render_certificate(team_name, award_name, competition_name, year, issue_date=None):
     """
-    生成电子证书（图片格式）
+    绘制证书图片
     格式：队伍名+奖项名称
+
+    Returns:
+        PIL.Image
     """
-    # 创建证书目录
-    cert_dir = Path(Config.CERTIFICATE_FOLDER)
-    cert_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 证书尺寸（A4横向：297x210mm，300dpi）
-    width, height = 3508, 2480  # 约A4横向尺寸（像素）
-    
-    # 创建白色背景
-    img = Image.new('RGB', (width, height), color='white')
+    _, content_font = get_fonts()
+    img = _render_template(competition_name, year).copy()
     draw = ImageDraw.Draw(img)
-    
-    # 尝试加载字体（如果系统有中文字体）
-    try:
-        # Windows系统字体路径
-        font_paths = [
-            'C:/Windows/Fonts/simhei.ttf',  # 黑体
-            'C:/Windows/Fonts/simsun.ttc',  # 宋体
-            'C:/Windows/Fonts/msyh.ttc',   # 微软雅黑
-        ]
-        title_font = None
-        content_font = None
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                title_font = ImageFont.truetype(font_path, 120)
-                content_font = ImageFont.truetype(font_path, 80)
-                break
-        
-        if not title_font:
-            # 如果没有找到字体，使用默认字体
-            title_font = ImageFont.load_default()
-            content_font = ImageFont.load_default()
-    except:
-        title_font = ImageFont.load_default()
-        content_font = ImageFont.load_default()
-    
-    # 绘制标题
-    title = "获奖证书"
-    title_bbox = draw.textbbox((0, 0), title, font=title_font)
-    title_width = title_bbox[2] - title_bbox[0]
-    title_x = (width - title_width) // 2
-    title_y = height // 4
-    draw.text((title_x, title_y), title, fill='black', font=title_font)
-    
-    # 绘制内容
-    content_lines = [
-        f"兹证明 {team_name} 队伍",
-        f"在{year}年{competition_name}中",
-        f"荣获 {award_name}",
-        "",
-        f"特发此证，以资鼓励。"
-    ]
-    
-    line_height = 120
-    start_y = height // 2 - 100
-    
-    for i, line in enumerate(content_lines):
-        if line:
-            line_bbox = draw.textbbox((0, 0), line, font=content_font)
-            line_width = line_bbox[2] - line_bbox[0]
-            line_x = (width - line_width) // 2
-            draw.text((line_x, start_y + i * line_height), line, fill='black', font=content_font)
-    
+
+    _draw_centered(draw, f"兹证明 {team_name} 队伍", CONTENT_START_Y, content_font)
+    _draw_centered(draw, f"荣获 {award_name}", CONTENT_START_Y + 2 * LINE_HEIGHT, content_font)
+
     # 绘制日期
-    date_text = f"{datetime.now().strftime('%Y年%m月%d日')}"
+    date_text = (issue_date or datetime.now()).strftime('%Y年%m月%d日')
     date_bbox = draw.textbbox((0, 0), date_text, font=content_font)
     date_width = date_bbox[2] - date_bbox[0]
-    date_x = width - date_width - 200
-    date_y = height - 300
-    draw.text((date_x, date_y), date_text, fill='black', font=content_font)
-    
-    # 生成文件名：队伍名+奖项名称
-    safe_team_name = "".join(c for c in team_name if c.isalnum() or c in (' ', '-', '_')).strip()
-    safe_award_name = "".join(c for c in award_name if c.isalnum() or c in (' ', '-', '_')).strip()
-    filename = f"{safe_team_name}_{safe_award_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-    filename = filename.replace(' ', '_')
-    
-    # 保存证书
-    cert_path = cert_dir / filename
-    img.save(str(cert_path), 'PNG', quality=95)
-    
-    return str(cert_path.relative_to(Path(Config.CERTIFICATE_FOLDER)))
+    draw.text((WIDTH - date_width - 200, HEIGHT - 300), date_text, fill='black', font=content_font)
+    return img
+
+
+def save_certificate_image(img, cert_path, image_format=None):
+    """按配置的格式和压缩参数保存证书（先写临时文件再重命名，不会留下写了一半的文件）"""
+    image_format = image_format or Config.CERTIFICATE_FORMAT
+    cert_path = Path(cert_path)
+    temp_path = cert_path.with_name(f'.{uuid.uuid4().hex}.tmp')
+    try:
+        img.save(str(temp_path), image_format.upper(), **Config.CERTIFICATE_SAVE_OPTIONS.get(image_format, {}))
+        os.replace(temp_path, cert_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def certificate_mimetype(certificate_path):
+    """按证书文件扩展名返回MIME类型（早期生成的证书均为PNG）"""
+    extension = os.path.splitext(certificate_path or '')[1][1:].lower()
+    return CERTIFICATE_MIMETYPES.get(extension, 'image/png')
+
+
+def _certificate_format():
+    """配置的证书格式（无效时使用PNG）"""
+    return Config.CERTIFICATE_FORMAT if Config.CERTIFICATE_FORMAT in CERTIFICATE_FORMATS else 'png'
 
+
+def certificate_inputs(award):
+    """证书内容：(队伍名, 奖项名称, 比赛名称, 年份, 颁发日期)，颁发日期为设置奖项的日期"""
+    project = award.project
+    return (project.team.name, award.award_name, project.competition.name, project.competition.year,
+            award.created_at or datetime.now())
+
+
+def certificate_relative_path(award):
+    """
+    证书文件路径（相对于证书目录）：由奖项ID和证书内容、模板版本、格式计算得到，
+    内容不变时路径不变，奖项名称、队伍名等变化后得到新路径
+    """
+    team_name, award_name, competition_name, year, issue_date = certificate_inputs(award)
+    image_format = _certificate_format()
+    payload = json.dumps([award.id, award_name, team_name, competition_name, year, issue_date.strftime('%Y-%m-%d'),
+                          CERTIFICATE_TEMPLATE_VERSION, image_format], ensure_ascii=False)
+    key = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    return f'award_{award.id}_{key}.{CERTIFICATE_FORMATS[image_format][0]}'
+
+
+def write_certificate(relative_path, team_name, award_name, competition_name, year, issue_date):
+    """绘制证书并保存到证书目录下的 relative_path（不访问数据库，可在进程池中调用）"""
+    cert_dir = Path(Config.CERTIFICATE_FOLDER)
+    cert_dir.mkdir(parents=True, exist_ok=True)
+    img = render_certificate(team_name, award_name, competition_name, year, issue_date)
+    save_certificate_image(img, cert_dir / relative_path, _certificate_format())
+    return relative_path
+
+
+def remove_certificate_file(relative_path):
+    """删除证书文件（文件不存在时忽略）"""
+    try:
+        os.remove(os.path.join(str(Config.CERTIFICATE_FOLDER), relative_path))
+    except OSError:
+        pass
+
+
+def ensure_certificate(award):
+    """
+    获取奖项的证书，首次访问或证书内容变化时生成（并删除旧证书文件），需在应用上下文中调用
+
+    Returns:
+        证书路径（相对于证书目录）
+    """
+    relative_path = certificate_relative_path(award)
+    if award.certificate_path == relative_path and (Path(Config.CERTIFICATE_FOLDER) / relative_path).exists():
+        return relative_path
+
+    write_certificate(relative_path, *certificate_inputs(award))
+    stale_path = award.certificate_path
+    award.certificate_path = relative_path
+    db.session.commit()
+    if stale_path and stale_path != relative_path:
+        remove_certificate_file(stale_path)
+    return relative_path
+
+
+def remove_stale_certificates():
+    """
+    删除证书目录中没有奖项引用的证书文件（如修改奖项前生成的旧证书、早期按时间戳命名的证书），返回删除数量
+
+    证书文件先写入、奖项记录后提交，刚生成的证书在提交前没有奖项引用；
+    只删除修改时间早于 CERTIFICATE_STALE_GRACE_SECONDS 的文件，避免删除其他请求正在生成的证书
+    """
+    cert_dir = Path(Config.CERTIFICATE_FOLDER)
+    if not cert_dir.exists():
+        return 0
+    referenced = {path.replace('\\', '/') for (path,) in
+                  db.session.query(Award.certificate_path).filter(Award.certificate_path.isnot(None))}
+    cutoff = time.time() - Config.CERTIFICATE_STALE_GRACE_SECONDS
+    removed = 0
+    for file_path in cert_dir.iterdir():
+        # 以.开头的是正在写入的临时文件
+        if not file_path.is_file() or file_path.name.startswith('.') or file_path.name in referenced:
+            continue
+        try:
+            if file_path.stat().st_mtime > cutoff:
+                continue
+            file_path.unlink()
+            removed += 1
+        except OSError:
+            continue
+    return removed
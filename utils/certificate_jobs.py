@@ -0,0 +1,96 @@
+"""
+批量生成证书
+证书平时在首次查看或下载时生成（见 utils/certificate.py），发布证书时把一个比赛中还没有生成、或内容已变化的证书
+交给进程池并行绘制，每批完成后一次性写回证书路径。已是最新的证书不会重复生成，重复发布只处理新设置或修改过的奖项
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import joinedload
+from config import Config
+from models import db, Award, Project
+from utils.certificate import certificate_inputs, certificate_relative_path, write_certificate, remove_certificate_file
+
+# 每完成这么多张证书写回一次数据库并报告进度
+COMMIT_BATCH_SIZE = 50
+
+
+def render_certificate_file(task):
+    """进程池入口：绘制并保存一张证书（不访问数据库），返回奖项ID"""
+    award_id, relative_path, inputs = task
+    write_certificate(relative_path, *inputs)
+    return award_id
+
+
+def issue_certificates(competition_id=None, progress_callback=None):
+    """
+    生成比赛中还没有生成或内容已变化的证书，并删除被替换的旧证书（需在应用上下文中调用）
+
+    Args:
+        competition_id: 比赛ID（为空时处理所有比赛）
+        progress_callback: 进度回调 progress_callback(已完成数, 总数)
+
+    Returns:
+        生成的证书数量
+    """
+    query = Award.query.join(Project, Award.project_id == Project.id).options(
+        joinedload(Award.project).joinedload(Project.team),
+        joinedload(Award.project).joinedload(Project.competition)
+    )
+    if competition_id:
+        query = query.filter(Project.competition_id == competition_id)
+
+    cert_dir = Path(Config.CERTIFICATE_FOLDER)
+    tasks = []
+    awards = {}
+    for award in query.order_by(Award.id):
+        relative_path = certificate_relative_path(award)
+        if award.certificate_path == relative_path and (cert_dir / relative_path).exists():
+            continue
+        tasks.append((award.id, relative_path, certificate_inputs(award)))
+        awards[award.id] = (award.award_name, award.certificate_path, relative_path)
+    db.session.commit()  # 绘制期间不占用数据库事务
+    if not tasks:
+        return 0
+
+    total = len(tasks)
+    done = 0
+    finished_ids = []
+
+    def flush_finished():
+        # 一次批量更新（executemany）本批证书路径，只更新奖项名称未变的奖项；
+        # 再用一条查询找出没有更新的（绘制期间被删除或修改），丢弃本次生成的文件，下次访问时重新生成
+        stale_paths = []
+        if finished_ids:
+            db.session.execute(
+                update(Award.__table__).where(
+                    Award.__table__.c.id == bindparam('award_id'),
+                    Award.__table__.c.award_name == bindparam('expected_name')
+                ).values(certificate_path=bindparam('new_path')),
+                [{'award_id': award_id, 'expected_name': awards[award_id][0], 'new_path': awards[award_id][2]}
+                 for award_id in finished_ids]
+            )
+            current_paths = dict(db.session.query(Award.id, Award.certificate_path).filter(Award.id.in_(finished_ids)))
+            for award_id in finished_ids:
+                _, old_path, relative_path = awards[award_id]
+                if current_paths.get(award_id) != relative_path:
+                    stale_paths.append(relative_path)
+                elif old_path and old_path != relative_path:
+                    stale_paths.append(old_path)
+        db.session.commit()
+        for stale_path in stale_paths:
+            remove_certificate_file(stale_path)
+        finished_ids.clear()
+        if progress_callback:
+            progress_callback(done, total)
+
+    workers = max(1, min(Config.CERTIFICATE_WORKERS, total))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for award_id in executor.map(render_certificate_file, tasks, chunksize=max(1, total // (workers * 4))):
+            finished_ids.append(award_id)
+            done += 1
+            if len(finished_ids) >= COMMIT_BATCH_SIZE:
+                flush_finished()
+    flush_finished()
+    return total
@@ -0,0 +1,273 @@
+"""
+项目附件分片上传
+大文件按固定大小分片依次上传，每片直接写入临时文件的对应位置（不经过表单解析，不在内存中缓冲整个文件）；
+断线后客户端查询已接收位置继续上传。文件的SHA-256在写入分片时顺带计算，全部接收后校验，移入内容寻址存储并生成 ProjectAttachment
+"""
+import hashlib
+import threading
+from datetime import timedelta
+from werkzeug.utils import secure_filename
+from config import Config
+from models import db, UploadSession, UploadSessionStatus, ProjectAttachment
+from utils.blob_store import blob_temp_dir, adopt_blob_file, get_or_create_blob
+from utils.file_handler import file_sha256
+from utils.timezone import beijing_now
+
+# 从请求体读取分片时的缓冲区大小
+READ_SIZE = 64 * 1024
+
+# 本进程中各上传会话的文件SHA-256计算进度 {会话ID: (已计算的字节数, sha256对象)}。
+# 哈希状态无法保存到数据库，分片落在其他工作进程时，下次由本进程处理该会话的请求从临时文件补算缺少的部分，
+# 每个进程对每个字节最多计算一次，完成上传时通常只需补算最后几片
+_upload_hashes = {}
+_upload_hashes_lock = threading.Lock()
+MAX_TRACKED_UPLOADS = 256  # 超过时丢弃最早的计算进度（之后按需从临时文件补算）
+
+
+class ChunkedUploadError(Exception):
+    """分片上传请求无效（message 返回给客户端，status 为HTTP状态码）"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset  # 偏移量不一致时返回服务端已接收的位置，客户端从该位置继续
+
+
+def _temp_path(upload):
+    """上传会话的临时文件路径"""
+    return blob_temp_dir() / f'upload_{upload.id}.part'
+
+
+def _upload_hash_at(upload_id, temp_path, size):
+    """返回该会话计算到 size 字节的SHA-256（副本，可继续更新）；本进程没有计算到该位置时从临时文件补算"""
+    with _upload_hashes_lock:
+        hashed_size, sha256 = _upload_hashes.get(upload_id, (0, None))
+        if sha256 is None or hashed_size > size:
+            hashed_size, sha256 = 0, hashlib.sha256()
+        else:
+            sha256 = sha256.copy()
+
+    if hashed_size < size:
+        with open(temp_path, 'rb') as f:
+            f.seek(hashed_size)
+            remaining = size - hashed_size
+            while remaining:
+                data = f.read(min(1024 * 1024, remaining))
+                if not data:
+                    raise ChunkedUploadError('上传会话已失效，请重新上传', status=410)
+                sha256.update(data)
+                remaining -= len(data)
+        _save_upload_hash(upload_id, size, sha256)
+    return sha256
+
+
+def _save_upload_hash(upload_id, size, sha256):
+    """记录会话计算到 size 字节的SHA-256（保存副本）"""
+    with _upload_hashes_lock:
+        if upload_id not in _upload_hashes and len(_upload_hashes) >= MAX_TRACKED_UPLOADS:
+            del _upload_hashes[next(iter(_upload_hashes))]
+        _upload_hashes[upload_id] = (size, sha256.copy())
+
+
+def _discard_upload_hash(upload_id):
+    """丢弃会话的SHA-256计算进度"""
+    with _upload_hashes_lock:
+        _upload_hashes.pop(upload_id, None)
+
+
+def upload_session_info(upload):
+    """返回给客户端的会话状态"""
+    return {
+        'upload_id': upload.id,
+        'filename': upload.original_filename,
+        'total_size': upload.total_size,
+        'chunk_size': upload.chunk_size,
+        'offset': upload.received_size,
+        'status': upload.status,
+        'attachment_id': upload.attachment_id,
+    }
+
+
+def create_upload_session(project, user, filename, total_size, expected_hash=None):
+    """
+    创建分片上传会话和对应的临时文件
+
+    Args:
+        project: 附件所属项目
+        user: 上传者
+        filename: 原始文件名
+        total_size: 文件大小（字节）
+        expected_hash: 文件SHA-256（可选，完成时校验）
+
+    Returns:
+        UploadSession
+    """
+    expire_stale_upload_sessions()
+
+    filename = filename or ''
+    file_type = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if file_type not in Config.CHUNKED_UPLOAD_EXTENSIONS:
+        raise ChunkedUploadError(f'不支持的文件类型：{file_type or "未知"}')
+    if not isinstance(total_size, int) or total_size <= 0:
+        raise ChunkedUploadError('文件大小无效')
+    if total_size > Config.CHUNKED_UPLOAD_MAX_SIZE:
+        raise ChunkedUploadError(f'文件不能超过{Config.CHUNKED_UPLOAD_MAX_SIZE // 1024 // 1024}MB')
+    if expected_hash is not None:
+        expected_hash = str(expected_hash).lower()
+        if len(expected_hash) != 64 or any(c not in '0123456789abcdef' for c in expected_hash):
+            raise ChunkedUploadError('文件哈希格式无效')
+
+    upload = UploadSession(
+        project_id=project.id,
+        user_id=user.id,
+        original_filename=secure_filename(filename),
+        file_type=file_type,
+        total_size=total_size,
+        chunk_size=Config.UPLOAD_CHUNK_SIZE,
+        received_size=0,
+        expected_hash=expected_hash,
+        status=UploadSessionStatus.UPLOADING
+    )
+    db.session.add(upload)
+    db.session.commit()
+
+    _temp_path(upload).touch()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, chunk_hash=None):
+    """
+    将一个分片写入临时文件
+
+    分片必须从已接收位置开始（重复发送已接收的分片或跳过分片都返回409和服务端的当前位置）；
+    除最后一片外，分片大小必须等于会话的 chunk_size。提供 chunk_hash 时校验分片的SHA-256；
+    写入的同时继续计算整个文件的SHA-256，完成上传时不再读取整个文件
+
+    Args:
+        upload: 上传会话
+        offset: 分片起始位置
+        stream: 请求体
+        length: 分片大小（Content-Length）
+        chunk_hash: 分片SHA-256（可选）
+
+    Returns:
+        写入后的已接收位置
+    """
+    if upload.status != UploadSessionStatus.UPLOADING:
+        raise ChunkedUploadError('上传已完成', status=409, offset=upload.received_size)
+    if offset != upload.received_size:
+        raise ChunkedUploadError('分片位置与已接收位置不一致', status=409, offset=upload.received_size)
+    expected_length = min(upload.chunk_size, upload.total_size - offset)
+    if length != expected_length:
+        raise ChunkedUploadError(f'分片大小应为{expected_length}字节')
+
+    temp_path = _temp_path(upload)
+    if not temp_path.exists():
+        raise ChunkedUploadError('上传会话已失效，请重新上传', status=410)
+
+    file_hash = _upload_hash_at(upload.id, temp_path, offset)
+    sha256 = hashlib.sha256()
+    written = 0
+    with open(temp_path, 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            sha256.update(data)
+            file_hash.update(data)
+            f.write(data)
+            written += len(data)
+    if written != length:
+        raise ChunkedUploadError('分片数据不完整，请重新发送该分片', offset=upload.received_size)
+    if chunk_hash and sha256.hexdigest() != chunk_hash.lower():
+        raise ChunkedUploadError('分片校验失败，请重新发送该分片', offset=upload.received_size)
+
+    # 只有已接收位置仍为 offset 时才前移，同一分片被并发重复发送时只记一次
+    updated = UploadSession.query.filter_by(id=upload.id, received_size=offset).update({
+        UploadSession.received_size: offset + length,
+        UploadSession.updated_at: beijing_now()
+    }, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(upload)
+    if not updated:
+        raise ChunkedUploadError('分片位置与已接收位置不一致', status=409, offset=upload.received_size)
+    _save_upload_hash(upload.id, upload.received_size, file_hash)
+    return upload.received_size
+
+
+def complete_upload(upload):
+    """
+    完成上传：校验大小和SHA-256，移入内容寻址存储并生成项目附件（重复调用时返回已生成的附件）
+
+    Returns:
+        ProjectAttachment
+    """
+    if upload.status == UploadSessionStatus.COMPLETED:
+        attachment = db.session.get(ProjectAttachment, upload.attachment_id) if upload.attachment_id else None
+        if attachment is None:
+            raise ChunkedUploadError('附件已被删除', status=410)
+        return attachment
+    if upload.received_size != upload.total_size:
+        raise ChunkedUploadError('文件尚未上传完整', status=409, offset=upload.received_size)
+
+    temp_path = _temp_path(upload)
+    if not temp_path.exists() or temp_path.stat().st_size != upload.total_size:
+        raise ChunkedUploadError('上传会话已失效，请重新上传', status=410)
+
+    content_hash = _upload_hash_at(upload.id, temp_path, upload.total_size).hexdigest()
+    if upload.expected_hash and content_hash != upload.expected_hash:
+        # 其他进程中的计算进度可能属于重新上传前的数据，校验失败时按整个文件重新计算一次
+        content_hash = file_sha256(temp_path)
+    if upload.expected_hash and content_hash != upload.expected_hash:
+        # 文件已损坏，丢弃已接收的数据，客户端需从头上传
+        _discard_upload_hash(upload.id)
+        upload.received_size = 0
+        db.session.commit()
+        raise ChunkedUploadError('文件校验失败，请重新上传', status=422, offset=0)
+
+    relative_path = adopt_blob_file(temp_path, content_hash)
+    attachment = ProjectAttachment(
+        project_id=upload.project_id,
+        filename=content_hash,
+        original_filename=upload.original_filename,
+        file_path=relative_path,
+        file_size=upload.total_size,
+        file_type=upload.file_type,
+        content_hash=content_hash,
+        blob=get_or_create_blob(content_hash, relative_path, upload.total_size)
+    )
+    db.session.add(attachment)
+    db.session.flush()
+    upload.status = UploadSessionStatus.COMPLETED
+    upload.attachment_id = attachment.id
+    db.session.commit()
+    _discard_upload_hash(upload.id)
+
+    from utils.text_extraction import enqueue_missing_text_extractions
+    enqueue_missing_text_extractions([(relative_path, upload.file_type)])
+    return attachment
+
+
+def cancel_upload(upload):
+    """取消上传：删除会话和临时文件（不提交事务）"""
+    temp_path = _temp_path(upload)
+    if temp_path.exists():
+        temp_path.unlink()
+    _discard_upload_hash(upload.id)
+    db.session.delete(upload)
+
+
+def expire_stale_upload_sessions():
+    """清理超过 UPLOAD_SESSION_TTL 未继续上传的会话及其临时文件，以及已完成的旧会话（不提交事务）"""
+    expire_before = beijing_now() - timedelta(seconds=Config.UPLOAD_SESSION_TTL)
+    for upload in UploadSession.query.filter(UploadSession.updated_at < expire_before).all():
+        temp_path = _temp_path(upload)
+        try:
+            if temp_path.exists():
+                temp_path.unlink()
+        except OSError:
+            continue
+        _discard_upload_hash(upload.id)
+        db.session.delete(upload)
@@ -4,7 +4,7 @@
 from functools import wraps
 from flask import abort, current_app, redirect, url_for, flash, session
 from flask_login import current_user
-from models import UserRole
+from models import UserRole, JudgeAssignment, TeamMember, ProjectMember
 
 def get_current_role():
     """获取当前session中的角色，如果没有则使用用户主角色"""
@@ -52,3 +52,19 @@ def judge_required(f):
     """要求评委角色"""
     return role_required(UserRole.JUDGE)(f)
 
+
+def can_access_project(user, project):
+    """
+    用户能否查看项目的材料（附件、奖状等），按用户拥有的全部角色判断：
+    校级管理员、项目推送学院的学院管理员、分配到该项目的评委、队伍成员或项目成员
+    """
+    roles = set(user.get_all_roles())
+    if UserRole.SCHOOL_ADMIN in roles:
+        return True
+    if UserRole.COLLEGE_ADMIN in roles and user.college and project.push_college == user.college:
+        return True
+    if UserRole.JUDGE in roles and JudgeAssignment.query.filter_by(
+            judge_id=user.id, project_id=project.id, is_active=True).first():
+        return True
+    return bool(TeamMember.query.filter_by(team_id=project.team_id, user_id=user.id).first()
+                or ProjectMember.query.filter_by(project_id=project.id, user_id=user.id).first())
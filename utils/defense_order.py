@@ -0,0 +1,260 @@
+"""
+答辩顺序抽签
+每个竞赛按决赛项目数预先生成 1..N 号抽签号（defense_slots），生成时为每个号随机分配抽取位置。
+抽签时用一条条件 UPDATE 领取抽取位置最靠前的未领取号（PostgreSQL 加 FOR UPDATE SKIP LOCKED，SQLite 写操作本身串行），
+请求中不再读取全部已抽取顺序再随机选择。defense_slots.project_id 唯一保证同一项目只领取一个号，
+projects 上 (competition_id, defense_order) 的部分唯一索引保证同一竞赛中答辩顺序不重复。
+抽签截止后仍未抽取的项目由定时任务（flask assign-defense-orders）一次性分配剩余抽签号。
+项目退出决赛（更新决赛名单）时释放其答辩顺序和抽签号，避免占用决赛项目的号
+"""
+import random
+from flask import current_app
+from sqlalchemy import select, update, func, exists, and_, or_
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import aliased
+from models import db, Competition, Project, DefenseSlot
+from utils.timezone import beijing_now
+
+# 领取抽签号冲突（并发领取、管理员同时调整顺序、SQLite 锁等待超时）时的重试次数
+CLAIM_ATTEMPTS = 10
+
+_random = random.SystemRandom()
+
+
+def final_project_count(competition_id):
+    """竞赛的决赛项目数"""
+    return Project.query.filter(Project.competition_id == competition_id, Project.is_final == True).count()
+
+
+def ensure_defense_slots(competition_id, slot_count):
+    """
+    补齐竞赛的抽签号到 slot_count 个（已有的号和抽取位置不变，新号的抽取位置随机），并提交事务
+    决赛名额调大后再次调用会追加新号；多个请求同时补齐时只有一个成功，其余忽略
+    """
+    max_order = db.session.query(func.max(DefenseSlot.defense_order)).filter(
+        DefenseSlot.competition_id == competition_id
+    ).scalar() or 0
+    if max_order >= slot_count:
+        db.session.commit()
+        return
+    try:
+        db.session.add_all([
+            DefenseSlot(competition_id=competition_id, defense_order=order, draw_position=_random.getrandbits(31))
+            for order in range(max_order + 1, slot_count + 1)
+        ])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+
+def _available_slot_filter(competition_id, slot_count, slot=DefenseSlot):
+    """可领取的抽签号：未被领取、不超过决赛项目数、且没有被管理员直接分配给其他项目"""
+    return and_(
+        slot.competition_id == competition_id,
+        slot.project_id.is_(None),
+        slot.defense_order <= slot_count,
+        ~exists().where(
+            Project.competition_id == competition_id,
+            Project.defense_order == slot.defense_order
+        )
+    )
+
+
+def claim_defense_order(project):
+    """
+    为决赛项目抽取答辩顺序（调用前须已检查权限和抽取时间），提交事务
+
+    Returns:
+        抽到的答辩顺序；项目已抽取过时返回原顺序；没有可用顺序时返回 None
+    """
+    project_id = project.id
+    competition_id = project.competition_id
+    if project.defense_order:
+        return project.defense_order
+
+    slot_count = final_project_count(competition_id)
+    ensure_defense_slots(competition_id, slot_count)
+
+    # 子查询使用别名，避免与外层 UPDATE 的 defense_slots 自动关联
+    slot = aliased(DefenseSlot)
+    for _ in range(CLAIM_ATTEMPTS):
+        candidate = select(slot.id).where(
+            _available_slot_filter(competition_id, slot_count, slot)
+        ).order_by(slot.draw_position, slot.id).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        try:
+            defense_order = db.session.execute(
+                update(DefenseSlot).where(DefenseSlot.id == candidate, DefenseSlot.project_id.is_(None))
+                .values(project_id=project_id, claimed_at=beijing_now())
+                .returning(DefenseSlot.defense_order)
+            ).scalar()
+            if defense_order is None:
+                db.session.rollback()
+                if not db.session.query(DefenseSlot.id).filter(_available_slot_filter(competition_id, slot_count)).first():
+                    break  # 没有可用顺序（或同一项目的另一次请求刚抽完最后一个号）
+                continue  # 候选号刚被其他请求领取
+
+            # 只有项目仍未抽取时才写入，同一队长重复提交时只有一次生效
+            updated = Project.query.filter(Project.id == project_id, Project.defense_order.is_(None)).update(
+                {Project.defense_order: defense_order}, synchronize_session=False
+            )
+            if not updated:
+                db.session.rollback()
+                break
+            db.session.commit()
+            db.session.refresh(project)
+            return defense_order
+        except (IntegrityError, OperationalError):
+            # 项目已领取过抽签号（重复提交）、该号被管理员同时分配给其他项目，或锁等待超时
+            db.session.rollback()
+            db.session.refresh(project)
+            if project.defense_order:
+                return project.defense_order
+
+    db.session.refresh(project)
+    return project.defense_order
+
+
+def sync_defense_slots(projects):
+    """管理员调整答辩顺序后，按项目当前的答辩顺序更新抽签号的领取情况（不提交事务）"""
+    projects = [project for project in projects if project is not None]
+    if not projects:
+        return
+    db.session.flush()
+    DefenseSlot.query.filter(DefenseSlot.project_id.in_([project.id for project in projects])).update(
+        {DefenseSlot.project_id: None, DefenseSlot.claimed_at: None}, synchronize_session=False
+    )
+    for project in projects:
+        if project.defense_order:
+            DefenseSlot.query.filter(
+                DefenseSlot.competition_id == project.competition_id,
+                DefenseSlot.defense_order == project.defense_order,
+                DefenseSlot.project_id.is_(None)
+            ).update({DefenseSlot.project_id: project.id, DefenseSlot.claimed_at: beijing_now()},
+                     synchronize_session=False)
+
+
+def release_non_final_defense_orders(competition_id):
+    """
+    释放竞赛中未进入决赛的项目的答辩顺序和抽签号（不提交事务），在更新决赛名单后调用
+
+    Returns:
+        释放答辩顺序的项目数
+    """
+    db.session.flush()
+    DefenseSlot.query.filter(
+        DefenseSlot.competition_id == competition_id,
+        DefenseSlot.project_id.isnot(None),
+        ~exists().where(Project.id == DefenseSlot.project_id, Project.is_final == True)
+    ).update({DefenseSlot.project_id: None, DefenseSlot.claimed_at: None}, synchronize_session=False)
+    released_count = Project.query.filter(
+        Project.competition_id == competition_id,
+        or_(Project.is_final.is_(None), Project.is_final == False),
+        Project.defense_order.isnot(None)
+    ).update({Project.defense_order: None}, synchronize_session=False)
+
+    # 批量更新不会同步会话中已加载的项目，使其在下次访问时重新加载
+    if released_count:
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, Project):
+                db.session.expire(obj, ['defense_order'])
+    return released_count
+
+
+def set_defense_order(project, defense_order):
+    """
+    管理员设置答辩顺序：新顺序已被其他项目使用时两者交换（不提交事务）
+    先清空再依次写入，避免交换过程中违反答辩顺序唯一索引
+    """
+    old_order = project.defense_order
+    existing = None
+    if defense_order:
+        existing = Project.query.filter(
+            Project.competition_id == project.competition_id,
+            Project.defense_order == defense_order,
+            Project.id != project.id
+        ).first()
+
+    project.defense_order = None
+    db.session.flush()
+    if existing:
+        # 交换位置：将B调整到A的原位置
+        existing.defense_order = old_order
+        db.session.flush()
+    project.defense_order = defense_order or None
+    sync_defense_slots([project, existing])
+
+
+def assign_remaining_defense_orders(competition_id):
+    """
+    为未抽取的决赛项目一次性分配剩余的答辩顺序：剩余抽签号随机打乱后批量写入，整个竞赛在一个事务中提交
+    与学生抽签、管理员调整同时发生时由唯一约束检测冲突，回滚后重新分配；
+    剩余抽签号不足时只分配能分配的项目，并记录警告
+
+    Returns:
+        分配的项目数
+    """
+    slot_count = final_project_count(competition_id)
+    if not slot_count:
+        return 0
+    # 先释放已退出决赛的项目仍占用的号
+    if release_non_final_defense_orders(competition_id):
+        db.session.commit()
+    ensure_defense_slots(competition_id, slot_count)
+
+    for _ in range(CLAIM_ATTEMPTS):
+        project_ids = [project_id for (project_id,) in db.session.query(Project.id).filter(
+            Project.competition_id == competition_id,
+            Project.is_final == True,
+            Project.defense_order.is_(None)
+        ).order_by(Project.id).with_for_update()]
+        if not project_ids:
+            db.session.commit()
+            return 0
+        slots = db.session.query(DefenseSlot.id, DefenseSlot.defense_order).filter(
+            _available_slot_filter(competition_id, slot_count)
+        ).with_for_update().all()
+        _random.shuffle(slots)
+        if len(slots) < len(project_ids):
+            current_app.logger.warning(
+                '竞赛 %s 剩余抽签号不足：%s 个决赛项目未抽取，只剩 %s 个可用的号',
+                competition_id, len(project_ids), len(slots)
+            )
+
+        assignments = list(zip(project_ids, slots))
+        now = beijing_now()
+        try:
+            db.session.execute(update(DefenseSlot), [
+                {'id': slot_id, 'project_id': project_id, 'claimed_at': now}
+                for project_id, (slot_id, _) in assignments
+            ])
+            db.session.execute(update(Project), [
+                {'id': project_id, 'defense_order': defense_order}
+                for project_id, (_, defense_order) in assignments
+            ])
+            db.session.commit()
+            return len(assignments)
+        except (IntegrityError, OperationalError):
+            # 分配期间有项目抽签或管理员调整了顺序
+            db.session.rollback()
+    return 0  # 多次冲突时留给下一次定时任务
+
+
+def assign_overdue_defense_orders(now=None):
+    """
+    为所有已过抽签截止时间、仍有项目未抽取的竞赛分配答辩顺序（供定时任务调用，见 flask assign-defense-orders）
+
+    Returns:
+        {竞赛ID: 分配的项目数}
+    """
+    now = now or beijing_now()
+    competition_ids = [competition_id for (competition_id,) in db.session.query(Competition.id).filter(
+        Competition.defense_order_end.isnot(None),
+        Competition.defense_order_end < now,
+        Competition.final_quota > 0,
+        exists().where(
+            Project.competition_id == Competition.id,
+            Project.is_final == True,
+            Project.defense_order.is_(None)
+        )
+    )]
+    return {competition_id: assign_remaining_defense_orders(competition_id) for competition_id in competition_ids}
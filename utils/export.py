@@ -1,8 +1,20 @@
 """
 数据导出工具
 """
+import csv
+import io
+import pickle
+import tempfile
 from io import BytesIO
-from models import Project, Team, User, Score, Award, ReviewStatus
+from urllib.parse import quote
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db, Project, Team, User, Score, Award, ReviewStatus, TeamMember, ProjectTrack, ProjectMember
+
+# 流式导出时每批从数据库读取的项目数
+EXPORT_BATCH_SIZE = 200
+# CSV 流式导出时每次输出的行数
+CSV_CHUNK_ROWS = 500
 
 # 延迟导入pandas，避免启动时的NumPy版本冲突
 def _import_pandas():
@@ -12,6 +24,90 @@ def _import_pandas():
     except ImportError as e:
         raise ImportError("pandas未安装或版本不兼容，无法使用导出功能") from e
 
+def build_school_projects_export_query(project_name='', competition_id=None, college=''):
+    """校级导出的项目查询：学校已通过的项目，按项目名称、竞赛、队长学院筛选，按项目ID排序"""
+    query = Project.query.filter(
+        Project.status == ReviewStatus.FINAL_APPROVED
+    )
+    
+    if project_name:
+        query = query.filter(Project.title.contains(project_name))
+    
+    if competition_id:
+        query = query.filter(Project.competition_id == competition_id)
+    
+    if college:
+        query = query.join(Team, Project.team_id == Team.id).join(User, Team.leader_id == User.id).filter(User.college.contains(college))
+    
+    return query.distinct().order_by(Project.id.asc())
+
+def with_project_export_options(query):
+    """为 export_projects_to_excel 预加载队伍、队长、成员、赛道和奖项，查询次数与项目数无关"""
+    return query.options(
+        joinedload(Project.team).joinedload(Team.leader),
+        joinedload(Project.team).selectinload(Team.member_list).joinedload(TeamMember.user),
+        selectinload(Project.track_list).joinedload(ProjectTrack.track),
+        selectinload(Project.award_list)
+    )
+
+def with_score_export_options(query):
+    """为 iter_score_rows 联表加载队伍（评分由 iter_export_projects 按 SCORE_EXPORT_COLLECTIONS 一次加载）"""
+    return query.options(
+        joinedload(Project.team)
+    )
+
+def with_detailed_export_options(query):
+    """为 iter_detailed_project_rows 联表加载队伍、队长和竞赛（集合关系由 iter_export_projects 按 DETAILED_EXPORT_COLLECTIONS 一次加载）"""
+    return query.options(
+        joinedload(Project.team).joinedload(Team.leader),
+        joinedload(Project.competition)
+    )
+
+# 导出时按整个项目查询一次加载的集合关系：(关系, 关联对象的联表加载选项)
+SCORE_EXPORT_COLLECTIONS = (
+    (Project.score_list, (joinedload(Score.judge),)),
+)
+DETAILED_EXPORT_COLLECTIONS = (
+    (Project.track_list, (joinedload(ProjectTrack.track),)),
+    (Project.award_list, ()),
+    (Project.external_award_list, ()),
+    (Project.member_list, (joinedload(ProjectMember.user),)),
+)
+
+def load_export_collections(query, collections):
+    """
+    按项目查询一次加载各集合关系（每个关系一条查询，用项目查询作为子查询筛选，与项目数和读取批次无关），
+    返回 attach(project)：将加载的集合设置到项目上并返回项目，之后访问这些关系不再查询数据库。
+    关联行全部保存在内存中（评分、成员等行数有限），项目本身仍可分批读取
+    """
+    project_ids = query.with_entities(Project.id).order_by(None).subquery()
+    loaded = []
+    for relationship, options in collections:
+        prop = relationship.property
+        model = prop.mapper.class_
+        foreign_key = prop.local_remote_pairs[0][1]
+        foreign_key_name = prop.mapper.get_property_by_column(foreign_key).key
+        order_by = list(prop.order_by or []) + list(prop.mapper.primary_key)
+        groups = {}
+        for item in model.query.options(*options).filter(
+            foreign_key.in_(db.select(project_ids.c.id))
+        ).order_by(*order_by):
+            groups.setdefault(getattr(item, foreign_key_name), []).append(item)
+        loaded.append((prop.key, groups))
+
+    def attach(project):
+        for key, groups in loaded:
+            set_committed_value(project, key, groups.get(project.id, []))
+        return project
+
+    return attach
+
+def iter_export_projects(query, collections, batch_size=EXPORT_BATCH_SIZE):
+    """逐批读取项目（每批 batch_size 个），集合关系由 load_export_collections 一次加载，查询次数与项目数无关"""
+    attach = load_export_collections(query, collections)
+    for project in query.yield_per(batch_size):
+        yield attach(project)
+
 def export_projects_to_excel(projects, filename='projects_export.xlsx'):
     """导出项目数据到Excel"""
     pd = _import_pandas()
@@ -19,15 +115,11 @@ def export_projects_to_excel(projects, filename='projects_export.xlsx'):
     for project in projects:
         team = project.team
         leader = team.leader
-        tracks = ', '.join([pt.track.name for pt in project.tracks])
-        members = ', '.join([tm.user.real_name for tm in team.members])
-        
-        # 计算平均分
-        scores = project.scores.all()
-        avg_score = sum(s.score_value for s in scores) / len(scores) if scores else None
+        tracks = ', '.join([pt.track.name for pt in project.track_list])
+        members = ', '.join([tm.user.real_name for tm in team.member_list])
         
         # 奖项
-        awards = ', '.join([a.award_name for a in project.awards])
+        awards = ', '.join([a.award_name for a in project.award_list])
         
         data.append({
             '项目ID': project.id,
@@ -44,7 +136,7 @@ def export_projects_to_excel(projects, filename='projects_export.xlsx'):
             '学院审核备注': project.college_review_comment,
             '校级审核备注': project.school_review_comment,
             '答辩顺序': project.defense_order,
-            '平均得分': avg_score,
+            '平均得分': project.score_avg,
             '奖项': awards,
             '创建时间': project.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             '更新时间': project.updated_at.strftime('%Y-%m-%d %H:%M:%S')
@@ -57,14 +149,14 @@ def export_projects_to_excel(projects, filename='projects_export.xlsx'):
     output.seek(0)
     return output
 
-def export_scores_to_excel(projects, filename='scores_export.xlsx'):
-    """导出评分数据到Excel"""
-    pd = _import_pandas()
-    data = []
+SCORE_COLUMNS = ['项目ID', '项目名称', '队伍名称', '评委', '总分', '创新性得分', '可行性得分',
+                 '社会价值得分', '展示效果得分', '评语', '评分时间']
+
+def iter_score_rows(projects):
+    """逐行生成评分导出数据（每条评分一行），projects 宜由 iter_export_projects 按 SCORE_EXPORT_COLLECTIONS 读取"""
     for project in projects:
-        scores = project.scores.all()
-        for score in scores:
-            data.append({
+        for score in project.score_list:
+            yield {
                 '项目ID': project.id,
                 '项目名称': project.title,
                 '队伍名称': project.team.name,
@@ -76,7 +168,12 @@ def export_scores_to_excel(projects, filename='scores_export.xlsx'):
                 '展示效果得分': score.presentation_score,
                 '评语': score.comment,
                 '评分时间': score.scored_at.strftime('%Y-%m-%d %H:%M:%S')
-            })
+            }
+
+def export_scores_to_excel(projects, filename='scores_export.xlsx'):
+    """导出评分数据到Excel"""
+    pd = _import_pandas()
+    data = list(iter_score_rows(projects))
     
     df = pd.DataFrame(data)
     output = BytesIO()
@@ -94,14 +191,16 @@ def export_to_csv(data, filename='export.csv'):
     output.seek(0)
     return output
 
-def export_detailed_projects_to_excel(projects, filename='detailed_projects_export.xlsx'):
-    """导出详细的项目数据到Excel，包含项目信息、成员信息等，每个成员一行"""
-    pd = _import_pandas()
-    from models import ProjectMember, ProjectAttachment, Score, Award, ExternalAward
-    
-    # 所有项目数据（每个成员一行）
-    projects_data = []
-    
+# 详细项目导出的全部列（与 iter_detailed_project_rows 生成的行一致）；CSV 按固定列流式输出，不删除空列
+DETAILED_PROJECT_COLUMNS = ['项目ID', '项目名称', '竞赛名称', '竞赛类型', '赛道', '作品推送学院', '项目组别', '作品类别',
+                            '项目领域', '项目描述', '项目创新点', '项目开发现状', '获奖、专利及论文情况',
+                            '队长姓名', '队长学工号', '队长学院', '队长联系方式', '队长邮箱',
+                            '指导教师姓名', '指导教师学工号', '指导教师单位', '指导教师联系方式',
+                            '是否进入决赛', '校赛奖项', '省赛/国赛奖状',
+                            '成员姓名', '成员学工号', '成员学院', '成员专业', '成员联系方式', '成员邮箱', '成员角色', '成员顺位']
+
+def iter_detailed_project_rows(projects):
+    """逐行生成详细项目导出数据（队长和每个成员各一行），projects 宜由 iter_export_projects 按 DETAILED_EXPORT_COLLECTIONS 读取"""
     for project in projects:
         team = project.team
         leader = team.leader
@@ -111,22 +210,22 @@ def export_detailed_projects_to_excel(projects, filename='detailed_projects_expo
         competition_type = project.competition.competition_type if project.competition else ''
         
         # 获取赛道信息
-        tracks = project.tracks.all()
+        tracks = project.track_list
         track_names = ', '.join([pt.track.name for pt in tracks]) if tracks else ''
         
         # 获取所有奖项（校赛奖项）
-        awards = project.awards.all()
+        awards = project.award_list
         award_names = ', '.join([a.award_name for a in awards]) if awards else ''
         
         # 获取省赛/国赛奖状
-        external_awards = project.external_awards.all()
+        external_awards = project.external_award_list
         external_award_info = []
         for ext_award in external_awards:
             external_award_info.append(f"{ext_award.award_level}-{ext_award.award_name}")
         external_award_names = ', '.join(external_award_info) if external_award_info else ''
         
         # 获取项目成员信息（包括队长和队员）
-        project_members = ProjectMember.query.filter_by(project_id=project.id).order_by(ProjectMember.order).all()
+        project_members = project.member_list
         
         # 基础项目信息（所有成员共享）
         base_project_info = {
@@ -169,7 +268,7 @@ def export_detailed_projects_to_excel(projects, filename='detailed_projects_expo
             '成员角色': '队长',
             '成员顺位': 1
         })
-        projects_data.append(leader_row)
+        yield leader_row
         
         # 添加项目成员（按顺位排序，每个成员一行）
         for pm in project_members:
@@ -199,12 +298,14 @@ def export_detailed_projects_to_excel(projects, filename='detailed_projects_expo
                     '成员角色': '队员',
                     '成员顺位': pm.order
                 })
-            projects_data.append(member_row)
-        
-        # 如果项目没有成员（只有队长），也要确保至少有一行
-        if not project_members:
-            # 队长行已经添加，不需要额外处理
-            pass
+            yield member_row
+
+def export_detailed_projects_to_excel(projects, filename='detailed_projects_export.xlsx'):
+    """导出详细的项目数据到Excel，包含项目信息、成员信息等，每个成员一行"""
+    pd = _import_pandas()
+    
+    # 所有项目数据（每个成员一行）
+    projects_data = list(iter_detailed_project_rows(projects))
     
     # 创建Excel文件，只有一个工作表
     output = BytesIO()
@@ -235,3 +336,117 @@ def export_detailed_projects_to_excel(projects, filename='detailed_projects_expo
     output.seek(0)
     return output
 
+def _spool_rows(rows):
+    """
+    将行数据逐行暂存到临时文件（内存占用与行数无关），同时找出至少有一个非空值的列
+    
+    Returns:
+        (临时文件, 非空列名列表)
+    """
+    spool = tempfile.TemporaryFile()
+    columns = {}  # 按首次出现顺序记录列名
+    non_empty_columns = set()
+    for row in rows:
+        for key, value in row.items():
+            columns.setdefault(key, None)
+            if value is not None and value != '':
+                non_empty_columns.add(key)
+        pickle.dump(row, spool, protocol=pickle.HIGHEST_PROTOCOL)
+    spool.seek(0)
+    return spool, [col for col in columns if col in non_empty_columns]
+
+def _read_spooled_rows(spool):
+    """逐行读取 _spool_rows 暂存的数据，读完后关闭临时文件"""
+    try:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                break
+    finally:
+        spool.close()
+
+def _prepare_stream_rows(rows, columns):
+    """未指定列时删除全为空的列（与 export_detailed_projects_to_excel 一致），需要先暂存一遍数据，读完全部数据后才能输出表头"""
+    if columns is not None:
+        return rows, columns
+    spool, columns = _spool_rows(rows)
+    return _read_spooled_rows(spool), columns
+
+def build_xlsx_file(rows, sheet_name, columns=None, output=None):
+    """
+    用 openpyxl 只写模式逐行写入Excel，工作簿落在临时文件中，内存占用不随行数增长
+    
+    Args:
+        rows: 行数据迭代器（dict）
+        sheet_name: 工作表名称
+        columns: 导出的列；为 None 时按行数据的列导出并删除全为空的列
+        output: 写入的文件路径或文件对象；为 None 时写入临时文件
+    
+    Returns:
+        output 为 None 时返回已定位到开头的临时文件对象，可直接交给 send_file 分块发送；否则返回 output
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    
+    rows, columns = _prepare_stream_rows(rows, columns)
+    
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    
+    # 表头样式与 pandas 导出保持一致
+    thin = Side(style='thin')
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(worksheet, value=col)
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal='center', vertical='top')
+        header.append(cell)
+    if header:
+        worksheet.append(header)
+    
+    for row in rows:
+        worksheet.append([row.get(col) for col in columns])
+    
+    if output is not None:
+        workbook.save(output)
+        return output
+    
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+def iter_csv_chunks(rows, columns=None):
+    """
+    分块生成CSV内容（UTF-8 带 BOM，便于 Excel 打开），可直接作为流式响应体
+    
+    Args:
+        rows: 行数据迭代器（dict）
+        columns: 导出的列；为 None 时按行数据的列导出并删除全为空的列（需读完全部数据才开始输出，流式导出应指定列）
+    """
+    rows, columns = _prepare_stream_rows(rows, columns)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+    
+    buffer.seek(0)
+    buffer.truncate()
+    row_count = 0
+    for row in rows:
+        writer.writerow(['' if row.get(col) is None else row.get(col) for col in columns])
+        row_count += 1
+        if row_count % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def attachment_header(filename):
+    """生成支持中文文件名的 Content-Disposition 响应头"""
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
@@ -0,0 +1,340 @@
+"""
+后台导出任务
+导出请求写入 export_jobs 表后交给进程池执行，Web 请求立即返回任务ID；
+前端轮询任务状态，完成后从导出目录下载文件。相同条件的导出在有效期内复用已生成的文件
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import update
+from config import Config
+from models import db, Project, ExportJob, ExportJobStatus
+from utils.timezone import beijing_now
+
+EXPORT_JOB_TYPES = ('projects', 'scores', 'assessment', 'certificates')
+EXPORT_FORMATS = ('xlsx', 'csv')
+
+# 每次执行结果都可能不同的任务（如发布证书会生成新设置奖项的证书），不复用已完成任务的文件
+NON_REUSABLE_JOB_TYPES = ('certificates',)
+
+# 后台任务中分批读取项目的数量，每批处理完更新一次进度
+JOB_BATCH_SIZE = 200
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """获取导出进程池（按需创建；使用 spawn 启动子进程，避免继承 Web 进程的数据库连接和线程）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=Config.EXPORT_JOB_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _reset_executor():
+    """进程池异常退出后丢弃，下次提交时重新创建"""
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def normalize_export_params(job_type, args):
+    """
+    从请求参数中提取导出参数（只保留该导出类型使用的参数，并统一默认值），保证相同导出得到相同参数
+
+    Args:
+        job_type: 导出类型
+        args: 请求参数（request.args）
+    """
+    export_format = (args.get('format') or 'xlsx').lower()
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'xlsx'
+
+    if job_type == 'projects':
+        return {
+            'project_name': (args.get('project_name') or '').strip(),
+            'competition_id': args.get('competition_id', type=int),
+            'college': (args.get('college') or '').strip(),
+            'format': export_format,
+        }
+    if job_type == 'scores':
+        return {'format': export_format}
+    if job_type == 'assessment':
+        return {'year': args.get('year', type=int) or datetime.now().year}
+    if job_type == 'certificates':
+        return {'competition_id': args.get('competition_id', type=int)}
+    raise ValueError(f'不支持的导出类型：{job_type}')
+
+
+def _params_hash(job_type, params):
+    """导出类型+参数的哈希"""
+    payload = json.dumps([job_type, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_export_file_path(job):
+    """导出文件的绝对路径（不存在时返回 None）"""
+    if not job.file_path:
+        return None
+    file_path = Path(Config.EXPORT_FOLDER) / job.file_path
+    return file_path if file_path.exists() else None
+
+
+def expire_stale_jobs():
+    """将超时未完成的任务标记为失败，并清理超过保留时间的导出文件（不提交事务）"""
+    now = beijing_now()
+
+    timeout_before = now - timedelta(seconds=Config.EXPORT_JOB_TIMEOUT)
+    ExportJob.query.filter(
+        ExportJob.status.in_([ExportJobStatus.PENDING, ExportJobStatus.RUNNING]),
+        ExportJob.created_at < timeout_before
+    ).update({
+        ExportJob.status: ExportJobStatus.FAILED,
+        ExportJob.error_message: '导出超时',
+        ExportJob.finished_at: now
+    }, synchronize_session=False)
+
+    retention_before = now - timedelta(seconds=Config.EXPORT_RETENTION_SECONDS)
+    expired_jobs = ExportJob.query.filter(
+        ExportJob.status == ExportJobStatus.FINISHED,
+        ExportJob.finished_at < retention_before
+    ).all()
+    for job in expired_jobs:
+        file_path = get_export_file_path(job)
+        if file_path:
+            try:
+                file_path.unlink()
+            except OSError:
+                continue
+        job.status = ExportJobStatus.EXPIRED
+        job.file_path = None
+
+
+def submit_export_job(job_type, params, user_id=None):
+    """
+    提交导出任务：相同条件的任务正在执行时直接返回该任务，有效期内已完成的直接复用其文件，否则新建任务交给进程池
+
+    Returns:
+        ExportJob: 导出任务
+    """
+    params_hash = _params_hash(job_type, params)
+
+    expire_stale_jobs()
+    db.session.commit()
+
+    job = ExportJob.query.filter(
+        ExportJob.job_type == job_type,
+        ExportJob.params_hash == params_hash,
+        ExportJob.status.in_([ExportJobStatus.PENDING, ExportJobStatus.RUNNING])
+    ).order_by(ExportJob.id.desc()).first()
+    if job:
+        return job
+
+    reuse_after = beijing_now() - timedelta(seconds=Config.EXPORT_REUSE_SECONDS)
+    job = ExportJob.query.filter(
+        ExportJob.job_type == job_type,
+        ExportJob.params_hash == params_hash,
+        ExportJob.status == ExportJobStatus.FINISHED,
+        ExportJob.finished_at >= reuse_after
+    ).order_by(ExportJob.id.desc()).first()
+    if job and get_export_file_path(job) and job_type not in NON_REUSABLE_JOB_TYPES:
+        return job
+
+    job = ExportJob(
+        job_type=job_type,
+        params=json.dumps(params, ensure_ascii=False),
+        params_hash=params_hash,
+        status=ExportJobStatus.PENDING,
+        progress=0,
+        created_by=user_id
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    try:
+        try:
+            _get_executor().submit(run_export_job, job.id)
+        except BrokenProcessPool:
+            _reset_executor()
+            _get_executor().submit(run_export_job, job.id)
+    except Exception as e:
+        job.status = ExportJobStatus.FAILED
+        job.error_message = f'提交导出任务失败：{str(e)}'
+        job.finished_at = beijing_now()
+        db.session.commit()
+    return job
+
+
+def run_export_job(job_id):
+    """进程池入口：在子进程中创建应用上下文并执行导出任务"""
+    from app import app
+
+    with app.app_context():
+        execute_export_job(job_id)
+        db.session.remove()
+
+
+def execute_export_job(job_id):
+    """执行导出任务（需在应用上下文中调用），文件先写入临时文件，完成后再重命名"""
+    job = db.session.get(ExportJob, job_id)
+    if job is None or job.status != ExportJobStatus.PENDING:
+        return
+
+    job.status = ExportJobStatus.RUNNING
+    job.started_at = beijing_now()
+    db.session.commit()
+
+    export_dir = Path(Config.EXPORT_FOLDER)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    params = json.loads(job.params)
+    builder = _EXPORT_BUILDERS[job.job_type]
+    extension = 'zip' if job.job_type == 'certificates' else params.get('format', 'xlsx')
+    relative_path = f'{job.id}_{job.job_type}.{extension}'
+    temp_path = export_dir / f'{relative_path}.part'
+
+    try:
+        file_name = builder(job, params, temp_path)
+        os.replace(temp_path, export_dir / relative_path)
+    except Exception as e:
+        db.session.rollback()
+        if temp_path.exists():
+            temp_path.unlink()
+        job = db.session.get(ExportJob, job_id)
+        job.status = ExportJobStatus.FAILED
+        job.error_message = str(e)
+        job.finished_at = beijing_now()
+        db.session.commit()
+        return
+
+    job = db.session.get(ExportJob, job_id)
+    job.status = ExportJobStatus.FINISHED
+    job.progress = 100
+    job.file_name = file_name
+    job.file_path = relative_path
+    job.finished_at = beijing_now()
+    db.session.commit()
+
+
+def _iter_projects_with_progress(job, query):
+    """
+    按项目ID分批读取项目（每批查询完即释放游标），每批处理完提交一次任务进度
+    query 需按 Project.id 升序排序。进度用单独的连接提交，不会使会话中已加载的项目和关联数据过期
+    （关联数据由 load_export_collections 在开始时一次加载）
+    """
+    job_id = job.id
+    total = query.order_by(None).count() or 1
+    processed = 0
+    last_id = 0
+    while True:
+        batch = query.filter(Project.id > last_id).limit(JOB_BATCH_SIZE).all()
+        if not batch:
+            break
+        for project in batch:
+            yield project
+        processed += len(batch)
+        last_id = batch[-1].id
+
+        with db.engine.begin() as connection:
+            connection.execute(update(ExportJob).where(ExportJob.id == job_id).values(
+                progress=min(99, processed * 100 // total)
+            ))
+
+
+def _write_rows(rows, params, file_path, sheet_name, columns=None):
+    """按导出格式将行数据写入文件"""
+    from utils.export import build_xlsx_file, iter_csv_chunks
+
+    if params.get('format') == 'csv':
+        with open(file_path, 'wb') as f:
+            for chunk in iter_csv_chunks(rows, columns):
+                f.write(chunk)
+    else:
+        build_xlsx_file(rows, sheet_name, columns, output=str(file_path))
+
+
+def _build_projects_export(job, params, file_path):
+    """全校项目数据导出"""
+    from utils.export import (build_school_projects_export_query, with_detailed_export_options, iter_detailed_project_rows,
+                              load_export_collections, DETAILED_PROJECT_COLUMNS, DETAILED_EXPORT_COLLECTIONS)
+
+    query = build_school_projects_export_query(params['project_name'], params['competition_id'], params['college'])
+    attach = load_export_collections(query, DETAILED_EXPORT_COLLECTIONS)
+    projects = map(attach, _iter_projects_with_progress(job, with_detailed_export_options(query)))
+    # CSV 按固定列逐行写入；Excel 删除全为空的列
+    columns = DETAILED_PROJECT_COLUMNS if params.get('format') == 'csv' else None
+    _write_rows(iter_detailed_project_rows(projects), params, file_path, '项目数据', columns)
+    return f'全校项目数据导出_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{params["format"]}'
+
+
+def _build_scores_export(job, params, file_path):
+    """评分数据导出"""
+    from utils.export import with_score_export_options, iter_score_rows, load_export_collections, SCORE_COLUMNS, SCORE_EXPORT_COLLECTIONS
+
+    query = Project.query.order_by(Project.id.asc())
+    attach = load_export_collections(query, SCORE_EXPORT_COLLECTIONS)
+    projects = map(attach, _iter_projects_with_progress(job, with_score_export_options(query)))
+    _write_rows(iter_score_rows(projects), params, file_path, '评分数据', SCORE_COLUMNS)
+    return f'scores_export.{params["format"]}'
+
+
+def _build_assessment_export(job, params, file_path):
+    """年度考核数据导出"""
+    from utils.assessment import build_assessment_workbook
+
+    output = build_assessment_workbook(params['year'])
+    with open(file_path, 'wb') as f:
+        f.write(output.getvalue())
+    return f'考核数据_{params["year"]}年度.xlsx'
+
+
+def _build_certificates_export(job, params, file_path):
+    """发布证书：用进程池生成比赛中还没有生成或内容已变化的证书，清理旧证书，再将该比赛的全部证书打包下载"""
+    import zipfile
+    from models import Award
+    from utils.certificate import remove_stale_certificates
+    from utils.certificate_jobs import issue_certificates
+
+    job_id = job.id
+
+    def update_progress(done, total):
+        # 生成证书占前90%进度，打包占剩余部分
+        job = db.session.get(ExportJob, job_id)
+        job.progress = done * 90 // total
+        db.session.commit()
+
+    issue_certificates(params['competition_id'], update_progress)
+    remove_stale_certificates()
+
+    query = db.session.query(Award.certificate_path, Award.award_name, Project.title).join(
+        Project, Award.project_id == Project.id
+    ).filter(Award.certificate_path.isnot(None))
+    if params['competition_id']:
+        query = query.filter(Project.competition_id == params['competition_id'])
+
+    cert_dir = Path(Config.CERTIFICATE_FOLDER)
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_STORED) as archive:
+        # 证书图片已经压缩过，打包时不再压缩
+        for certificate_path, award_name, project_title in query.order_by(Award.id):
+            source = cert_dir / certificate_path
+            if source.exists():
+                archive.write(source, f'{project_title}+{award_name}{source.suffix}'.replace('/', '_'))
+    return f'证书_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+
+
+_EXPORT_BUILDERS = {
+    'projects': _build_projects_export,
+    'scores': _build_scores_export,
+    'assessment': _build_assessment_export,
+    'certificates': _build_certificates_export,
+}
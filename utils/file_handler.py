@@ -2,6 +2,14 @@
 文件处理工具
 """
 import os
+import hashlib
+import mimetypes
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import quote
+from flask import Response, send_file, abort, request
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from config import Config
 from pathlib import Path
@@ -11,10 +19,33 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def save_uploaded_file(file, subfolder=''):
-    """保存上传的文件"""
+def save_uploaded_file(file, subfolder='', extract_text=False, content_addressed=False):
+    """
+    保存上传的文件
+    
+    extract_text 为 True 时，PDF、DOCX 保存后提交后台文本提取任务（见 utils.text_extraction），不等待完成；
+    content_addressed 为 True 时按内容哈希保存到内容寻址存储（忽略 subfolder，见 utils.blob_store），
+    内容相同的文件只保存一份，调用方需用 get_or_create_blob 为附件关联文件记录
+    """
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
+        
+        if content_addressed:
+            from utils.blob_store import store_blob
+            blob_info = store_blob(file)
+            file_type = os.path.splitext(filename)[1][1:].lower()
+            if extract_text:
+                from utils.text_extraction import enqueue_missing_text_extractions
+                enqueue_missing_text_extractions([(blob_info['file_path'], file_type)])
+            return {
+                'filename': blob_info['content_hash'],
+                'original_filename': filename,
+                'file_path': blob_info['file_path'],
+                'file_size': blob_info['file_size'],
+                'file_type': file_type,
+                'content_hash': blob_info['content_hash']
+            }
+        
         # 生成唯一文件名
         from datetime import datetime
         import uuid
@@ -35,15 +66,58 @@ def save_uploaded_file(file, subfolder=''):
         relative_path = file_path.relative_to(Config.UPLOAD_FOLDER)
         file_path_str = str(relative_path).replace('\\', '/')
         
+        if extract_text:
+            from utils.text_extraction import enqueue_text_extraction
+            enqueue_text_extraction(file_path_str, ext[1:].lower())
+        
         return {
             'filename': unique_filename,
             'original_filename': filename,
             'file_path': file_path_str,
             'file_size': os.path.getsize(file_path),
-            'file_type': ext[1:].lower()
+            'file_type': ext[1:].lower(),
+            'content_hash': file_sha256(file_path)
         }
     return None
 
+# 文件类型 -> (MIME类型, 是否在浏览器中在线预览)
+FILE_TYPE_DELIVERY = {
+    'pdf': ('application/pdf', True),
+    'jpg': ('image/jpeg', True),
+    'jpeg': ('image/jpeg', True),
+    'png': ('image/png', True),
+    'gif': ('image/gif', True),
+    'doc': ('application/msword', False),
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', False),
+    'zip': ('application/zip', False),
+    'rar': ('application/x-rar-compressed', False),
+    # 以下类型只能分片上传（见 Config.CHUNKED_UPLOAD_EXTENSIONS），内容寻址存储中的文件没有扩展名，需按类型确定MIME类型
+    'ppt': ('application/vnd.ms-powerpoint', False),
+    'pptx': ('application/vnd.openxmlformats-officedocument.presentationml.presentation', False),
+    'mp4': ('video/mp4', True),
+    'mov': ('video/quicktime', False),
+}
+
+def resolve_file_type(attachment, file_path):
+    """确定文件类型：优先使用附件的 file_type，其次从 original_filename 推断，最后使用文件扩展名"""
+    if attachment:
+        if attachment.file_type:
+            return attachment.file_type.lower()
+        if attachment.original_filename:
+            # original_filename 可能本身就是类型名（如 'png'）
+            return attachment.original_filename.rsplit('.', 1)[-1].lower()
+    file_ext = os.path.splitext(file_path)[1]
+    return file_ext[1:].lower() if file_ext else None
+
+def get_file_delivery(file_type, file_path):
+    """
+    返回 (MIME类型, 是否在线预览)；不在 FILE_TYPE_DELIVERY 中的类型按文件名推断MIME类型，不在线预览
+    """
+    if file_type in FILE_TYPE_DELIVERY:
+        return FILE_TYPE_DELIVERY[file_type]
+    mimetype, _ = mimetypes.guess_type(file_path)
+    return mimetype or 'application/octet-stream', False
+
 def get_file_preview_url(file_path, file_type):
     """获取文件预览URL"""
     # 对于图片，直接返回URL
@@ -56,3 +130,80 @@ def get_file_preview_url(file_path, file_type):
     else:
         return None
 
+
+def file_sha256(file_path):
+    """分块计算文件内容的SHA-256"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+@lru_cache(maxsize=1024)
+def _cached_file_sha256(file_path, mtime_ns, size):
+    return file_sha256(file_path)
+
+def get_content_hash(file_path):
+    """没有保存内容哈希的文件（如证书）按修改时间和大小缓存其SHA-256，文件被重新生成后自动重新计算"""
+    stat = os.stat(file_path)
+    return _cached_file_sha256(file_path, stat.st_mtime_ns, stat.st_size)
+
+# 按MIME类型的缓存策略（文件都需要登录访问，只允许浏览器缓存）；过期后凭ETag重新验证，未变化时返回304
+CACHE_CONTROL_POLICIES = {
+    'application/pdf': 'private, max-age=3600',
+    'image/': 'private, max-age=3600',
+}
+DEFAULT_CACHE_CONTROL = 'private, no-cache'
+
+def get_cache_control(mimetype):
+    """获取MIME类型对应的 Cache-Control（精确匹配优先，其次按主类型匹配）"""
+    mimetype = mimetype or ''
+    if mimetype in CACHE_CONTROL_POLICIES:
+        return CACHE_CONTROL_POLICIES[mimetype]
+    return CACHE_CONTROL_POLICIES.get(mimetype.split('/', 1)[0] + '/', DEFAULT_CACHE_CONTROL)
+
+def send_protected_file(directory, relative_path, internal_location, mimetype=None, as_attachment=False,
+                        download_name=None, etag=None, cache_control=None):
+    """
+    发送需要权限检查的文件（调用前须已完成权限检查）
+    
+    响应带内容哈希生成的强ETag和按MIME类型的 Cache-Control，支持 If-None-Match / If-Modified-Since（304）和 Range（206）。
+    开启 USE_X_ACCEL_REDIRECT 时条件请求仍由Flask直接返回304，其余只返回 X-Accel-Redirect 响应头，
+    由nginx的internal location用sendfile发送文件（Range由nginx处理），不占用Gunicorn工作进程；否则由Flask发送
+    
+    Args:
+        directory: 文件所在目录（上传目录或证书目录）
+        relative_path: 相对于 directory 的路径（正斜杠）
+        internal_location: nginx中对应 directory 的 internal location，如 Config.UPLOADS_INTERNAL_LOCATION
+        mimetype: MIME类型
+        as_attachment: 是否作为附件下载
+        download_name: 下载文件名（默认使用文件名）
+        etag: 文件内容的SHA-256（默认按文件计算，见 get_content_hash）
+        cache_control: Cache-Control（默认按MIME类型，见 get_cache_control）
+    """
+    file_path = safe_join(str(directory), relative_path)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(404)
+    
+    etag = etag or get_content_hash(file_path)
+    cache_control = cache_control or get_cache_control(mimetype)
+    
+    if not Config.USE_X_ACCEL_REDIRECT:
+        response = send_file(file_path, mimetype=mimetype, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True, etag=etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    
+    last_modified = datetime.fromtimestamp(os.path.getmtime(file_path), tz=timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = Response(mimetype=mimetype or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{internal_location.rstrip('/')}/{quote(relative_path)}"
+        disposition = 'attachment' if as_attachment else 'inline'
+        filename = download_name or os.path.basename(relative_path)
+        response.headers['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
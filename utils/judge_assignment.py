@@ -0,0 +1,148 @@
+"""
+批量分配评委
+按竞赛为每个项目分配 k 名评委：评委不能来自项目的推送学院（回避），在满足回避的前提下使各评委的评审数量尽量平均。
+先处理可选评委最少的项目，每个项目选择当前负载最小的评委（负载相同按评委池中的顺序），
+已有的分配计入项目的评委数和评委负载，不会重复分配；生成的分配一次性批量写入。
+分配方案带有指纹，确认分配时重新计算方案并核对指纹，与预览的方案不同（如期间项目或评委发生变化）时不写入
+"""
+import hashlib
+import heapq
+import json
+from sqlalchemy import insert, update, or_, exists
+from models import db, User, UserRole, UserRoleAssignment, Project, JudgeAssignment, ReviewStatus
+
+# 参与专家评审的项目状态：已通过学校审核（与专家评审页一致）
+ASSIGNABLE_STATUS = ReviewStatus.FINAL_APPROVED
+
+# 每个项目的评委数上限
+MAX_JUDGES_PER_PROJECT = 20
+
+
+def active_judges_query():
+    """所有可用评委（主角色为评委，或通过额外角色拥有评委身份的已启用用户），一次查询"""
+    return User.query.filter(
+        User.is_active == True,
+        or_(
+            User.role == UserRole.JUDGE,
+            exists().where(UserRoleAssignment.user_id == User.id, UserRoleAssignment.role == UserRole.JUDGE)
+        )
+    ).order_by(User.id)
+
+
+def _conflicts(judge, push_college):
+    """评委是否需要回避：评委的学院或单位与项目的推送学院相同"""
+    return bool(push_college) and push_college in (judge['college'], judge['unit'])
+
+
+def plan_judge_assignments(competition_id, judge_ids, judges_per_project):
+    """
+    计算分配方案（不写入数据库）
+
+    Args:
+        competition_id: 竞赛ID
+        judge_ids: 评委池（评委ID列表，列表顺序作为负载相同时的选择顺序；非评委或已停用的用户被忽略）
+        judges_per_project: 每个项目的评委数（含已分配的评委）
+
+    Returns:
+        {
+            'assignments': [(项目ID, 评委ID), ...]（新增的分配）,
+            'reactivate': [(分配ID, 项目ID, 评委ID), ...]（已停用、重新启用的分配）,
+            'shortfalls': {项目ID: 缺少的评委数}（可选评委不足的项目）,
+            'judge_loads': {评委ID: 分配后的本竞赛评审数量},
+            'project_count': 参与分配的项目数,
+            'fingerprint': 分配方案指纹（见 plan_fingerprint）,
+        }
+    """
+    judges_per_project = max(1, min(judges_per_project, MAX_JUDGES_PER_PROJECT))
+    judge_ids = list(dict.fromkeys(judge_ids))
+    pool = {
+        judge_id: {'college': college, 'unit': unit}
+        for judge_id, college, unit in active_judges_query().filter(User.id.in_(judge_ids)).with_entities(
+            User.id, User.college, User.unit
+        )
+    } if judge_ids else {}
+    pool_order = [judge_id for judge_id in judge_ids if judge_id in pool]
+    rank = {judge_id: index for index, judge_id in enumerate(pool_order)}
+
+    projects = db.session.query(Project.id, Project.push_college).filter(
+        Project.competition_id == competition_id,
+        Project.status == ASSIGNABLE_STATUS
+    ).order_by(Project.id).all()
+
+    # 本竞赛已有的分配：启用的计入评委数和负载，停用的可以重新启用
+    assigned = {project_id: set() for project_id, _ in projects}
+    inactive = {}
+    loads = {judge_id: 0 for judge_id in pool_order}
+    existing = db.session.query(
+        JudgeAssignment.id, JudgeAssignment.project_id, JudgeAssignment.judge_id, JudgeAssignment.is_active
+    ).join(
+        Project, Project.id == JudgeAssignment.project_id
+    ).filter(Project.competition_id == competition_id)
+    for assignment_id, project_id, judge_id, is_active in existing:
+        if not is_active:
+            inactive[(project_id, judge_id)] = assignment_id
+            continue
+        if project_id in assigned:
+            assigned[project_id].add(judge_id)
+        if judge_id in loads:
+            loads[judge_id] += 1
+
+    # 每个项目的可选评委：未分配且无需回避
+    candidates = {
+        project_id: [judge_id for judge_id in pool_order
+                     if judge_id not in assigned[project_id] and not _conflicts(pool[judge_id], push_college)]
+        for project_id, push_college in projects
+    }
+
+    assignments = []
+    reactivate = []
+    shortfalls = {}
+    # 可选评委少的项目先分配，避免其可选评委被其他项目占满
+    for project_id, _ in sorted(projects, key=lambda p: (len(candidates[p[0]]), p[0])):
+        needed = judges_per_project - len(assigned[project_id])
+        if needed <= 0:
+            continue
+        chosen = heapq.nsmallest(needed, candidates[project_id], key=lambda judge_id: (loads[judge_id], rank[judge_id]))
+        for judge_id in chosen:
+            loads[judge_id] += 1
+            if (project_id, judge_id) in inactive:
+                reactivate.append((inactive[(project_id, judge_id)], project_id, judge_id))
+            else:
+                assignments.append((project_id, judge_id))
+        if len(chosen) < needed:
+            shortfalls[project_id] = needed - len(chosen)
+
+    return {
+        'assignments': assignments,
+        'reactivate': reactivate,
+        'shortfalls': shortfalls,
+        'judge_loads': loads,
+        'project_count': len(projects),
+        'fingerprint': plan_fingerprint(assignments, reactivate),
+    }
+
+
+def plan_fingerprint(assignments, reactivate):
+    """分配方案指纹：由新增和重新启用的分配计算，预览页随表单提交，确认分配时用于核对方案是否与预览一致"""
+    payload = json.dumps([sorted(assignments), sorted(reactivate)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def apply_judge_assignments(plan):
+    """
+    写入分配方案：新增的分配一次批量插入，停用的分配一次批量重新启用，并提交事务
+
+    Returns:
+        写入的分配数
+    """
+    if plan['assignments']:
+        db.session.execute(insert(JudgeAssignment), [
+            {'project_id': project_id, 'judge_id': judge_id, 'is_active': True}
+            for project_id, judge_id in plan['assignments']
+        ])
+    if plan['reactivate']:
+        db.session.execute(update(JudgeAssignment), [
+            {'id': assignment_id, 'is_active': True} for assignment_id, _, _ in plan['reactivate']
+        ])
+    db.session.commit()
+    return len(plan['assignments']) + len(plan['reactivate'])
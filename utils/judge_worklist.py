@@ -0,0 +1,114 @@
+"""
+评委评审清单
+一条联表查询返回评委被分配的项目及列表页需要的全部字段：项目名称、简介摘要、竞赛、队伍名、附件数，
+以及该评委自己的评分、评分版本号（保存评分时用于并发检查）和评分更新时间；
+总数用窗口函数在同一查询中统计，分页和筛选都在数据库中完成
+"""
+from sqlalchemy import select, func
+from models import db, JudgeAssignment, Project, Competition, Team, Score, ProjectAttachment
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+# 列表中简介的摘要长度（多取一个字符用于判断是否需要省略号）
+DESCRIPTION_PREVIEW_LENGTH = 50
+
+
+def judge_worklist(judge_id, competition_id=None, unscored_only=False, page=1, per_page=DEFAULT_PER_PAGE):
+    """
+    评委的评审清单（按分配顺序）
+
+    Args:
+        judge_id: 评委ID
+        competition_id: 只返回该竞赛的项目（为空时返回全部）
+        unscored_only: 只返回该评委尚未评分的项目
+        page: 页码（从1开始）
+        per_page: 每页数量（不超过 MAX_PER_PAGE）
+
+    Returns:
+        {'items': [...], 'total': 总数, 'page': 页码, 'per_page': 每页数量, 'pages': 总页数}
+    """
+    page = max(page or 1, 1)
+    per_page = min(max(per_page or DEFAULT_PER_PAGE, 1), MAX_PER_PAGE)
+
+    attachment_count = select(func.count(ProjectAttachment.id)).where(
+        ProjectAttachment.project_id == Project.id
+    ).correlate(Project).scalar_subquery()
+
+    query = db.session.query(
+        Project.id,
+        Project.title,
+        func.substr(Project.description, 1, DESCRIPTION_PREVIEW_LENGTH + 1).label('description'),
+        Competition.id.label('competition_id'),
+        Competition.name.label('competition_name'),
+        Team.name.label('team_name'),
+        attachment_count.label('attachment_count'),
+        Score.score_value,
+        Score.version.label('score_version'),
+        Score.updated_at.label('score_updated_at'),
+        func.count().over().label('total')
+    ).select_from(JudgeAssignment).join(
+        Project, Project.id == JudgeAssignment.project_id
+    ).join(
+        Competition, Competition.id == Project.competition_id
+    ).join(
+        Team, Team.id == Project.team_id
+    ).outerjoin(
+        Score, (Score.project_id == Project.id) & (Score.judge_id == judge_id)
+    ).filter(
+        JudgeAssignment.judge_id == judge_id,
+        JudgeAssignment.is_active == True
+    )
+
+    if competition_id:
+        query = query.filter(Project.competition_id == competition_id)
+    if unscored_only:
+        query = query.filter(Score.id.is_(None))
+
+    rows = query.order_by(JudgeAssignment.id).limit(per_page).offset((page - 1) * per_page).all()
+    if rows:
+        total = rows[0].total
+    elif page > 1:
+        # 页码超出范围时窗口函数没有结果行，单独统计总数
+        total = query.with_entities(func.count(JudgeAssignment.id)).scalar()
+    else:
+        total = 0
+
+    items = []
+    for row in rows:
+        description = row.description or ''
+        if len(description) > DESCRIPTION_PREVIEW_LENGTH:
+            description = description[:DESCRIPTION_PREVIEW_LENGTH] + '...'
+        items.append({
+            'project_id': row.id,
+            'title': row.title,
+            'description': description,
+            'competition_id': row.competition_id,
+            'competition_name': row.competition_name,
+            'team_name': row.team_name,
+            'attachment_count': row.attachment_count,
+            'scored': row.score_value is not None,
+            'score_value': row.score_value,
+            'score_version': row.score_version or 0,
+            'score_updated_at': row.score_updated_at.strftime('%Y-%m-%d %H:%M:%S') if row.score_updated_at else None,
+        })
+
+    return {
+        'items': items,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+    }
+
+
+def judge_competitions(judge_id):
+    """评委被分配项目所属的竞赛 [(竞赛ID, 竞赛名称)]，用于清单的竞赛筛选"""
+    return db.session.query(Competition.id, Competition.name).join(
+        Project, Project.competition_id == Competition.id
+    ).join(
+        JudgeAssignment, JudgeAssignment.project_id == Project.id
+    ).filter(
+        JudgeAssignment.judge_id == judge_id,
+        JudgeAssignment.is_active == True
+    ).distinct().order_by(Competition.id).all()
@@ -0,0 +1,109 @@
+"""
+敏感关键词本地匹配工具
+用Aho–Corasick自动机一次扫描全文匹配所有关键词，不截断文本，结果确定且不依赖网络
+"""
+import re
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Dict, Tuple
+
+# 匹配前去除空白：PDF提取的文本常在字之间或行尾插入空格、换行，去掉后关键词跨行也能匹配
+_WHITESPACE = re.compile(r'\s+')
+
+
+class KeywordMatcher:
+    """多关键词匹配器（Aho–Corasick），构建一次后可重复用于任意长度的文本"""
+
+    def __init__(self, keywords: Iterable[str]):
+        # 去除空白并去重，保留原关键词用于展示
+        self.keywords = []
+        seen = set()
+        for keyword in keywords:
+            pattern = _WHITESPACE.sub('', keyword or '')
+            if pattern and pattern not in seen:
+                seen.add(pattern)
+                self.keywords.append((pattern, keyword))
+
+        # goto[状态] = {字符: 下一状态}；outputs[状态] = 在该状态结束的关键词下标
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        for index, (pattern, _) in enumerate(self.keywords):
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._outputs[state].append(index)
+
+        # 按层次遍历计算失败指针，并合并失败状态的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        扫描文本（调用方负责去除空白），按出现顺序返回 (起始位置, 原关键词)
+        """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                pattern, keyword = self.keywords[index]
+                yield position - len(pattern) + 1, keyword
+
+    def find(self, segments: Iterable[Tuple[str, str]]) -> Dict[str, List[str]]:
+        """
+        在分段文本中查找关键词
+
+        Args:
+            segments: (位置描述, 文本) 列表，如 ('第1页', 页面文本)、('第3段', 段落文本)；
+                      文本包含多行时，位置精确到行
+
+        Returns:
+            {原关键词: [出现位置, ...]}，关键词按首次出现的先后排列，未出现的关键词不包含在内
+        """
+        found = {}
+        for label, text in segments:
+            # 逐行去除空白后拼接，记录每行起点，用于把匹配位置换算为行号
+            lines = (text or '').split('\n')
+            compact_lines = [_WHITESPACE.sub('', line) for line in lines]
+            line_numbers = [number for number, line in enumerate(compact_lines, 1) if line]
+            line_starts = []
+            offset = 0
+            for number in line_numbers:
+                line_starts.append(offset)
+                offset += len(compact_lines[number - 1])
+
+            for start, keyword in self.iter_matches(''.join(compact_lines)):
+                location = label
+                if len(line_numbers) > 1:
+                    location += f'第{line_numbers[bisect_right(line_starts, start) - 1]}行'
+                locations = found.setdefault(keyword, [])
+                if location not in locations:
+                    locations.append(location)
+        return found
+
+
+@lru_cache(maxsize=8)
+def _cached_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def get_keyword_matcher(keywords: Iterable[str]) -> KeywordMatcher:
+    """获取关键词列表对应的匹配器（按关键词列表缓存，同一列表只构建一次）"""
+    return _cached_matcher(tuple(keywords))
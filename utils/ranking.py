@@ -0,0 +1,108 @@
+"""
+决赛排名工具
+按竞赛分区，用窗口函数对已通过学校审核且有评分的项目按平均分排名，
+排名顺序：平均分降序，平均分相同按项目ID升序（先提交的在前），SQLite 与 PostgreSQL 通用。
+决赛名单（is_final）只在管理员设置决赛名额或更新决赛名单时由 apply_final_quota 计算，评委保存评分时不更新
+"""
+from sqlalchemy import func, select, case, or_
+from models import db, Project, Competition, ReviewStatus
+from utils.defense_order import release_non_final_defense_orders
+
+# 排名顺序（ROW_NUMBER 使用，保证结果确定）
+RANKING_ORDER = (Project.score_avg.desc(), Project.id.asc())
+
+
+def _ranked_projects_subquery(competition_id=None):
+    """
+    构建排名子查询：项目ID、竞赛ID、RANK()（同分同名次）、ROW_NUMBER()（同分按项目ID决出先后）
+
+    Args:
+        competition_id: 只排名该竞赛的项目（默认全部竞赛）
+    """
+    query = select(
+        Project.id.label('project_id'),
+        Project.competition_id.label('competition_id'),
+        func.rank().over(
+            partition_by=Project.competition_id,
+            order_by=Project.score_avg.desc()
+        ).label('score_rank'),
+        func.row_number().over(
+            partition_by=Project.competition_id,
+            order_by=RANKING_ORDER
+        ).label('position'),
+    ).where(
+        Project.status == ReviewStatus.FINAL_APPROVED,
+        Project.score_count > 0
+    )
+    if competition_id:
+        query = query.where(Project.competition_id == competition_id)
+    return query.subquery('ranked_projects')
+
+
+def get_competition_rankings(competition_id=None):
+    """
+    获取竞赛排名（只读）
+
+    Args:
+        competition_id: 只查询该竞赛（默认全部竞赛）
+
+    Returns:
+        list: [{'project', 'rank', 'position', 'is_final', 'avg_score', 'score_count'}]，
+              按竞赛ID、排名位置排序；is_final 表示按当前决赛名额应进入决赛
+    """
+    ranked = _ranked_projects_subquery(competition_id)
+    rows = db.session.query(Project, ranked.c.score_rank, ranked.c.position, Competition.final_quota).join(
+        ranked, ranked.c.project_id == Project.id
+    ).join(
+        Competition, Competition.id == Project.competition_id
+    ).order_by(Project.competition_id.asc(), ranked.c.position.asc()).all()
+
+    rankings = []
+    for project, score_rank, position, final_quota in rows:
+        rankings.append({
+            'project': project,
+            'rank': score_rank,
+            'position': position,
+            'is_final': bool(final_quota) and position <= final_quota,
+            'avg_score': project.score_avg,
+            'score_count': project.score_count
+        })
+    return rankings
+
+
+def apply_final_quota(competition_id):
+    """
+    按决赛名额用一条批量 UPDATE 更新竞赛内已通过学校审核项目的 is_final（不提交事务）
+    排名前N（N为决赛名额）的项目进入决赛，其余（含未评分的项目）不进入决赛；未设置名额时全部不进入决赛
+    只更新 is_final 实际发生变化的项目；退出决赛的项目同时释放答辩顺序
+
+    Returns:
+        int: is_final 发生变化的项目数
+    """
+    # 确保本次事务中的评分汇总已写入数据库
+    db.session.flush()
+
+    final_quota = db.session.query(Competition.final_quota).filter(Competition.id == competition_id).scalar()
+
+    if final_quota and final_quota > 0:
+        ranked = _ranked_projects_subquery(competition_id)
+        finalist_ids = select(ranked.c.project_id).where(ranked.c.position <= final_quota)
+        new_is_final = case((Project.id.in_(finalist_ids), True), else_=False)
+    else:
+        new_is_final = False
+
+    changed_count = Project.query.filter(
+        Project.competition_id == competition_id,
+        Project.status == ReviewStatus.FINAL_APPROVED,
+        or_(Project.is_final.is_(None), Project.is_final != new_is_final)
+    ).update({Project.is_final: new_is_final}, synchronize_session=False)
+
+    # 批量更新不会同步会话中已加载的项目，使其在下次访问时重新加载
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Project):
+            db.session.expire(obj, ['is_final'])
+
+    # 退出决赛的项目释放答辩顺序和抽签号，留给新进入决赛的项目
+    if changed_count:
+        release_non_final_defense_orders(competition_id)
+    return changed_count
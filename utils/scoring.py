@@ -0,0 +1,225 @@
+"""
+评分统计工具
+维护项目上的评分汇总字段（评分数、总分、平均分、最高/最低分、去极值平均分），
+评分写入时在同一事务内刷新，排名时直接按汇总字段排序。
+评委保存评分使用 save_scores：一次请求可保存多个项目的评分，每批评分用一条 INSERT ... ON CONFLICT 写入，
+按评分的版本号做乐观并发检查（同一评委在多个页面同时修改时不会互相覆盖），整批在一个短事务中提交。
+保存评分只刷新这些项目的评分汇总，不重新计算决赛名单（由管理员设置名额或更新决赛名单时计算，见 utils.ranking）
+"""
+from sqlalchemy import func, select, case
+from models import db, Project, Score, JudgeAssignment
+from utils.timezone import beijing_now
+
+# 评分范围（与 ScoreForm 一致）
+SCORE_MIN = 0
+SCORE_MAX = 100
+
+# 一次保存的评分数上限
+MAX_SCORES_PER_SAVE = 200
+
+
+def calculate_trimmed_avg(score_count, score_sum, score_min, score_max):
+    """去掉一个最高分和一个最低分后的平均分；评分不足3个时取普通平均分"""
+    if not score_count:
+        return None
+    if score_count < 3:
+        return score_sum / score_count
+    return (score_sum - score_min - score_max) / (score_count - 2)
+
+
+def update_project_score_stats(project_id):
+    """
+    重新统计项目的评分汇总字段（不提交事务）
+    先锁定项目行，避免并发评分时汇总结果遗漏其他评委的分数
+
+    Args:
+        project_id: 项目ID
+
+    Returns:
+        Project: 更新后的项目，项目不存在时返回 None
+    """
+    # 确保本次事务中新增/修改的评分已写入数据库
+    db.session.flush()
+
+    project = Project.query.filter_by(id=project_id).with_for_update().populate_existing().first()
+    if project is None:
+        return None
+
+    score_count, score_sum, score_avg, score_min, score_max = db.session.query(
+        func.count(Score.id),
+        func.sum(Score.score_value),
+        func.avg(Score.score_value),
+        func.min(Score.score_value),
+        func.max(Score.score_value)
+    ).filter(Score.project_id == project_id).one()
+
+    project.score_count = score_count or 0
+    project.score_sum = score_sum or 0
+    project.score_avg = score_avg
+    project.score_min = score_min
+    project.score_max = score_max
+    project.score_trimmed_avg = calculate_trimmed_avg(score_count, score_sum, score_min, score_max)
+    return project
+
+
+def update_projects_score_stats(project_ids):
+    """
+    批量重新统计多个项目的评分汇总字段（不提交事务），用两条 UPDATE 完成
+    与 update_project_score_stats 相同，先锁定项目行再统计
+    """
+    project_ids = sorted(set(project_ids))
+    if not project_ids:
+        return
+    db.session.flush()
+    db.session.execute(select(Project.id).where(Project.id.in_(project_ids)).order_by(Project.id).with_for_update())
+
+    def stat(aggregate):
+        return select(aggregate).where(Score.project_id == Project.id).correlate(Project).scalar_subquery()
+
+    Project.query.filter(Project.id.in_(project_ids)).update({
+        Project.score_count: stat(func.count(Score.id)),
+        Project.score_sum: func.coalesce(stat(func.sum(Score.score_value)), 0),
+        Project.score_avg: stat(func.avg(Score.score_value)),
+        Project.score_min: stat(func.min(Score.score_value)),
+        Project.score_max: stat(func.max(Score.score_value)),
+    }, synchronize_session=False)
+    # 去极值平均分依赖上面刚写入的汇总字段，需单独更新
+    Project.query.filter(Project.id.in_(project_ids)).update({
+        Project.score_trimmed_avg: case(
+            (Project.score_count >= 3,
+             (Project.score_sum - Project.score_min - Project.score_max) / (Project.score_count - 2)),
+            (Project.score_count > 0, Project.score_avg),
+            else_=None
+        )
+    }, synchronize_session=False)
+
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Project) and obj.id in project_ids:
+            db.session.expire(obj)
+
+
+def _upsert(model):
+    """按当前数据库方言返回支持 ON CONFLICT 的 insert（SQLite / PostgreSQL）"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def _parse_score_entry(entry):
+    """校验一条评分，返回 (项目ID, 评分, 评语, 期望版本号) 或错误信息"""
+    if not isinstance(entry, dict):
+        return None, '评分格式不正确'
+    try:
+        project_id = int(entry.get('project_id'))
+    except (TypeError, ValueError):
+        return None, '缺少项目ID'
+    try:
+        score_value = float(entry.get('score_value'))
+    except (TypeError, ValueError):
+        return None, '请填写评分'
+    if not SCORE_MIN <= score_value <= SCORE_MAX:
+        return None, f'评分必须在{SCORE_MIN}-{SCORE_MAX}之间'
+    comment = entry.get('comment')
+    if comment is not None and not isinstance(comment, str):
+        return None, '评语格式不正确'
+    version = entry.get('version')
+    if version is not None:
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            return None, '版本号格式不正确'
+        if version < 0:
+            return None, '版本号格式不正确'
+    return (project_id, score_value, comment, version), None
+
+
+def save_scores(judge_id, entries):
+    """
+    保存评委的一批评分并刷新这些项目的评分汇总，提交事务
+
+    Args:
+        judge_id: 评委ID
+        entries: [{'project_id', 'score_value', 'comment', 'version'}]
+            comment 为空（None）时保留原评语；
+            version 为客户端读取到的评分版本号（尚未评分时为0），版本号与数据库不一致时不保存、返回冲突；
+            不传 version 时直接覆盖
+
+    Returns:
+        {
+            'saved': [{'project_id', 'version'}],
+            'conflicts': [{'project_id', 'version', 'score_value', 'comment', 'updated_at'}]（数据库中的当前评分）,
+            'errors': [{'project_id', 'message'}],
+        }
+    """
+    result = {'saved': [], 'conflicts': [], 'errors': []}
+    parsed = {}
+    for entry in entries[:MAX_SCORES_PER_SAVE]:
+        values, error = _parse_score_entry(entry)
+        if error:
+            result['errors'].append({'project_id': entry.get('project_id') if isinstance(entry, dict) else None,
+                                     'message': error})
+        else:
+            parsed[values[0]] = values  # 同一项目提交多次时以最后一次为准
+    if len(entries) > MAX_SCORES_PER_SAVE:
+        result['errors'].append({'project_id': None, 'message': f'一次最多保存{MAX_SCORES_PER_SAVE}个评分'})
+    if not parsed:
+        return result
+
+    # 权限：一次查询当前评委被分配的项目
+    assigned_ids = {row.project_id for row in db.session.query(JudgeAssignment.project_id).filter(
+        JudgeAssignment.judge_id == judge_id,
+        JudgeAssignment.is_active == True,
+        JudgeAssignment.project_id.in_(list(parsed))
+    )}
+    for project_id in [project_id for project_id in parsed if project_id not in assigned_ids]:
+        result['errors'].append({'project_id': project_id, 'message': '没有权限为此项目打分'})
+        del parsed[project_id]
+    if not parsed:
+        return result
+
+    now = beijing_now()
+    checked = [values for values in parsed.values() if values[3] is not None]
+    unchecked = [values for values in parsed.values() if values[3] is None]
+    saved_versions = {}
+    for batch, versioned in ((checked, True), (unchecked, False)):
+        if not batch:
+            continue
+        # 有版本号时插入的 version 为期望版本号+1，冲突时只有数据库中的版本号等于期望版本号才更新
+        stmt = _upsert(Score).values([
+            {'project_id': project_id, 'judge_id': judge_id, 'score_value': score_value, 'comment': comment,
+             'version': version + 1 if versioned else 1, 'scored_at': now, 'updated_at': now}
+            for project_id, score_value, comment, version in batch
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Score.project_id, Score.judge_id],
+            set_={
+                'score_value': stmt.excluded.score_value,
+                'comment': func.coalesce(stmt.excluded.comment, Score.comment),
+                'version': Score.version + 1,
+                'updated_at': stmt.excluded.updated_at,
+            },
+            where=(Score.version + 1 == stmt.excluded.version) if versioned else None
+        ).returning(Score.project_id, Score.version)
+        saved_versions.update(db.session.execute(stmt).all())
+
+    conflict_ids = [values[0] for values in checked if values[0] not in saved_versions]
+    if conflict_ids:
+        for score in Score.query.filter(Score.judge_id == judge_id, Score.project_id.in_(conflict_ids)):
+            result['conflicts'].append({
+                'project_id': score.project_id,
+                'version': score.version,
+                'score_value': score.score_value,
+                'comment': score.comment,
+                'updated_at': score.updated_at.strftime('%Y-%m-%d %H:%M:%S') if score.updated_at else None,
+            })
+
+    if saved_versions:
+        # 同一事务内只刷新本次保存的项目的评分汇总，事务中不更新整个竞赛的决赛名单
+        update_projects_score_stats(saved_versions)
+    db.session.commit()
+
+    result['saved'] = [{'project_id': project_id, 'version': version}
+                       for project_id, version in sorted(saved_versions.items())]
+    return result
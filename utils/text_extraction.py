@@ -0,0 +1,215 @@
+"""
+附件文本提取
+上传PDF、DOCX附件后将文本提取交给进程池，逐页（段）文本保存在 attachment_texts / attachment_text_pages 表，
+脱敏识别、搜索和预览直接读取，不再在请求中重复解析文件
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from models import db, AttachmentText, AttachmentTextPage, TextExtractionStatus
+from utils.timezone import beijing_now
+
+# 支持提取文本的文件类型
+EXTRACTABLE_TYPES = ('pdf', 'docx')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def extract_pdf_segments(file_path: str) -> List[Tuple[str, str]]:
+    """用PyPDF2逐页提取PDF文本，返回 [('第N页', 页面文本), ...]（没有文本的页不包含在内）"""
+    import PyPDF2
+
+    segments = []
+    with open(file_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        for page_num, page in enumerate(pdf_reader.pages, 1):
+            page_text = page.extract_text()
+            if page_text:
+                segments.append((f'第{page_num}页', page_text))
+    return segments
+
+
+def extract_docx_segments(file_path: str) -> List[Tuple[str, str]]:
+    """用python-docx提取DOCX文本，返回 [('第N段', 段落文本), ..., ('表格M第R行', 行文本), ...]"""
+    from docx import Document
+
+    doc = Document(file_path)
+    segments = [(f'第{number}段', paragraph.text)
+                for number, paragraph in enumerate(doc.paragraphs, 1) if paragraph.text.strip()]
+
+    # 也提取表格内容
+    for table_num, table in enumerate(doc.tables, 1):
+        for row_num, row in enumerate(table.rows, 1):
+            row_text = ' '.join([cell.text for cell in row.cells])
+            if row_text.strip():
+                segments.append((f'表格{table_num}第{row_num}行', row_text))
+    return segments
+
+
+def _get_executor():
+    """获取文本提取进程池（按需创建；使用 spawn 启动子进程，避免继承 Web 进程的数据库连接和线程）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=Config.TEXT_EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _reset_executor():
+    """进程池异常退出后丢弃，下次提交时重新创建"""
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def enqueue_text_extraction(file_path: str, file_type: str) -> bool:
+    """
+    提交附件文本提取任务（不等待完成，不访问数据库）。提交失败时不影响上传，识别时会重新提取
+
+    Args:
+        file_path: 文件路径（相对于上传目录）
+        file_type: 文件类型
+
+    Returns:
+        是否已提交
+    """
+    if (file_type or '').lower() not in EXTRACTABLE_TYPES:
+        return False
+    try:
+        try:
+            _get_executor().submit(run_text_extraction, file_path, file_type)
+        except BrokenProcessPool:
+            _reset_executor()
+            _get_executor().submit(run_text_extraction, file_path, file_type)
+    except Exception:
+        return False
+    return True
+
+
+def enqueue_missing_text_extractions(attachments: Iterable[Tuple[str, str]]):
+    """
+    为还没有提取记录的附件提交提取任务（用于补齐功能上线前上传的附件）。
+    已失败或正在提取的不重复提交；提取中的记录超过 TEXT_EXTRACTION_TIMEOUT 未完成时视为中断（如进程崩溃），重新提交
+    """
+    attachments = dict(attachments)
+    if not attachments:
+        return
+    stale_before = beijing_now() - timedelta(seconds=Config.TEXT_EXTRACTION_TIMEOUT)
+    existing = {file_path for (file_path,) in db.session.query(AttachmentText.file_path).filter(
+        AttachmentText.file_path.in_(attachments.keys()),
+        or_(AttachmentText.status != TextExtractionStatus.RUNNING, AttachmentText.extracted_at >= stale_before)
+    )}
+    for file_path, file_type in attachments.items():
+        if file_path not in existing:
+            enqueue_text_extraction(file_path, file_type)
+
+
+def run_text_extraction(file_path: str, file_type: str):
+    """进程池入口：在子进程中创建应用上下文并提取文本"""
+    from app import app
+
+    with app.app_context():
+        extract_attachment_text(file_path, file_type)
+        db.session.remove()
+
+
+def extract_attachment_text(file_path: str, file_type: str):
+    """
+    提取附件文本并保存（需在应用上下文中调用），已有结果时覆盖
+
+    Args:
+        file_path: 文件路径（相对于上传目录）
+        file_type: 文件类型
+    """
+    record = AttachmentText.query.filter_by(file_path=file_path).first()
+    if record is None:
+        record = AttachmentText(file_path=file_path)
+        db.session.add(record)
+    else:
+        record.pages.delete()
+    record.file_type = file_type
+    record.status = TextExtractionStatus.RUNNING
+    record.error_message = None
+    record.extracted_at = beijing_now()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 同一附件的另一个提取任务已在执行
+        db.session.rollback()
+        return
+
+    absolute_path = Path(Config.UPLOAD_FOLDER) / file_path
+    try:
+        if file_type.lower() == 'pdf':
+            segments = extract_pdf_segments(str(absolute_path))
+        else:
+            segments = extract_docx_segments(str(absolute_path))
+    except Exception as e:
+        db.session.rollback()
+        record = AttachmentText.query.filter_by(file_path=file_path).first()
+        record.status = TextExtractionStatus.FAILED
+        record.error_message = str(e)
+        record.extracted_at = beijing_now()
+        db.session.commit()
+        return
+
+    for page_number, (label, content) in enumerate(segments, 1):
+        db.session.add(AttachmentTextPage(attachment_text_id=record.id, page_number=page_number,
+                                          label=label, content=content))
+    record.status = TextExtractionStatus.DONE
+    record.page_count = len(segments)
+    record.extracted_at = beijing_now()
+    db.session.commit()
+
+
+def load_text_segments(file_paths: Iterable[str]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    批量读取已提取完成的附件文本
+
+    Args:
+        file_paths: 文件路径（相对于上传目录）
+
+    Returns:
+        {文件路径: [(位置描述, 文本), ...]}，尚未提取或提取失败的附件不包含在内
+    """
+    file_paths = set(file_paths)
+    if not file_paths:
+        return {}
+
+    rows = db.session.query(AttachmentText.file_path, AttachmentTextPage.label, AttachmentTextPage.content).outerjoin(
+        AttachmentTextPage, AttachmentTextPage.attachment_text_id == AttachmentText.id
+    ).filter(
+        AttachmentText.file_path.in_(file_paths),
+        AttachmentText.status == TextExtractionStatus.DONE
+    ).order_by(AttachmentText.id, AttachmentTextPage.page_number).all()
+
+    segments = {}
+    for file_path, label, content in rows:
+        pages = segments.setdefault(file_path, [])
+        if label is not None:
+            pages.append((label, content or ''))
+    return segments
+
+
+def delete_attachment_text(file_path: str):
+    """删除附件的文本提取结果（不提交事务）"""
+    record = AttachmentText.query.filter_by(file_path=file_path).first()
+    if record:
+        db.session.delete(record)
+
+
+def relative_upload_path(file_path: str) -> str:
+    """绝对路径转换为相对于上传目录的路径（使用正斜杠，与 ProjectAttachment.file_path 一致）"""
+    return os.path.relpath(file_path, Config.UPLOAD_FOLDER).replace('\\', '/')
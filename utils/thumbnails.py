@@ -0,0 +1,96 @@
+"""
+附件缩略图
+图片缩小为WebP缩略图，PDF在安装了 PyMuPDF 时渲染首页生成缩略图。缩略图按文件内容哈希缓存在
+uploads/thumbnails/<前2位>/<sha256>_<尺寸>.webp，内容相同的附件共用一份；首次请求时生成，之后直接发送文件
+"""
+import importlib.util
+import os
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image, UnidentifiedImageError
+from config import Config
+
+THUMBNAIL_SUBFOLDER = 'thumbnails'
+
+# 可以直接缩小的图片类型
+IMAGE_TYPES = ('jpg', 'jpeg', 'png', 'gif')
+
+
+@lru_cache(maxsize=1)
+def pdf_renderer_available():
+    """是否安装了渲染PDF页面的 PyMuPDF（可选依赖）"""
+    return importlib.util.find_spec('pymupdf') is not None
+
+
+def has_thumbnail(file_type):
+    """该类型的附件能否生成缩略图"""
+    file_type = (file_type or '').lower()
+    return file_type in IMAGE_TYPES or (file_type == 'pdf' and pdf_renderer_available())
+
+
+def thumbnail_relative_path(content_hash):
+    """文件哈希对应的缩略图路径（相对于上传目录，正斜杠；尺寸变化后生成新文件）"""
+    return f'{THUMBNAIL_SUBFOLDER}/{content_hash[:2]}/{content_hash}_{Config.THUMBNAIL_SIZE}.webp'
+
+
+def _open_image(file_path):
+    """打开图片；JPEG按缩略图尺寸解码（draft），不解码完整分辨率"""
+    image = Image.open(file_path)
+    image.draft('RGB', (Config.THUMBNAIL_SIZE, Config.THUMBNAIL_SIZE))
+    return image
+
+
+def _render_pdf_first_page(file_path):
+    """用PyMuPDF按缩略图尺寸渲染PDF首页"""
+    import pymupdf
+
+    with pymupdf.open(file_path) as doc:
+        page = doc[0]
+        scale = Config.THUMBNAIL_SIZE / max(page.rect.width, page.rect.height)
+        pixmap = page.get_pixmap(matrix=pymupdf.Matrix(scale, scale), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def get_thumbnail(file_path, file_type, content_hash):
+    """
+    获取附件缩略图，不存在时生成
+
+    Args:
+        file_path: 附件的绝对路径
+        file_type: 文件类型
+        content_hash: 文件内容的SHA-256
+
+    Returns:
+        缩略图路径（相对于上传目录），该类型不支持或文件无法解析时返回 None
+    """
+    if not has_thumbnail(file_type):
+        return None
+
+    relative_path = thumbnail_relative_path(content_hash)
+    thumbnail_path = Path(Config.UPLOAD_FOLDER) / relative_path
+    if thumbnail_path.exists():
+        return relative_path
+
+    try:
+        if file_type.lower() == 'pdf':
+            image = _render_pdf_first_page(file_path)
+        else:
+            image = _open_image(file_path)
+        with image:
+            image.thumbnail((Config.THUMBNAIL_SIZE, Config.THUMBNAIL_SIZE))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            # 先写入临时文件再重命名，并发请求同一缩略图时不会读到写了一半的文件
+            thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = thumbnail_path.with_name(f'{uuid.uuid4().hex}.tmp')
+            try:
+                image.save(temp_path, 'WEBP', quality=Config.THUMBNAIL_QUALITY)
+                os.replace(temp_path, thumbnail_path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+    except (OSError, ValueError, UnidentifiedImageError, Image.DecompressionBombError, RuntimeError, IndexError):
+        return None
+    return relative_path